@@ -1,10 +1,32 @@
+#ifndef HELPER_H
+#define HELPER_H
+
 #include "ROOT/RDataFrame.hxx"
 #include "ROOT/RVec.hxx"
 #include "TCanvas.h"
 #include "TH1D.h"
+#include "TH1F.h"
+#include "TH2D.h"
+#include "TH2F.h"
+#include "TAxis.h"
+#include "TNamed.h"
+#include "TCollection.h"
 #include "TLatex.h"
 #include "Math/Vector4D.h"
 #include "TStyle.h"
+#include "RVersion.h"
+#include "ROOT/RLogger.hxx"
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <functional>
+#include <iostream>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <unordered_map>
+#include <vector>
  
 using namespace ROOT;
 using namespace ROOT::VecOps;
@@ -43,3 +65,358 @@ float Ratio_pt(float pt1,float pt2){
 		return pt1/pt2;
 	}
 }
+
+// Selection kernels (compiled with the rest of this file, see helpers/kernels.py)
+
+// Loose photon ID with pT>20 GeV in the barrel, used to veto additional photons
+RVec<int> PhotonLooseID(const RVec<bool> &mvaID_WP90, const RVec<float> &eta, const RVec<float> &pt){
+  return mvaID_WP90 && abs(eta)<1.4442 && pt>20;
+}
+
+// Tight photon ID with pT>100 GeV in the barrel, for the photon of interest
+RVec<int> PhotonTightID(const RVec<bool> &mvaID_WP80, const RVec<float> &eta, const RVec<float> &pt,
+                        const RVec<bool> &electronVeto, const RVec<bool> &pixelSeed){
+  return mvaID_WP80 && abs(eta)<1.4442 && pt>100 && electronVeto && !pixelSeed;
+}
+
+// Jets that are not pathological and not made mostly of a muon, an electron or a photon
+template <typename T>
+RVec<int> JetCleanID(const RVec<T> &jetId, const RVec<float> &muEF, const RVec<float> &chEmEF, const RVec<float> &neEmEF){
+  return jetId>=4 && muEF<0.5 && chEmEF<0.5 && neEmEF<0.9;
+}
+
+// Same, with pT>30 GeV. maxEta<0 means no eta requirement.
+template <typename T>
+RVec<int> JetTightID(const RVec<T> &jetId, const RVec<float> &muEF, const RVec<float> &chEmEF, const RVec<float> &neEmEF,
+                     const RVec<float> &pt, const RVec<float> &eta, float maxEta){
+  RVec<int> pass = JetCleanID(jetId, muEF, chEmEF, neEmEF) && pt>30;
+  if (maxEta >= 0) pass = pass && abs(eta)<maxEta;
+  return pass;
+}
+
+float DeltaPhi(float phi1, float phi2){
+  return std::abs(std::acos(std::cos(phi1-phi2)));
+}
+
+double DeltaR(float eta1, float phi1, float eta2, float phi2){
+  return std::sqrt(std::pow(eta1-eta2,2) + std::pow(DeltaPhi(phi1,phi2),2));
+}
+
+// Dijet flavour category: k if exactly two of the selected jets have |partonFlavour|==k, 0 otherwise
+template <typename T>
+int DijetFlavour(const RVec<T> &absFlavour){
+  for (auto k : absFlavour){
+    if (k > 0 && Sum(absFlavour == k) == 2) return k;
+  }
+  return 0;
+}
+
+// Thread-safe event loop monitoring: prints the number of processed entries every "every" entries, with the fraction
+// of the total number of entries processed and the estimated remaining time. Works both with and without implicit
+// multithreading (each slot reports its own progress, the total is accumulated atomically and printed under a lock).
+void ReportProgress(ROOT::RDF::RResultPtr<ULong64_t> &count, ULong64_t every, ULong64_t total){
+  auto processed = std::make_shared<std::atomic<ULong64_t>>(0);
+  auto printMutex = std::make_shared<std::mutex>();
+  auto start = std::chrono::steady_clock::now();
+  count.OnPartialResultSlot(every, [processed, printMutex, every, total, start](unsigned int, ULong64_t &){
+    ULong64_t n = processed->fetch_add(every) + every;
+    double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+    double remaining = n < total ? elapsed*(total - n)/n : 0.;
+    std::lock_guard<std::mutex> lock(*printMutex);
+    std::cout << "Event is  " << n << " / " << total << " (" << (total > 0 ? 100.*n/total : 100.) << "%), "
+              << n/elapsed << " events/s, ETA " << int(remaining) << " s" << std::endl;
+  });
+}
+
+// Evaluation time of instrumented Defines (see DefineTimer in helper_gammaztobb.py), accumulated over all slots.
+// The timers are registered before the event loop, so that the map is only read during the loop.
+struct DefineTime {
+  std::atomic<long long> ns{0};
+  std::atomic<long long> calls{0};
+};
+
+std::map<std::string, std::unique_ptr<DefineTime>> &DefineTimes(){
+  static std::map<std::string, std::unique_ptr<DefineTime>> times;
+  return times;
+}
+
+void RegisterDefineTimer(const std::string &name){
+  if (!DefineTimes().count(name)) DefineTimes()[name] = std::make_unique<DefineTime>();
+}
+
+double DefineTimeSeconds(const std::string &name){ return DefineTimes().at(name)->ns*1e-9; }
+long long DefineCalls(const std::string &name){ return DefineTimes().at(name)->calls; }
+
+// Timer of a registered Define, given to the compiled kernels (also those of JetCorrections.h): called with the
+// evaluation time in ns of every call. An empty timer means the Define is not timed.
+using TimerCallback = std::function<void(long long)>;
+
+TimerCallback DefineTimer(const std::string &name){
+  DefineTime *t = DefineTimes().at(name).get();
+  return [t](long long ns){
+    t->ns += ns;
+    t->calls++;
+  };
+}
+
+// Baseline selection of GammaZSelection (see helper_gammaztobb.py), booked with typed Defines and Filters so that
+// none of it is JIT-compiled. The input columns have the NanoAOD (v12 and later) types of macros/branches_expected.txt.
+// The selection is split at the jet energy corrections (CorrectJetPt and VaryJetPt, see JetCorrections.h); the nodes
+// where histograms are booked are returned.
+
+template <typename T>
+RVec<T> Selected(const RVec<T> &values, const RVec<int> &mask){
+  return values[mask];
+}
+
+RNode DefineUnitWeight(RNode df){
+  return df.Define("unit_weight", []{ return 1.0; });
+}
+
+struct PhotonSelectionNodes {
+  RNode photons;     // after the trigger, with the photon ID columns
+  RNode photonCuts;  // exactly one loose photon, which is tight
+  RNode leptonVeto;  // no electron nor muon, with the jet ID (Jet_CleanID) needed by the JECs
+};
+
+PhotonSelectionNodes GammaZPhotonSelection(RNode df){
+  //Trigger
+  auto trigger = df.Filter([](bool hlt50, bool hlt45){ return hlt50 || hlt45; },
+                           {"HLT_Photon50EB_TightID_TightIso", "HLT_Photon45EB_TightID_TightIso"},
+                           "HLT_Photon50EB_TightID_TightIso||HLT_Photon45EB_TightID_TightIso");
+
+  //Offline photon, a loose ID for pt>20 GeV used to veto additional photons, and a tight ID with pt>100 GeV for the photon of interest
+  auto photons = trigger.Define("Photon_LooseID_Pt20", PhotonLooseID, {"Photon_mvaID_WP90", "Photon_eta", "Photon_pt"})
+                        .Define("Photon_LooseID_Pt20_pt", Selected<float>, {"Photon_pt", "Photon_LooseID_Pt20"})
+                        .Define("Photon_LooseID_Pt20_eta", Selected<float>, {"Photon_eta", "Photon_LooseID_Pt20"})
+                        .Define("Photon_LooseID_Pt20_phi", Selected<float>, {"Photon_phi", "Photon_LooseID_Pt20"})
+                        .Define("Photon_TightID_Pt100", PhotonTightID, {"Photon_mvaID_WP80", "Photon_eta", "Photon_pt", "Photon_electronVeto", "Photon_pixelSeed"})
+                        .Define("Photon_TightID_Pt100_pt", Selected<float>, {"Photon_pt", "Photon_TightID_Pt100"})
+                        .Define("Photon_TightID_Pt100_eta", Selected<float>, {"Photon_eta", "Photon_TightID_Pt100"})
+                        .Define("Photon_TightID_Pt100_phi", Selected<float>, {"Photon_phi", "Photon_TightID_Pt100"});
+
+  auto photonCuts = photons.Filter([](const RVec<int> &loose){ return Sum(loose) == 1; }, {"Photon_LooseID_Pt20"}, "=1 loose photon with p_{T}>20 GeV")
+                           .Filter([](const RVec<int> &tight){ return Sum(tight) == 1; }, {"Photon_TightID_Pt100"}, "=1 tight photon with p_{T}>100 GeV");
+
+  //Electron and muon veto (to reject processes like ttbar)
+  auto leptonVeto = photonCuts.Define("Electron_LooseID_Pt15", [](const RVec<float> &pt, const RVec<bool> &mvaIso){ return pt>15 && mvaIso; },
+                                      {"Electron_pt", "Electron_mvaIso_WPHZZ"})
+                              .Filter([](const RVec<int> &electrons){ return Sum(electrons) == 0; }, {"Electron_LooseID_Pt15"}, "0 good electron with p_{T}>15 GeV")
+                              .Define("Muon_LooseID_Pt10", [](const RVec<UChar_t> &pfIsoId, const RVec<bool> &mediumPrompt, const RVec<float> &pt){
+                                        return pfIsoId>=2 && mediumPrompt && pt>10; }, {"Muon_pfIsoId", "Muon_mediumPromptId", "Muon_pt"})
+                              .Filter([](const RVec<int> &muons){ return Sum(muons) == 0; }, {"Muon_LooseID_Pt10"}, "Sum(Muon_LooseID_Pt10)==0")
+                              //Only jets passing the (pT independent) jet ID can be selected, the others are not corrected
+                              .Define("Jet_CleanID", JetCleanID<UChar_t>, {"Jet_jetId", "Jet_muEF", "Jet_chEmEF", "Jet_neEmEF"});
+
+  return {photons, photonCuts, leptonVeto};
+}
+
+struct DijetSelectionNodes {
+  RNode twoJets;    // exactly two central jets with pt>30 GeV and no other jet
+  RNode selected;   // 40<mjj<200 GeV, photon separated from both jets, with the kinematic variables
+  RNode mjjRange;   // selected, in the mjj range of study
+};
+
+// Jet selection on the corrected (and varied) jet pT. mjjTimer (if set) times the invariant mass (see DefineTimer).
+DijetSelectionNodes GammaZDijetSelection(RNode df, bool isData, TimerCallback mjjTimer = {}){
+  //Jets that are not pathological, not made mostly of a muon, an electron or a photon, with pt>30 GeV, and the subset of central ones
+  const std::vector<std::string> idColumns = {"Jet_jetId", "Jet_muEF", "Jet_chEmEF", "Jet_neEmEF", "Jet_pt", "Jet_eta"};
+  auto jets = df.Define("Jet_TightID_Pt30", [](const RVec<UChar_t> &jetId, const RVec<float> &muEF, const RVec<float> &chEmEF, const RVec<float> &neEmEF,
+                                               const RVec<float> &pt, const RVec<float> &eta){ return JetTightID(jetId, muEF, chEmEF, neEmEF, pt, eta, -1.f); }, idColumns)
+                .Define("Jet_TightID_Pt30_Central", [](const RVec<UChar_t> &jetId, const RVec<float> &muEF, const RVec<float> &chEmEF, const RVec<float> &neEmEF,
+                                                       const RVec<float> &pt, const RVec<float> &eta){ return JetTightID(jetId, muEF, chEmEF, neEmEF, pt, eta, 2.4f); }, idColumns)
+                .Define("Jet_TightID_Pt30_Central_Pt", Selected<float>, {"Jet_pt", "Jet_TightID_Pt30_Central"})
+                .Define("Jet_TightID_Pt30_Central_Eta", Selected<float>, {"Jet_eta", "Jet_TightID_Pt30_Central"})
+                .Define("Jet_TightID_Pt30_Central_Phi", Selected<float>, {"Jet_phi", "Jet_TightID_Pt30_Central"})
+                .Define("Jet_TightID_Pt30_Central_Mass", Selected<float>, {"Jet_mass", "Jet_TightID_Pt30_Central"});
+
+  //Flavour of the selected jets, and dijet flavour category computed once per event: k if both jets have flavour k, 0 otherwise
+  RNode flavours = jets;
+  if (!isData) {
+    flavours = jets.Define("Jet_TightID_Pt30_Central_partonFlavour", Selected<Short_t>, {"Jet_partonFlavour", "Jet_TightID_Pt30_Central"})
+                   .Define("Jet_TightID_Pt30_Central_absFlavour", [](const RVec<Short_t> &flavour){ return Map(flavour, [](Short_t f){ return std::abs(int(f)); }); },
+                           {"Jet_TightID_Pt30_Central_partonFlavour"})
+                   .Define("Jet_DijetFlavour", DijetFlavour<int>, {"Jet_TightID_Pt30_Central_absFlavour"});
+  }
+
+  //For now, consider only events with exactly 2 central jets and no other jet
+  auto twoJets = flavours.Filter([](const RVec<int> &all, const RVec<int> &central){ return Sum(all) == 2 && Sum(central) == 2; },
+                                 {"Jet_TightID_Pt30", "Jet_TightID_Pt30_Central"}, "=2 central jets with pt>30 GeV, no additional jet");
+
+  //Dijet invariant mass, mjj outside the baseline removed
+  const std::vector<std::string> jetColumns = {"Jet_TightID_Pt30_Central_Pt", "Jet_TightID_Pt30_Central_Eta", "Jet_TightID_Pt30_Central_Phi", "Jet_TightID_Pt30_Central_Mass"};
+  auto mjj = [](const RVec<float> &pt, const RVec<float> &eta, const RVec<float> &phi, const RVec<float> &mass){
+    return InvariantMass(pt[0], eta[0], phi[0], mass[0], pt[1], eta[1], phi[1], mass[1]);
+  };
+  RNode withMjj = twoJets;
+  if (mjjTimer) {
+    withMjj = twoJets.Define("Mjj", [mjj, mjjTimer](const RVec<float> &pt, const RVec<float> &eta, const RVec<float> &phi, const RVec<float> &mass){
+      auto start = std::chrono::steady_clock::now();
+      float m = mjj(pt, eta, phi, mass);
+      mjjTimer(std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - start).count());
+      return m;
+    }, jetColumns);
+  } else {
+    withMjj = twoJets.Define("Mjj", mjj, jetColumns);
+  }
+
+  //Kinematic variables of the two jets and of the photon
+  auto selected = withMjj.Filter([](float m){ return m < 200 && m > 40; }, {"Mjj"}, "Invariant mass clearly outside the range of this study")
+                         .Define("Jet_delta_eta", [](const RVec<float> &eta){ return std::abs(eta[0]-eta[1]); }, {"Jet_TightID_Pt30_Central_Eta"})
+                         .Define("Jet_delta_phi", [](const RVec<float> &phi){ return DeltaPhi(phi[0], phi[1]); }, {"Jet_TightID_Pt30_Central_Phi"})
+                         .Define("Jet_pt1", [](const RVec<float> &pt){ return pt[0]; }, {"Jet_TightID_Pt30_Central_Pt"})
+                         .Define("Jet_pt2", [](const RVec<float> &pt){ return pt[1]; }, {"Jet_TightID_Pt30_Central_Pt"})
+                         .Define("Jet_delta_pT", [](float pt1, float pt2){ return std::abs(pt1-pt2); }, {"Jet_pt1", "Jet_pt2"})
+                         .Define("Jet_pT2pT1", Ratio_pt, {"Jet_pt1", "Jet_pt2"})
+                         .Define("Jet_delta_R", [](float deta, float dphi){ return sqrt(pow(deta,2) + pow(dphi,2)); }, {"Jet_delta_eta", "Jet_delta_phi"})
+                         .Define("Photon_pt1", [](const RVec<float> &pt){ return pt[0]; }, {"Photon_TightID_Pt100_pt"})
+                         .Define("Photon_eta1", [](const RVec<float> &eta){ return eta[0]; }, {"Photon_TightID_Pt100_eta"})
+                         .Define("Photon_phi1", [](const RVec<float> &phi){ return phi[0]; }, {"Photon_TightID_Pt100_phi"})
+                         //Delta R between the photon and the leading/subleading jet, required to be > 0.4
+                         .Define("PJet_Delta_R", [](const RVec<float> &etaPhoton, const RVec<float> &phiPhoton, const RVec<float> &eta, const RVec<float> &phi){
+                                   return DeltaR(etaPhoton[0], phiPhoton[0], eta[0], phi[0]); },
+                                 {"Photon_TightID_Pt100_eta", "Photon_TightID_Pt100_phi", "Jet_TightID_Pt30_Central_Eta", "Jet_TightID_Pt30_Central_Phi"})
+                         .Define("PSubJet_Delta_R", [](const RVec<float> &etaPhoton, const RVec<float> &phiPhoton, const RVec<float> &eta, const RVec<float> &phi){
+                                   return DeltaR(etaPhoton[0], phiPhoton[0], eta[1], phi[1]); },
+                                 {"Photon_TightID_Pt100_eta", "Photon_TightID_Pt100_phi", "Jet_TightID_Pt30_Central_Eta", "Jet_TightID_Pt30_Central_Phi"})
+                         .Filter([](double leading, double subleading){ return leading > 0.4 && subleading > 0.4; }, {"PJet_Delta_R", "PSubJet_Delta_R"},
+                                 "Angular distance between the photon and both jets is > 0.4");
+
+  //Selection cut to further select kinematic variables in range of study
+  auto mjjRange = selected.Filter([](float m){ return m > 40 && m < 200; }, {"Mjj"}, "mjj in range of study");
+
+  return {twoJets, selected, mjjRange};
+}
+
+// b-tagging scores of the two selected jets
+RNode BtagColumns(RNode df){
+  return df.Define("Jet_TightID_Pt30_Central_btagPNetB", Selected<float>, {"Jet_btagPNetB", "Jet_TightID_Pt30_Central"})
+           .Define("Jet_btagPNetB_1", [](const RVec<float> &btag){ return btag[0]; }, {"Jet_TightID_Pt30_Central_btagPNetB"})
+           .Define("Jet_btagPNetB_2", [](const RVec<float> &btag){ return btag[1]; }, {"Jet_TightID_Pt30_Central_btagPNetB"})
+           .Define("Jet_btagPNetB_mean", [](float btag1, float btag2){ return (btag1 + btag2)/2; }, {"Jet_btagPNetB_1", "Jet_btagPNetB_2"});
+}
+
+RNode DijetFlavourFilter(RNode df, int k){
+  return df.Filter([k](int flavour){ return flavour == k; }, {"Jet_DijetFlavour"});
+}
+
+// Capture of the RDataFrame info log (jitting time, event loop cpu and elapsed time), read by helpers/metrics.py.
+#if ROOT_VERSION_CODE >= ROOT_VERSION(6,30,0)
+namespace RLogNS = ROOT;
+#else
+namespace RLogNS = ROOT::Experimental;
+#endif
+
+class RDFLogCapture : public RLogNS::RLogHandler {
+public:
+  std::vector<std::string> fMessages;
+  std::mutex fMutex;
+  bool Emit(const RLogNS::RLogEntry &entry) override {
+    if (entry.fChannel != &ROOT::Detail::RDF::RDFLogChannel()) return true;
+    std::lock_guard<std::mutex> lock(fMutex);
+    fMessages.push_back(entry.fMessage);
+    // Captured messages are not printed
+    return false;
+  }
+};
+
+RDFLogCapture *&RDFLogCaptureHandler(){
+  static RDFLogCapture *handler = nullptr;
+  return handler;
+}
+
+void CaptureRDFLog(){
+  if (RDFLogCaptureHandler()) return;
+  auto handler = std::make_unique<RDFLogCapture>();
+  RDFLogCaptureHandler() = handler.get();
+  RLogNS::RLogManager::Get().PushFront(std::move(handler));
+  ROOT::Detail::RDF::RDFLogChannel().SetVerbosity(RLogNS::ELogLevel::kInfo);
+}
+
+std::vector<std::string> RDFLogMessages(){
+  if (!RDFLogCaptureHandler()) return {};
+  std::lock_guard<std::mutex> lock(RDFLogCaptureHandler()->fMutex);
+  return RDFLogCaptureHandler()->fMessages;
+}
+
+// Compact histogram storage (see helpers/histstorage.py). RDataFrame fills one copy of each histogram per slot
+// and merges them at the end of the event loop, so the storage of every booked histogram is multiplied by the number of threads.
+
+// Histograms with float bin contents (the sum of squared weights of weighted fills is always stored in double)
+ROOT::RDF::RResultPtr<TH1F> FloatHisto1D(ROOT::RDF::RNode df, const std::string &name, int nx, double xmin, double xmax,
+                                         const std::vector<std::string> &columns){
+  TH1F model(name.c_str(), "", nx, xmin, xmax);
+  model.SetDirectory(nullptr);
+  return df.Fill(std::move(model), columns);
+}
+
+ROOT::RDF::RResultPtr<TH2F> FloatHisto2D(ROOT::RDF::RNode df, const std::string &name, int nx, double xmin, double xmax,
+                                         int ny, double ymin, double ymax, const std::vector<std::string> &columns){
+  TH2F model(name.c_str(), "", nx, xmin, xmax, ny, ymin, ymax);
+  model.SetDirectory(nullptr);
+  return df.Fill(std::move(model), columns);
+}
+
+// 2D histogram storing only the filled bins (sum of weights and of squared weights, in double), for the maps with
+// fine binning and mostly empty bins. Dense() gives the equivalent TH2D, to be written instead of this object.
+class SparseHisto2D : public TNamed {
+  TAxis fXaxis, fYaxis;
+  std::unordered_map<Int_t, std::pair<double, double>> fBins;
+  Long64_t fEntries = 0;
+public:
+  SparseHisto2D() = default;
+  SparseHisto2D(const char *name, int nx, double xmin, double xmax, int ny, double ymin, double ymax)
+    : TNamed(name, ""), fXaxis(nx, xmin, xmax), fYaxis(ny, ymin, ymax) {}
+
+  // Global bin numbering of TH2 (under/overflow included)
+  void Fill(double x, double y, double w = 1.){
+    auto &bin = fBins[fYaxis.FindFixBin(y)*(fXaxis.GetNbins()+2) + fXaxis.FindFixBin(x)];
+    bin.first += w;
+    bin.second += w*w;
+    fEntries++;
+  }
+
+  void Reset(Option_t * = ""){
+    fBins.clear();
+    fEntries = 0;
+  }
+
+  Long64_t Merge(TCollection *list){
+    for (TObject *obj : *list) {
+      auto *other = dynamic_cast<SparseHisto2D *>(obj);
+      if (!other) continue;
+      for (const auto &bin : other->fBins) {
+        auto &sums = fBins[bin.first];
+        sums.first += bin.second.first;
+        sums.second += bin.second.second;
+      }
+      fEntries += other->fEntries;
+    }
+    return fEntries;
+  }
+
+  std::size_t FilledBins() const { return fBins.size(); }
+
+  TH2D *Dense() const {
+    auto *h = new TH2D(GetName(), GetTitle(), fXaxis.GetNbins(), fXaxis.GetXmin(), fXaxis.GetXmax(),
+                       fYaxis.GetNbins(), fYaxis.GetXmin(), fYaxis.GetXmax());
+    h->SetDirectory(nullptr);
+    h->Sumw2();
+    for (const auto &bin : fBins) {
+      h->SetBinContent(bin.first, bin.second.first);
+      h->SetBinError(bin.first, std::sqrt(bin.second.second));
+    }
+    h->ResetStats();
+    h->SetEntries(fEntries);
+    return h;
+  }
+
+  ClassDefOverride(SparseHisto2D, 1);
+};
+
+ROOT::RDF::RResultPtr<SparseHisto2D> BookSparseHisto2D(ROOT::RDF::RNode df, const std::string &name, int nx, double xmin, double xmax,
+                                                       int ny, double ymin, double ymax, const std::vector<std::string> &columns){
+  return df.Fill(SparseHisto2D(name.c_str(), nx, xmin, xmax, ny, ymin, ymax), columns);
+}
+
+#endif
@@ -0,0 +1,269 @@
+#ifndef JETCORRECTIONS_H
+#define JETCORRECTIONS_H
+
+#include "ROOT/RDataFrame.hxx"
+#include "ROOT/RVec.hxx"
+#include "correction.h"
+
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <fstream>
+#include <functional>
+#include <memory>
+#include <random>
+#include <sstream>
+#include <string>
+#include <vector>
+
+using ROOT::VecOps::RVec;
+
+// Raw pT from the corrected pT and the raw factor
+RVec<float> JetRawPt(const RVec<float> &pt, const RVec<float> &rawf){
+  RVec<float> Jet_rawPt(pt.size());
+  for(unsigned int i=0; i<pt.size(); i++){
+    Jet_rawPt[i] = pt[i] * (1 - rawf[i]);
+  }
+  return Jet_rawPt;
+}
+
+// Jet Energy Corrections (L1FastJet, L2Relative (MC only), L3Absolute, L2L3Residual) for one JEC configuration.
+// An instance is declared per configuration in corrections_modified.setupjecs and called as a function in the RDataFrame graph.
+// With compound=true, the L1L2L3Res compound correction of the file is evaluated instead, in one call per jet
+// (standard stacked chain: the jet pT is updated after each level and L2Relative is also applied to data).
+class JetCorrector {
+public:
+  JetCorrector(const std::string &JECfile, const std::string &corrfile, bool compound=false) : compound_(compound){
+    cset_ = correction::CorrectionSet::from_file(JECfile);
+    l1_ = cset_->at(corrfile + "L1FastJet_AK4PFPuppi");
+    l2_ = cset_->at(corrfile + "L2Relative_AK4PFPuppi");
+    l3_ = cset_->at(corrfile + "L3Absolute_AK4PFPuppi");
+    residual_ = cset_->at(corrfile + "L2L3Residual_AK4PFPuppi");
+    if (compound_) l1l2l3res_ = cset_->compound().at(corrfile + "L1L2L3Res_AK4PFPuppi");
+  }
+
+  // Any other correction of the same file (e.g. the JES uncertainty sources)
+  correction::Correction::Ref at(const std::string &name) const { return cset_->at(name); }
+
+  // Correction factor of a single jet
+  float Factor(float area, float eta, float pt, float rho, bool isData) const {
+    RVec<float> corPt = (*this)({area}, {eta}, {0.f}, {pt}, {0.f}, rho, isData);
+    return corPt[0]/pt;
+  }
+
+  // Corrected pT of all the jets
+  RVec<float> operator()(const RVec<float> &area,
+                         const RVec<float> &eta,
+                         const RVec<float> &phi,
+                         const RVec<float> &pt,
+                         const RVec<float> &rawf,
+                         const float &rho,
+                         const bool &isData) const {
+    return (*this)(area, eta, phi, pt, rawf, rho, isData, RVec<int>(pt.size(), 1));
+  }
+
+  // Corrected pT of the jets with needed[i] true. The other jets (e.g. jets failing the ID, that can never be selected) keep their pT.
+  // The argument vectors are allocated once per event and reused for all jets.
+  RVec<float> operator()(const RVec<float> &area,
+                         const RVec<float> &eta,
+                         const RVec<float> &phi,
+                         const RVec<float> &pt,
+                         const RVec<float> &rawf,
+                         const float &rho,
+                         const bool &isData,
+                         const RVec<int> &needed) const {
+    RVec<float> Jet_corPt(pt);
+    std::vector<correction::Variable::Type> args4(4), args2(2);
+    for(unsigned int i=0; i<pt.size(); i++){
+      if(!needed[i]) continue;
+      args4[0] = area[i]; args4[1] = eta[i]; args4[2] = pt[i]; args4[3] = rho;
+      if(compound_){
+        Jet_corPt[i] = l1l2l3res_->evaluate(args4)*pt[i];
+        continue;
+      }
+      float sf = l1_->evaluate(args4);
+      args2[0] = eta[i]; args2[1] = pt[i];
+      if(!isData){
+        sf *= l2_->evaluate(args2);
+        // sf *= l2_->evaluate({eta[i], phi[i], pt[i]}); // For phi dependent jecs (2023Bpix, 2024)
+      }
+      sf *= l3_->evaluate(args2);
+      sf *= residual_->evaluate(args2);
+      Jet_corPt[i] = sf*pt[i];
+    }
+    return Jet_corPt;
+  }
+
+private:
+  std::unique_ptr<correction::CorrectionSet> cset_;
+  correction::Correction::Ref l1_, l2_, l3_, residual_;
+  correction::CompoundCorrection::Ref l1l2l3res_;
+  bool compound_;
+};
+
+// Tabulated JECs: the combined correction factor of a JetCorrector is precomputed on a dense (area, eta, log(pt), rho) grid,
+// cached on disk, and jets are corrected by multilinear interpolation (values outside the grid are clamped to its edges).
+// Meant for quick studies: Validate gives the deviation from the exact evaluation.
+class JetCorrectionTable {
+public:
+  struct Axis {
+    int n; float min, max;
+    // Lower grid index and fraction of the way to the next point
+    void Locate(float x, int &i, float &f) const {
+      float u = (std::min(std::max(x, min), max) - min)/(max - min)*(n-1);
+      i = std::min(int(u), n-2);
+      f = u - i;
+    }
+    float Point(int i) const { return min + (max-min)*i/(n-1); }
+  };
+
+  JetCorrectionTable(const JetCorrector &jec, bool isData, const std::string &cachefile,
+                     Axis area={9, 0.2, 1.0}, Axis eta={105, -5.2, 5.2}, Axis logpt={80, std::log(8.f), std::log(6500.f)}, Axis rho={17, 0., 80.})
+    : axes_{area, eta, logpt, rho} {
+    if (Load(cachefile)) return;
+    table_.resize(size_t(axes_[0].n)*axes_[1].n*axes_[2].n*axes_[3].n);
+    size_t k = 0;
+    for(int a=0; a<axes_[0].n; a++) for(int e=0; e<axes_[1].n; e++) for(int p=0; p<axes_[2].n; p++) for(int r=0; r<axes_[3].n; r++)
+      table_[k++] = jec.Factor(axes_[0].Point(a), axes_[1].Point(e), std::exp(axes_[2].Point(p)), axes_[3].Point(r), isData);
+    Save(cachefile);
+    built_ = true;
+  }
+
+  // True if the table was computed (and not read from the cache file)
+  bool Built() const { return built_; }
+
+  float Factor(float area, float eta, float pt, float rho) const {
+    int i[4]; float f[4];
+    axes_[0].Locate(area, i[0], f[0]); axes_[1].Locate(eta, i[1], f[1]);
+    axes_[2].Locate(std::log(pt), i[2], f[2]); axes_[3].Locate(rho, i[3], f[3]);
+    float sf = 0;
+    for(int corner=0; corner<16; corner++){
+      size_t k = 0; float w = 1;
+      for(int d=0; d<4; d++){
+        int up = (corner >> d) & 1;
+        k = k*axes_[d].n + i[d] + up;
+        w *= up ? f[d] : 1-f[d];
+      }
+      sf += w*table_[k];
+    }
+    return sf;
+  }
+
+  RVec<float> operator()(const RVec<float> &area, const RVec<float> &eta, const RVec<float> &phi, const RVec<float> &pt,
+                         const RVec<float> &rawf, const float &rho, const bool &isData) const {
+    return (*this)(area, eta, phi, pt, rawf, rho, isData, RVec<int>(pt.size(), 1));
+  }
+
+  RVec<float> operator()(const RVec<float> &area, const RVec<float> &eta, const RVec<float> &phi, const RVec<float> &pt,
+                         const RVec<float> &rawf, const float &rho, const bool &isData, const RVec<int> &needed) const {
+    RVec<float> Jet_corPt(pt);
+    for(unsigned int i=0; i<pt.size(); i++){
+      if(needed[i]) Jet_corPt[i] = Factor(area[i], eta[i], pt[i], rho)*pt[i];
+    }
+    return Jet_corPt;
+  }
+
+  // Deviation from the exact evaluation for n random jets uniformly distributed in the grid (log-uniform in pT)
+  std::string Validate(const JetCorrector &jec, bool isData, int n=100000, int seed=1) const {
+    std::mt19937 rnd(seed);
+    auto uniform = [&](const Axis &axis){ return std::uniform_real_distribution<float>(axis.min, axis.max)(rnd); };
+    double maxAbs = 0, maxRel = 0, sumRel = 0;
+    float worst[4] = {0, 0, 0, 0};
+    for(int j=0; j<n; j++){
+      float area = uniform(axes_[0]), eta = uniform(axes_[1]), pt = std::exp(uniform(axes_[2])), rho = uniform(axes_[3]);
+      double exact = jec.Factor(area, eta, pt, rho, isData);
+      double diff = std::abs(Factor(area, eta, pt, rho) - exact);
+      sumRel += diff/std::abs(exact);
+      maxAbs = std::max(maxAbs, diff);
+      if (diff/std::abs(exact) > maxRel){
+        maxRel = diff/std::abs(exact);
+        worst[0] = area; worst[1] = eta; worst[2] = pt; worst[3] = rho;
+      }
+    }
+    std::ostringstream report;
+    report << "Tabulated JEC validation on " << n << " random jets (" << table_.size() << " grid points)\n"
+           << "  maximum absolute deviation of the correction factor: " << maxAbs << "\n"
+           << "  maximum relative deviation: " << maxRel << " (area=" << worst[0] << ", eta=" << worst[1]
+           << ", pt=" << worst[2] << ", rho=" << worst[3] << ")\n"
+           << "  mean relative deviation: " << sumRel/n << "\n";
+    return report.str();
+  }
+
+private:
+  bool Load(const std::string &cachefile){
+    std::ifstream in(cachefile, std::ios::binary);
+    if (!in) return false;
+    Axis axes[4];
+    in.read(reinterpret_cast<char*>(axes), sizeof(axes));
+    for(int d=0; d<4; d++){
+      if (!in || axes[d].n != axes_[d].n || axes[d].min != axes_[d].min || axes[d].max != axes_[d].max) return false;
+    }
+    table_.resize(size_t(axes_[0].n)*axes_[1].n*axes_[2].n*axes_[3].n);
+    in.read(reinterpret_cast<char*>(table_.data()), table_.size()*sizeof(float));
+    return bool(in);
+  }
+
+  void Save(const std::string &cachefile) const {
+    std::ofstream out(cachefile, std::ios::binary);
+    out.write(reinterpret_cast<const char*>(axes_), sizeof(axes_));
+    out.write(reinterpret_cast<const char*>(table_.data()), table_.size()*sizeof(float));
+  }
+
+  Axis axes_[4];
+  std::vector<float> table_;
+  bool built_ = false;
+};
+
+// JES uncertainty for one source, as a RDataFrame variation of the corrected jet pT: returns {up, down}
+class JetUncertainty {
+public:
+  JetUncertainty(const JetCorrector &jec, const std::string &name) : unc_(jec.at(name)) {}
+
+  RVec<RVec<float>> operator()(const RVec<float> &eta, const RVec<float> &pt) const {
+    RVec<float> up(pt.size()), down(pt.size());
+    std::vector<correction::Variable::Type> args2(2);
+    for(unsigned int i=0; i<pt.size(); i++){
+      args2[0] = eta[i]; args2[1] = pt[i];
+      float unc = unc_->evaluate(args2);
+      up[i] = pt[i]*(1+unc);
+      down[i] = pt[i]*(1-unc);
+    }
+    return {up, down};
+  }
+
+private:
+  correction::Correction::Ref unc_;
+};
+
+// Typed booking of the corrections in the RDataFrame graph (see GammaZSelection in helper_gammaztobb.py), not JIT-compiled.
+// Jet_pt is redefined with the corrected pT of the jets passing the jet ID (Jet_CleanID), the other jets keep their pT.
+// timer (if set, see DefineTimer in Helper.h) is called with the evaluation time in ns of every call.
+template <typename Corrector>
+ROOT::RDF::RNode CorrectJetPtWith(ROOT::RDF::RNode df, const Corrector &jec, bool isData, std::function<void(long long)> timer){
+  const Corrector *corrector = &jec;
+  return df.Redefine("Jet_pt", [corrector, isData, timer](const RVec<float> &area, const RVec<float> &eta, const RVec<float> &phi,
+                                                         const RVec<float> &pt, const RVec<float> &rawf, float rho, const RVec<int> &needed){
+    if (!timer) return (*corrector)(area, eta, phi, pt, rawf, rho, isData, needed);
+    auto start = std::chrono::steady_clock::now();
+    RVec<float> corPt = (*corrector)(area, eta, phi, pt, rawf, rho, isData, needed);
+    timer(std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - start).count());
+    return corPt;
+  }, {"Jet_area", "Jet_eta", "Jet_phi", "Jet_pt", "Jet_rawFactor", "Rho_fixedGridRhoFastjetAll", "Jet_CleanID"});
+}
+
+ROOT::RDF::RNode CorrectJetPt(ROOT::RDF::RNode df, const JetCorrector &jec, bool isData, std::function<void(long long)> timer = {}){
+  return CorrectJetPtWith(df, jec, isData, timer);
+}
+
+ROOT::RDF::RNode CorrectJetPt(ROOT::RDF::RNode df, const JetCorrectionTable &jec, bool isData, std::function<void(long long)> timer = {}){
+  return CorrectJetPtWith(df, jec, isData, timer);
+}
+
+// Up/down variations of the corrected jet pT for one JES uncertainty source, named name
+ROOT::RDF::RNode VaryJetPt(ROOT::RDF::RNode df, const JetUncertainty &jes, const std::string &name){
+  const JetUncertainty *uncertainty = &jes;
+  return df.Vary("Jet_pt", [uncertainty](const RVec<float> &eta, const RVec<float> &pt){ return (*uncertainty)(eta, pt); },
+                 {"Jet_eta", "Jet_pt"}, {"up", "down"}, name);
+}
+
+#endif
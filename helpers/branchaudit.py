@@ -0,0 +1,75 @@
+import os
+import json
+
+'''
+Audit of the input branches read by the event loop: after a sequential event loop, the branches of the Events tree
+whose entries were read (TBranch::GetReadEntry) are listed with their compressed and uncompressed size in the input
+file. Only one file of a chain is audited, the last one read by the event loop: the chain deletes the tree of a file
+when it moves to the next one, so the branches read only in the other files are not seen (audit a single file to be exhaustive). The branches read are compared to the expected ones (macros/branches_expected.txt): an unexpected branch heavier
+than a threshold (compressed bytes per event) fails the audit, so that a change reading a heavy branch is noticed.
+A failed audit makes analysis.py exit with AUDIT_EXIT_CODE after writing its (valid) output: condor jobs with this
+exit code are not resubmitted (status audit_failed, see condorsubmission/manifest.py).
+'''
+
+AUDIT_EXIT_CODE = 2
+
+DEFAULT_EXPECTED = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'macros', 'branches_expected.txt')
+
+def add_audit_arguments(parser):
+    '''
+    Add the branch audit options to an argparse parser.
+    '''
+    parser.add_argument("--branch_audit", dest="branch_audit", help="Json file where the branches read by the event loop and their size are written (the event loop is run sequentially)", type=str, default='')
+    parser.add_argument("--expected_branches", dest="expected_branches", help="List of the branches expected to be read. Default=branches_expected.txt", type=str, default=DEFAULT_EXPECTED)
+    parser.add_argument("--heavy_branch_bytes", dest="heavy_branch_bytes", help="Compressed size per event (bytes) above which an unexpected branch fails the audit. Default=50", type=float, default=50.)
+
+def load_expected(path=DEFAULT_EXPECTED):
+    with open(path) as f:
+        return set(l.strip() for l in f if l.strip() and not l.startswith('#'))
+
+def branch_report(chain):
+    '''
+    Branches read by the event loop in the current tree of chain (the last file read), sorted by compressed size,
+    and totals of the tree. The sizes are those of the whole tree (file), also given per event.
+    '''
+    tree = chain.GetTree()
+    entries = max(1, tree.GetEntries())
+    read, total_zip, total_tot = [], 0, 0
+    for branch in tree.GetListOfBranches():
+        zipbytes, totbytes = branch.GetZipBytes('*'), branch.GetTotBytes('*')
+        total_zip += zipbytes
+        total_tot += totbytes
+        if branch.GetReadEntry() >= 0:
+            read.append({'name': branch.GetName(), 'compressed_bytes': zipbytes, 'uncompressed_bytes': totbytes,
+                         'compressed_per_event': zipbytes/entries, 'uncompressed_per_event': totbytes/entries})
+    read.sort(key=lambda b: -b['compressed_bytes'])
+    return {'file': tree.GetCurrentFile().GetName(), 'file_number': chain.GetTreeNumber(), 'chain_files': chain.GetListOfFiles().GetEntries(),
+            'entries': tree.GetEntries(),
+            'branches': len(tree.GetListOfBranches()), 'branches_read': len(read),
+            'compressed_bytes': total_zip, 'uncompressed_bytes': total_tot,
+            'read_compressed_bytes': sum(b['compressed_bytes'] for b in read),
+            'read_uncompressed_bytes': sum(b['uncompressed_bytes'] for b in read),
+            'read': read}
+
+def print_report(name, report):
+    print('*** Branches read for {} ({}, file {} of {} of the chain): {} of {} branches, {:.1f} of {:.1f} MB compressed ({:.1%}), {:.1f} of {:.1f} MB uncompressed ***'.format(
+        name, report['file'], report['file_number']+1, report['chain_files'], report['branches_read'], report['branches'], report['read_compressed_bytes']/1e6, report['compressed_bytes']/1e6,
+        report['read_compressed_bytes']/max(1, report['compressed_bytes']), report['read_uncompressed_bytes']/1e6, report['uncompressed_bytes']/1e6))
+    print('{:<45}{:>15}{:>15}{:>12}'.format('branch', 'compressed', 'uncompressed', 'B/event'))
+    for b in report['read']:
+        print('{:<45}{:>15}{:>15}{:>12.1f}'.format(b['name'], b['compressed_bytes'], b['uncompressed_bytes'], b['compressed_per_event']))
+
+def check(report, expected, heavy_bytes):
+    '''
+    Compare the branches read to the expected ones. Returns the unexpected branches heavier than heavy_bytes
+    (compressed, per event): the audit fails if there is any.
+    '''
+    unexpected = [b for b in report['read'] if b['name'] not in expected]
+    heavy = [b for b in unexpected if b['compressed_per_event'] > heavy_bytes]
+    for b in unexpected:
+        print('{} unexpected branch {} ({:.1f} B/event)'.format('Error: heavy' if b in heavy else 'Warning:', b['name'], b['compressed_per_event']))
+    return heavy
+
+def write_reports(reports, path):
+    with open(path, 'w') as f:
+        json.dump(reports, f, indent=1)
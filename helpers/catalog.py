@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import zlib
+import argparse
+
+from inputs import expand_inputs, file_info
+
+'''
+Catalog of the input NanoAOD files (macros/catalog.json), indexed by path: size, modification time, number of entries
+of the Events tree, sum of the generator weights (genEventSumw of the Runs tree, None for data) and adler32 checksum.
+A file is only opened when it is first seen or when its size or modification time changed, so that partition_jobs.py
+and analysis.py get the number of events and sum of weights of thousands of files without reopening them.
+
+From the helpers folder:
+    python3 catalog.py scan 'INPUTS'     add the new or modified files to the catalog (with their checksum)
+    python3 catalog.py scan -s SAMPLE    same for the files of a sample of the registry
+    python3 catalog.py show 'INPUTS'     number of files, events and size of the inputs
+'''
+
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'macros', 'catalog.json')
+
+def load(path=DEFAULT_CATALOG):
+    '''
+    Read a catalog, {path: record}. Empty if it does not exist yet.
+    '''
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save(catalog, path=DEFAULT_CATALOG):
+    '''
+    Write the catalog (through a temporary file, so that jobs reading it never see a partial file).
+    '''
+    tmp = path+'.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(catalog, f, indent=0, sort_keys=True)
+    os.replace(tmp, path)
+
+def checksum(path):
+    '''
+    adler32 checksum of a file, as an 8 digit hexadecimal string.
+    '''
+    value = 1
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            value = zlib.adler32(block, value)
+    return '{:08x}'.format(value)
+
+def _stat(path):
+    '''
+    Size and modification time of a local (or mounted, e.g. /pnfs) file, None for remote urls.
+    '''
+    try:
+        st = os.stat(path)
+        return st.st_size, int(st.st_mtime)
+    except OSError:
+        return None, None
+
+def scan(catalog, files, with_checksum=True):
+    '''
+    Add to the catalog the files not cataloged yet or modified since (size or modification time changed),
+    and compute the missing checksums if with_checksum. Returns the number of files opened.
+    '''
+    stale, stats = [], {}
+    for f in files:
+        stats[f] = _stat(f)
+        record = catalog.get(f)
+        if record is None or (stats[f][0] is not None and (record['size'], record['mtime']) != stats[f]):
+            stale.append(f)
+    for f, info in file_info(stale).items():
+        catalog[f] = {'size': stats[f][0], 'mtime': stats[f][1], 'entries': info['entries'], 'genEventSumw': info['genEventSumw'], 'checksum': None}
+    if with_checksum:
+        for f in files:
+            if catalog[f]['checksum'] is None and stats[f][0] is not None:
+                catalog[f]['checksum'] = checksum(f)
+    return len(stale)
+
+def lookup(files, path=DEFAULT_CATALOG, update=False):
+    '''
+    Number of entries and sum of generator weights of each file, {file: {'entries', 'genEventSumw'}} as inputs.file_info,
+    from the catalog path. The files missing from the catalog are opened, and added to it if update (no checksum).
+    '''
+    catalog = load(path)
+    missing = [f for f in files if f not in catalog]
+    if missing:
+        print('{} of {} files not in the catalog {}'.format(len(missing), len(files), path))
+        scan(catalog, missing, with_checksum=False)
+        if update:
+            save(catalog, path)
+    return {f: {'entries': catalog[f]['entries'], 'genEventSumw': catalog[f]['genEventSumw']} for f in files}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''Catalog of the input files: number of entries, sum of weights, size and checksum''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("command", help="scan: add the new or modified input files to the catalog\nshow: summary of the input files", choices=['scan', 'show'])
+    parser.add_argument("inputs", help="Input files: files, glob patterns (quoted) or .txt file lists", nargs='*', type=str)
+    parser.add_argument("-s", "--sample", dest="sample", help="Files of a sample of the registry (instead of inputs)", type=str, default='')
+    parser.add_argument("-c", "--catalog", dest="catalog", help="Catalog file. Default=macros/catalog.json", type=str, default=DEFAULT_CATALOG)
+    parser.add_argument("--no_checksum", dest="no_checksum", help="Do not compute the checksums of the new files (reading them entirely)", action='store_true')
+    args = parser.parse_args()
+
+    if args.sample != '':
+        import sampleregistry
+        files = sampleregistry.sample_files(sampleregistry.get(sampleregistry.load(), args.sample))
+    else:
+        files = expand_inputs(args.inputs)
+    if not files:
+        print('No input file')
+        return 1
+
+    catalog = load(args.catalog)
+    if args.command == 'scan':
+        opened = scan(catalog, files, not args.no_checksum)
+        save(catalog, args.catalog)
+        print('{} files, {} new or modified'.format(len(files), opened))
+    missing = [f for f in files if f not in catalog]
+    records = [catalog[f] for f in files if f in catalog]
+    print('{} files cataloged ({} missing): {} events, {:.1f} GB'.format(
+        len(records), len(missing), sum(r['entries'] for r in records), sum(r['size'] or 0 for r in records)/1e9))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
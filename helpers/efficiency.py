@@ -0,0 +1,145 @@
+import numpy as np
+import histarrays
+
+'''
+Vectorised efficiency curves (ROC, significance) from binned distributions.
+Each histogram is turned once into the cumulative sum of its bin contents: the amount passing a cut is then
+read for all the thresholds at once, and for any number of histograms sharing the same binning
+(e.g. all flavours of a variable), stacked as the rows of a 2D array.
+The overflow bin is kept as the last column of the contents (nbins+1 columns, see histogram_arrays): it passes the
+x > threshold cuts and counts in the total, as with TH1::Integral(FindBin(threshold), nbins+1). The underflow bin is dropped.
+'''
+
+def histogram_arrays(hist, overflow=True):
+    '''
+    Bin edges and bin contents (without underflow, with the overflow bin last unless overflow is False) of a TH1 as numpy arrays.
+    '''
+    return histarrays.edges(hist), histarrays.values(hist, flow=True)[1:] if overflow else histarrays.values(hist)
+
+def read_histograms(tfile, names):
+    '''
+    Read the histograms names from tfile, skipping the missing or empty ones.
+    Returns the names found, their (common) bin edges and their contents as a (len(found), nbins) array.
+    '''
+    found, rows, edges = [], [], None
+    for name in names:
+        hist = tfile.Get(name)
+        if not hist or hist.Integral() == 0:
+            print(f'Skipping {name} (not found or empty)')
+            continue
+        hist_edges, contents = histogram_arrays(hist)
+        if edges is None:
+            edges = hist_edges
+        elif not np.array_equal(edges, hist_edges):
+            raise ValueError(f'{name} does not have the binning of {found[0]}')
+        found.append(name)
+        rows.append(contents)
+    return found, edges, np.array(rows)
+
+def read_histogram_pairs(file_sg, file_bg, sg_names, bg_names):
+    '''
+    Read matching signal and background histograms (sg_names[i] in file_sg, bg_names[i] in file_bg), skipping the pairs
+    where one of them is missing or empty. Returns the indices of the pairs kept, the bin edges and the signal and background contents.
+    '''
+    kept, sg_rows, bg_rows, edges = [], [], [], None
+    for i, (sg_name, bg_name) in enumerate(zip(sg_names, bg_names)):
+        _, sg_edges, sg = read_histograms(file_sg, [sg_name])
+        _, bg_edges, bg = read_histograms(file_bg, [bg_name])
+        if len(sg) == 0 or len(bg) == 0:
+            continue
+        if not np.array_equal(sg_edges, bg_edges) or (edges is not None and not np.array_equal(edges, sg_edges)):
+            raise ValueError(f'{sg_name} and {bg_name} do not have the binning of the other histograms')
+        edges = sg_edges
+        kept.append(i)
+        sg_rows.append(sg[0])
+        bg_rows.append(bg[0])
+    return kept, edges, np.array(sg_rows), np.array(bg_rows)
+
+def passing(edges, contents, thresholds, cut_dir='less'):
+    '''
+    Sum of the bin contents passing the cut x < threshold (cut_dir 'less') or x > threshold (cut_dir 'greater'), for every threshold.
+    As with TH1::Integral(1, FindBin(threshold)) (resp. Integral(FindBin(threshold), nbins+1)), the bin containing the threshold passes,
+    and the overflow bin passes the 'greater' cuts (and the 'less' cuts with a threshold above the last edge).
+    contents has shape (..., nbins), or (..., nbins+1) with the overflow bin last, one row per histogram;
+    the result has shape (..., len(thresholds)).
+    '''
+    contents = np.asarray(contents, dtype=float)
+    nbins, cells = len(edges)-1, contents.shape[-1]
+    if cells not in [nbins, nbins+1]:
+        raise ValueError(f'{cells} bin contents for {nbins} bins')
+    cumsum = np.concatenate([np.zeros(contents.shape[:-1]+(1,)), np.cumsum(contents, axis=-1)], axis=-1)
+    # Bin number of each threshold as given by FindBin: 0 (underflow) to nbins+1 (overflow)
+    bins = np.searchsorted(edges, thresholds, side='right')
+    if cut_dir == 'less':
+        return cumsum[..., np.clip(bins, 0, cells)]
+    if cut_dir == 'greater':
+        return cumsum[..., -1:] - cumsum[..., np.clip(bins, 1, nbins+1)-1]
+    raise ValueError(f'Unknown cut direction {cut_dir}')
+
+def efficiency(edges, contents, thresholds, cut_dir='less'):
+    '''
+    Fraction of the histogram(s) passing the cut for every threshold, see passing.
+    '''
+    contents = np.asarray(contents, dtype=float)
+    return passing(edges, contents, thresholds, cut_dir)/np.sum(contents, axis=-1, keepdims=True)
+
+def roc(edges, sg, bg, thresholds, cut_dir='less'):
+    '''
+    ROC curve(s) of the signal (sg) vs background (bg) contents, with one point per threshold.
+    Returns FPR (background efficiency) and TPR (signal efficiency) sorted by increasing FPR, and the area under the curve.
+    '''
+    tpr = efficiency(edges, sg, thresholds, cut_dir)
+    fpr = efficiency(edges, bg, thresholds, cut_dir)
+    order = np.lexsort((tpr, fpr), axis=-1)
+    fpr = np.take_along_axis(fpr, order, axis=-1)
+    tpr = np.take_along_axis(tpr, order, axis=-1)
+    auc = np.sum(np.diff(fpr, axis=-1)*(tpr[..., 1:]+tpr[..., :-1])/2, axis=-1)
+    return fpr, tpr, auc
+
+def significance(edges, sg, bg, thresholds, cut_dir='less', normalise=True):
+    '''
+    S/sqrt(S+B) for every threshold, nan where S+B = 0.
+    With normalise, S and B are the signal and background efficiencies instead of the passing yields.
+    '''
+    compute = efficiency if normalise else passing
+    S = compute(edges, sg, thresholds, cut_dir)
+    B = compute(edges, bg, thresholds, cut_dir)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(S+B > 0, S/np.sqrt(S+B), np.nan)
+
+def histogram2d_arrays(hist, overflow=True):
+    '''
+    Bin edges along x and y and bin contents (indexed [x bin, y bin], without underflow, with the overflow bins last
+    along both axes unless overflow is False) of a TH2 as numpy arrays.
+    '''
+    contents = histarrays.values(hist, flow=True)[1:, 1:] if overflow else histarrays.values(hist)
+    return histarrays.edges(hist, 'x'), histarrays.edges(hist, 'y'), contents
+
+def passing_2d(xedges, yedges, contents, thresholds_x, thresholds_y):
+    '''
+    Sum of the bin contents passing both x > threshold_x and y > threshold_y, for every pair of thresholds.
+    The reverse 2D cumulative sum (summed-area table) is built once, so that each pair of thresholds is a single lookup.
+    As in passing, the bins containing the thresholds pass, and the overflow bins pass, as with
+    TH2::Integral(FindBin(threshold_x), nx+1, FindBin(threshold_y), ny+1).
+    contents has shape (..., nx, ny), or (..., nx+1, ny+1) with the overflow bins last (see histogram2d_arrays);
+    the result has shape (..., len(thresholds_x), len(thresholds_y)).
+    '''
+    contents = np.asarray(contents, dtype=float)
+    nx, ny = len(xedges)-1, len(yedges)-1
+    cx, cy = contents.shape[-2:]
+    if (cx, cy) not in [(nx, ny), (nx+1, ny+1)]:
+        raise ValueError(f'{cx}x{cy} bin contents for {nx}x{ny} bins')
+    table = np.zeros(contents.shape[:-2]+(cx+1, cy+1))
+    table[..., :cx, :cy] = np.flip(np.cumsum(np.cumsum(np.flip(contents, (-2, -1)), axis=-2), axis=-1), (-2, -1))
+    ix = np.clip(np.searchsorted(xedges, thresholds_x, side='right'), 1, nx+1)-1
+    iy = np.clip(np.searchsorted(yedges, thresholds_y, side='right'), 1, ny+1)-1
+    return table[..., ix[:, None], iy[None, :]]
+
+def best_working_point(significances, thresholds_x, thresholds_y, min_threshold=0.):
+    '''
+    Indices (i, j) of the highest significance on a (len(thresholds_x), len(thresholds_y)) grid,
+    among the working points with both thresholds >= min_threshold.
+    '''
+    allowed = (np.asarray(thresholds_x)[:, None] >= min_threshold) & (np.asarray(thresholds_y)[None, :] >= min_threshold)
+    masked = np.where(allowed & ~np.isnan(significances), significances, -np.inf)
+    return np.unravel_index(np.argmax(masked), masked.shape)
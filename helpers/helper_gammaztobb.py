@@ -11,6 +11,8 @@ import numpy as np
 
 #For JECs
 from corrections_modified import *
+#Histogram precision, binning and memory estimate
+import histstorage
 
 '''
 TO DO : uniformize mjj_partonflavour vs mjj_PartonFlavour
@@ -37,32 +39,100 @@ efficiencies = {
         0.9: (0.11, 0.061, 0.077)
 }
 
+# Columns written in the skim (events passing the baseline selection), see SkimSnapshot
+skim_columns = ['Mjj', 'Jet_pt1', 'Jet_pt2', 'Jet_delta_eta', 'Jet_delta_phi', 'Jet_delta_pT', 'Jet_pT2pT1', 'Jet_delta_R',
+                'Jet_btagPNetB_1', 'Jet_btagPNetB_2', 'Photon_pt1', 'Photon_eta1', 'Photon_phi1', 'Weight']
+
+# Expensive Defines whose evaluation time is measured (analysis.py --metrics), see DefineTimer
+timed_defines = set()
+
+def DefineTimer(name):
+    '''
+    Timer accumulating the evaluation time of the compiled Define name (see Helper.h), if name is in timed_defines.
+    Otherwise an empty timer: the Define is not timed.
+    '''
+    if name not in timed_defines:
+        return ROOT.TimerCallback()
+    ROOT.RegisterDefineTimer(name)
+    return ROOT.DefineTimer(name)
+
+def CppObject(name):
+    '''
+    C++ object declared with its (namespace qualified) name, e.g. the JES functors of setupjes.
+    '''
+    obj = ROOT
+    for part in name.split('::'):
+        obj = getattr(obj, part)
+    return obj
+
 def defineWeight(df, isData):
     if isData:
-        df = df.Define("unit_weight", "1.0")
+        df = ROOT.DefineUnitWeight(ROOT.RDF.AsRNode(df))
         weight = "unit_weight"
     else:
         weight = "LHEWeight_originalXWGTUP"
     return df, weight
 
-def plot_jet_kinematics_by_flavour(df, histos, label_suffix=''):
+def book_flavour_histo(df, histos, name, binning, varname, weight, category='Jet_DijetFlavour', nflavours=5):
     """
-    Create pt and eta histograms of jets, separated by parton flavour (1 to 5).
-    Optionally, a label_suffix can be passed to distinguish histos after cuts.
+    Book the histograms of varname for the flavours 1 to nflavours as a single 2D histogram, with the flavour category on the y axis.
+    The name must contain {k}: SplitFlavourHistos replaces it by the flavour when the histogram is split after the event loop.
+    Events/jets with another category (0, gluons...) fall in the y under/overflow.
     """
-    for k in range(1, 6):
-        pt_col = f'Jet_TightID_Pt30_Central_Pt_Flavour{k}{label_suffix}'
-        eta_col = f'Jet_TightID_Pt30_Central_Eta_Flavour{k}{label_suffix}'
+    histos[name] = histstorage.Histo2D(df, name, binning, (nflavours,0.5,nflavours+0.5), varname, category, weight)
 
-        df = df.Define(pt_col, f'Jet_TightID_Pt30_Central_Pt[Jet_TightID_Pt30_Central_PartonFlavour{k}]')
-        df = df.Define(eta_col, f'Jet_TightID_Pt30_Central_Eta[Jet_TightID_Pt30_Central_PartonFlavour{k}]')
+def BookVariations(histos):
+    """
+    Book the systematic variations (e.g. JES, see GammaZSelection) of all histograms. Must be called before the event loop.
+    After the loop, VariedHistos gives the histograms of one variation.
+    """
+    return {key: ROOT.RDF.Experimental.VariationsFor(h) for key, h in histos.items()}
 
-        pt_hist_name = f'jet_pt_partonflavour{k}{label_suffix}'
-        eta_hist_name = f'jet_eta_partonflavour{k}{label_suffix}'
+def VariedHistos(variations):
+    """
+    Return {variation: histograms} for all variations (other than nominal) booked with BookVariations,
+    e.g. 'JES_Total:up'. The histograms still have to be split with SplitFlavourHistos.
+    """
+    varied = {}
+    for key, results in variations.items():
+        for variation in results.GetKeys():
+            variation = str(variation)
+            if variation == 'nominal':
+                continue
+            varied.setdefault(variation, {})[key] = results[variation]
+    return varied
+
+def SplitFlavourHistos(histos):
+    """
+    Return the histograms (event loop results), with each flavour-category histogram booked by book_flavour_histo
+    replaced by one histogram per flavour, named as the per-flavour histograms (e.g. mjj_partonflavour1),
+    and the sparse b-tagging maps (--sparse_btag) converted to TH2D.
+    Must be called after the event loop.
+    """
+    split = {}
+    for key, h in histos.items():
+        if hasattr(h, 'GetValue'):
+            h = h.GetValue()
+        h = histstorage.Dense(h)
+        if '{k}' not in key:
+            split[key] = h
+            continue
+        for k in range(1, h.GetNbinsY()+1):
+            name = key.format(k=k)
+            split[name] = h.ProjectionX(name, k, k, 'e')
+            # Detach the projection so that the next sample does not reuse it
+            split[name].SetDirectory(ROOT.nullptr)
+            split[name].SetTitle(h.GetTitle())
+    return split
+
+def plot_jet_kinematics_by_flavour(df, histos, weight, label_suffix=''):
+    """
+    Create pt and eta histograms of jets, separated by parton flavour (1 to 5).
+    Optionally, a label_suffix can be passed to distinguish histos after cuts.
+    """
+    book_flavour_histo(df, histos, f'jet_pt_partonflavour{{k}}{label_suffix}', (100, 0, 500), 'Jet_TightID_Pt30_Central_Pt', weight, category='Jet_TightID_Pt30_Central_absFlavour')
+    book_flavour_histo(df, histos, f'jet_eta_partonflavour{{k}}{label_suffix}', (50, -2.5, 2.5), 'Jet_TightID_Pt30_Central_Eta', weight, category='Jet_TightID_Pt30_Central_absFlavour')
 
-        histos[pt_hist_name] = df.Histo1D(ROOT.RDF.TH1DModel(pt_hist_name, '', 100, 0, 500), pt_col, weight)
-        histos[eta_hist_name] = df.Histo1D(ROOT.RDF.TH1DModel(eta_hist_name, '', 50, -2.5, 2.5), eta_col, weight)
-    
     return df
 
 def cut_fill_histos(df,cut_expr,label, isData, weight,skipKinematics=0):
@@ -82,28 +152,21 @@ def cut_fill_histos(df,cut_expr,label, isData, weight,skipKinematics=0):
         df_cut = df.Filter(cut_expr,label)
 
         # Inclusive mjj
-        histos_cut[f'mjj_cut_{label}'] = df_cut.Histo1D(
-            ROOT.RDF.TH1DModel(f'mjj_cut_{label}', '', 1000, 0, 1000),
-                'Mjj',
-                weight
-        )
+        histos_cut[f'mjj_cut_{label}'] = histstorage.Histo1D(df_cut, f'mjj_cut_{label}', (1000, 0, 1000), 'Mjj', weight)
 
-        # Flavour-filtered mjj
+        # Flavour-split mjj
         if not skipKinematics and not isData:
-            for k in range(1,6):
-                histos_cut[f'mjj_PartonFlavour_{k}_cut_{label}'] = df_cut.Filter(f'Sum(Jet_TightID_Pt30_Central_PartonFlavour{k})==2').Histo1D(ROOT.RDF.TH1DModel(f'mjj_PartonFlavour_{k}_cut_{label}', '', 1000, 0, 1000), 'Mjj', weight)
+            book_flavour_histo(df_cut, histos_cut, f'mjj_PartonFlavour_{{k}}_cut_{label}', (1000, 0, 1000), 'Mjj', weight)
 
         # Inclusive Kinematic histograms
         if not skipKinematics:
             for varname,(nbins,xmin,xmax) in variables.items():
-                histos_cut[f'{varname}_cut_{label}'] = df_cut.Histo1D(ROOT.RDF.TH1DModel(f'{varname}_cut_{label}','',nbins,xmin,xmax),varname,weight)
+                histos_cut[f'{varname}_cut_{label}'] = histstorage.Histo1D(df_cut, f'{varname}_cut_{label}', (nbins, xmin, xmax), varname, weight)
 
-        # Flavour-filtered kinematic histograms
+        # Flavour-split kinematic histograms
         if not skipKinematics and not isData:
-            for varname,(nbins,xmin,xmax) in variables.items():
-                for k in range(1,6):
-                    flav_df_cut = df_cut.Filter(f'Sum(Jet_TightID_Pt30_Central_PartonFlavour{k})==2')
-                    histos_cut[f'{varname}_PartonFlavour{k}_cut_{label}'] = flav_df_cut.Histo1D(ROOT.RDF.TH1DModel(f'{varname}_PartonFlavour{k}_cut_{label}','',nbins,xmin,xmax),varname,weight)
+            for varname,binning in variables.items():
+                book_flavour_histo(df_cut, histos_cut, f'{varname}_PartonFlavour{{k}}_cut_{label}', binning, varname, weight)
 
         return histos_cut
 
@@ -138,158 +201,103 @@ def fill_btagPNetB(df, histos,isData, weight):
         Fill inclusive and per-flavour histograms for Jet_btagPNetB of the two selected jets
         """
 
-        # Define Jet_btagPNetB values for the two selected jets
-        df = df.Define("Jet_TightID_Pt30_Central_btagPNetB",'Jet_btagPNetB[Jet_TightID_Pt30_Central]')
-        df = df.Define("Jet_btagPNetB_1","Jet_TightID_Pt30_Central_btagPNetB[0]")
-        df = df.Define("Jet_btagPNetB_2","Jet_TightID_Pt30_Central_btagPNetB[1]")
-        df = df.Define("Jet_btagPNetB_mean","(Jet_btagPNetB_1 + Jet_btagPNetB_2)/2")
+        # Jet_btagPNetB values for the two selected jets (compiled, see Helper.h)
+        df = ROOT.BtagColumns(ROOT.RDF.AsRNode(df))
 
-        histos["Jet_btagPNetB_1"] = df.Histo1D(ROOT.RDF.TH1DModel("Jet_btagPNetB_1",'',1000,0,1),"Jet_btagPNetB_1",weight)
-        histos["Jet_btagPNetB_2"] = df.Histo1D(ROOT.RDF.TH1DModel("Jet_btagPNetB_2",'',1000,0,1),"Jet_btagPNetB_2",weight)
-        histos["Jet_btagPNetB_mean"] = df.Histo1D(ROOT.RDF.TH1DModel("Jet_btagPNetB_mean", "", 1000, 0, 1),"Jet_btagPNetB_mean",weight)
-        histos["Jet_btagPNetB"] = df.Histo2D(ROOT.RDF.TH2DModel("Jet_btagPNetB",'',1000,0,1,1000,0,1),"Jet_btagPNetB_1","Jet_btagPNetB_2",weight)
+        histos["Jet_btagPNetB_1"] = histstorage.Histo1D(df, "Jet_btagPNetB_1", (1000, 0, 1), "Jet_btagPNetB_1", weight)
+        histos["Jet_btagPNetB_2"] = histstorage.Histo1D(df, "Jet_btagPNetB_2", (1000, 0, 1), "Jet_btagPNetB_2", weight)
+        histos["Jet_btagPNetB_mean"] = histstorage.Histo1D(df, "Jet_btagPNetB_mean", (1000, 0, 1), "Jet_btagPNetB_mean", weight)
+        histos["Jet_btagPNetB"] = histstorage.Histo2D(df, "Jet_btagPNetB", (1000,0,1), (1000,0,1), "Jet_btagPNetB_1", "Jet_btagPNetB_2", weight, sparse=True)
      
         if not isData:
+            book_flavour_histo(df, histos, "Jet_btagPNetB_PartonFlavour{k}_1", (1000, 0, 1), "Jet_btagPNetB_1", weight)
+            book_flavour_histo(df, histos, "Jet_btagPNetB_PartonFlavour{k}_2", (1000, 0, 1), "Jet_btagPNetB_2", weight)
+            # The 2D maps and the per-jet distribution are booked per category (cheap integer comparison on the category column)
             for k in range(1,6):
-                filter_expression = f'Sum(Jet_TightID_Pt30_Central_PartonFlavour{k})==2'
-                flav_df = df.Filter(filter_expression)
-                histos[f"Jet_btagPNetB_PartonFlavour{k}_1"] = flav_df.Histo1D(ROOT.RDF.TH1DModel(f"Jet_btagPNetB_PartonFlavour{k}_1", "", 1000, 0, 1), "Jet_btagPNetB_1", weight)
-                histos[f"Jet_btagPNetB_PartonFlavour{k}_2"] = flav_df.Histo1D(ROOT.RDF.TH1DModel(f"Jet_btagPNetB_PartonFlavour{k}_2","",1000,0,1),"Jet_btagPNetB_2",weight)
-                histos[f"Jet_btagPNetB_PartonFlavour{k}_mean"] = flav_df.Histo1D(ROOT.RDF.TH1DModel(f"Jet_btagPNetB_PartonFlavour{k}_mean",'',1000,0,1),"Jet_TightID_Pt30_Central_btagPNetB",weight)
-                histos[f"Jet_btagPNetB_PartonFlavour{k}"] = flav_df.Histo2D(ROOT.RDF.TH2DModel(f"Jet_btagPNetB_PartonFlavour{k}",'',1000,0,1,1000,0,1),f"Jet_btagPNetB_1",f"Jet_btagPNetB_2",weight)
+                flav_df = ROOT.DijetFlavourFilter(df, k)
+                histos[f"Jet_btagPNetB_PartonFlavour{k}_mean"] = histstorage.Histo1D(flav_df, f"Jet_btagPNetB_PartonFlavour{k}_mean", (1000, 0, 1), "Jet_TightID_Pt30_Central_btagPNetB", weight)
+                histos[f"Jet_btagPNetB_PartonFlavour{k}"] = histstorage.Histo2D(flav_df, f"Jet_btagPNetB_PartonFlavour{k}", (1000,0,1), (1000,0,1), f"Jet_btagPNetB_1", f"Jet_btagPNetB_2", weight, sparse=True)
 
         return df, histos
 
-def GammaZSelection(df, year=2023, era='C', isData=False):
+def SkimSnapshot(df, isData, skimfile, compression='ZSTD:5'):
+    '''
+    Book (lazily, it is written during the event loop) a Snapshot of the derived columns in skim_columns
+    (plus the dijet flavour category for MC) into the tree Skim of skimfile.
+    compression is 'ALGORITHM:level', e.g. 'ZSTD:5', 'LZ4:4', 'ZLIB:1' or 'LZMA:9'.
+    '''
+    algorithm, level = compression.split(':') if ':' in compression else (compression, 5)
+    options = ROOT.RDF.RSnapshotOptions()
+    options.fLazy = True
+    options.fCompressionAlgorithm = getattr(ROOT.RCompressionSetting.EAlgorithm, 'k'+algorithm.upper())
+    options.fCompressionLevel = int(level)
+    columns = skim_columns + ([] if isData else ['Jet_DijetFlavour'])
+    return df.Snapshot('Skim', skimfile, columns, options)
+
+def GammaZSelection(df, year=2023, era='C', isData=False, jes_sources=(), jec_compound=False, jec_table=False, skimfile='', skim_compression='ZSTD:5'):
     '''
     Select events with = 1 photon with pT>100 GeV.
     The event must pass a single photon trigger. 
     Requires exactly 2 jets
+    For MC, the jet pT is varied up/down for each JES uncertainty source in jes_sources (see BookVariations).
+    With jec_compound, the JECs are evaluated with the L1L2L3Res compound correction (see JetCorrections.h).
+    With jec_table, the JECs are interpolated from a precomputed table (quick studies only, see setupjecs).
+    If skimfile is given, the events passing the baseline selection are also written to a slim ntuple (see SkimSnapshot).
+    Returns the final dataframe, the histograms and the (lazy) skim result (None without skimfile).
     '''
 
-    print("→ Number of events in file:", df.Count().GetValue())
     df, weight = defineWeight(df, isData)
     
     histos = {}
     
-    #Trigger
-    df = df.Filter('HLT_Photon50EB_TightID_TightIso||HLT_Photon45EB_TightID_TightIso','HLT_Photon50EB_TightID_TightIso||HLT_Photon45EB_TightID_TightIso')
-
-    #Offline photon, define a loose ID for pt>20. This will be used for vetoing additional photons 
-    df = df.Define('Photon_LooseID_Pt20','Photon_mvaID_WP90&&abs(Photon_eta)<1.4442&&Photon_pt>20') 
-    df = df.Define('Photon_LooseID_Pt20_pt','Photon_pt[Photon_LooseID_Pt20]') 
-    df = df.Define('Photon_LooseID_Pt20_eta','Photon_eta[Photon_LooseID_Pt20]') 
-    df = df.Define('Photon_LooseID_Pt20_phi','Photon_phi[Photon_LooseID_Pt20]') 
-    
-    #Offline photon, define a tight ID for the photon of interest, require pt > 100 GeV for now
-    df = df.Define('Photon_TightID_Pt100','Photon_mvaID_WP80&&abs(Photon_eta)<1.4442&&Photon_pt>100&&Photon_electronVeto&&!Photon_pixelSeed') 
-    df = df.Define('Photon_TightID_Pt100_pt','Photon_pt[Photon_TightID_Pt100]') 
-    df = df.Define('Photon_TightID_Pt100_eta','Photon_eta[Photon_TightID_Pt100]') 
-    df = df.Define('Photon_TightID_Pt100_phi','Photon_phi[Photon_TightID_Pt100]') 
-
-    #Plot photon pt. Only filters called before this line applies for this plot
-    histos['photon_pt_aftertrigger'] = df.Histo1D(ROOT.RDF.TH1DModel('photon_pt_aftertrigger', '', 1000, 0, 1000), 'Photon_LooseID_Pt20_pt', weight)
-
-    #Some simple event filters:
-    df = df.Filter('Sum(Photon_LooseID_Pt20)==1','=1 loose photon with p_{T}>20 GeV')
-    df = df.Filter('Sum(Photon_TightID_Pt100)==1','=1 tight photon with p_{T}>100 GeV')
-    #Plot photon pt. Because of the two filters above, this distribution starts at 100 GeV.
-    histos['photon_pt_afterptcut'] = df.Histo1D(ROOT.RDF.TH1DModel('photon_pt_afterptcut', '', 1000, 0, 1000), 'Photon_LooseID_Pt20_pt', weight)
-    
-    #More filtering: electron/muon veto (to reject processes like ttbar) 
-
-    #Electron veto
-    df = df.Define('Electron_LooseID_Pt15','Electron_pt>15&&Electron_mvaIso_WPHZZ')    
-    df = df.Filter('Sum(Electron_LooseID_Pt15)==0','0 good electron with p_{T}>15 GeV')
-    
-    #Muon veto
-    df = df.Define('Muon_LooseID_Pt10','Muon_pfIsoId>=2&&Muon_mediumPromptId&&Muon_pt>10')
-    df = df.Filter('Sum(Muon_LooseID_Pt10)==0','Sum(Muon_LooseID_Pt10)==0')
+    #The selection is compiled (typed Defines and Filters, see GammaZPhotonSelection and GammaZDijetSelection in Helper.h),
+    #only the histograms and the configurable cuts below are booked from strings
+    #Trigger, then one tight photon with pt>100 GeV and no additional loose photon with pt>20 GeV, electron/muon veto (to reject processes like ttbar)
+    nodes = ROOT.GammaZPhotonSelection(ROOT.RDF.AsRNode(df))
+    #Plot photon pt. Only the trigger applies for this plot
+    histos['photon_pt_aftertrigger'] = histstorage.Histo1D(nodes.photons, 'photon_pt_aftertrigger', (1000, 0, 1000), 'Photon_LooseID_Pt20_pt', weight)
+    #Plot photon pt. Because of the photon filters, this distribution starts at 100 GeV.
+    histos['photon_pt_afterptcut'] = histstorage.Histo1D(nodes.photonCuts, 'photon_pt_afterptcut', (1000, 0, 1000), 'Photon_LooseID_Pt20_pt', weight)
+    df = nodes.leptonVeto
 
     #Jet selection
-    # Apply the newest jet energy corrections: 
+    # Apply the newest jet energy corrections (to the jets passing the jet ID, see CorrectJetPt in JetCorrections.h):
     JECfile, corrfile = JECsInit(year, era, isData)
-    setupjecs(JECfile, corrfile)
-    df = df.Redefine('Jet_pt', 'JetCorPt(Jet_area, Jet_eta, Jet_phi, Jet_pt, Jet_rawFactor, Rho_fixedGridRhoFastjetAll,'+str(isData)+')')
-    #The following consideres only jets that are not pathological and do not have a large muon or "charged electromagnetic" energy fraction (i.e. the jet is not made mostly of a muon or an electron) 
-    #Also remove jets mostly of neutral EM energy (= the photon)
-    df = df.Define('Jet_TightID_Pt30', 'Jet_jetId>=4&&Jet_muEF<0.5&&Jet_chEmEF<0.5&&Jet_neEmEF<0.9&&Jet_pt>30')
-    #The subset of these jets that are central 
-    df = df.Define('Jet_TightID_Pt30_Central', 'Jet_jetId>=4&&Jet_muEF<0.5&&Jet_chEmEF<0.5&&Jet_neEmEF<0.9&&Jet_pt>30&&abs(Jet_eta)<2.4')
-    
-    df = df.Define('Jet_TightID_Pt30_Central_Pt', 'Jet_pt[Jet_TightID_Pt30_Central]')
-    df = df.Define('Jet_TightID_Pt30_Central_Eta', 'Jet_eta[Jet_TightID_Pt30_Central]')
-    df = df.Define('Jet_TightID_Pt30_Central_Phi', 'Jet_phi[Jet_TightID_Pt30_Central]')
-    df = df.Define('Jet_TightID_Pt30_Central_Mass', 'Jet_mass[Jet_TightID_Pt30_Central]')
-    
-    #The subset of these jets which hold a specific flavour
+    jecs = setupjecs(JECfile, corrfile, jec_compound, jec_table, isData)
+    df = ROOT.CorrectJetPt(df, getattr(ROOT, jecs).JetCorPt, bool(isData), DefineTimer('JetCorPt'))
+    #JES uncertainties: every downstream result gets varied copies, filled in the same event loop
     if not isData:
-        df = df.Define('Jet_TightID_Pt30_Central_partonFlavour', 'Jet_partonFlavour[Jet_TightID_Pt30_Central]')
-        for k in range(1,7):
-            df = df.Define(f'Jet_TightID_Pt30_Central_PartonFlavour{k}',f'abs(Jet_TightID_Pt30_Central_partonFlavour)=={k}')
-            
-    #For now, consider only events with exactly 2 central jets and no other jet
-    df = df.Filter('Sum(Jet_TightID_Pt30)==2&&Sum(Jet_TightID_Pt30_Central)==2','=2 central jets with pt>30 GeV, no additional jet')
-    histos['photon_pt_2jselection'] = df.Histo1D(ROOT.RDF.TH1DModel('photon_pt_2jselection', '', 1000, 0, 1000), 'Photon_LooseID_Pt20_pt', weight)
-
-    #Compute the dijet invariant mass and remove invariant mass mjj outside baseline
-    df = df.Define('Mjj', 'InvariantMass(Jet_TightID_Pt30_Central_Pt[0], Jet_TightID_Pt30_Central_Eta[0], Jet_TightID_Pt30_Central_Phi[0], Jet_TightID_Pt30_Central_Mass[0], Jet_TightID_Pt30_Central_Pt[1], Jet_TightID_Pt30_Central_Eta[1], Jet_TightID_Pt30_Central_Phi[1], Jet_TightID_Pt30_Central_Mass[1])')
-    df = df.Filter('Mjj < 200 && Mjj > 40','Invariant mass clearly outside the range of this study')    
-    
-    # --- Define key kinematic variables to study their behaviors ---
-    # Delta eta
-    df = df.Define('Jet_delta_eta','abs(Jet_TightID_Pt30_Central_Eta[0]-Jet_TightID_Pt30_Central_Eta[1])')
-
-    # Delta phi
-    df = df.Define('Jet_delta_phi','abs(acos(cos(Jet_TightID_Pt30_Central_Phi[0]-Jet_TightID_Pt30_Central_Phi[1])))')
-
-    # Delta pT
-    df = df.Define('Jet_pt1','Jet_TightID_Pt30_Central_Pt[0]')
-    df = df.Define('Jet_pt2','Jet_TightID_Pt30_Central_Pt[1]')
-    df = df.Define('Jet_delta_pT','abs(Jet_pt1-Jet_pt2)')
-
-    # pT1/pT2
-    df = df.Define('Jet_pT2pT1','Ratio_pt(Jet_pt1,Jet_pt2)')
-
-    # Angular distance R
-    df = df.Define('Jet_delta_R','sqrt(pow(Jet_delta_eta,2) + pow(Jet_delta_phi,2))')
+        for source in jes_sources:
+            df = ROOT.VaryJetPt(df, CppObject(setupjes(JECfile, corrfile, source, jec_compound)), 'JES_'+source)
 
-    # Veto Delta R(photon,j) > 0.4 with j = leading and subleading jet
-    df = df.Define('PJet_Delta_eta','abs(Photon_TightID_Pt100_eta[0]-Jet_TightID_Pt30_Central_Eta[0])') # Delta eta leading jet and photon
-    df = df.Define('PJet_Delta_phi','abs(acos(cos(Photon_TightID_Pt100_phi[0]-Jet_TightID_Pt30_Central_Phi[0])))') # Delta phi leading jet and photon
-    df = df.Define('PSubJet_Delta_eta','abs(Photon_TightID_Pt100_eta[0]-Jet_TightID_Pt30_Central_Eta[1])') # Delta eta subleading jet and photon
-    df = df.Define('PSubJet_Delta_phi','abs(acos(cos(Photon_TightID_Pt100_phi[0]-Jet_TightID_Pt30_Central_Phi[1])))') # Delta phi subleading jet and photon
-    
-    df = df.Define('PJet_Delta_R','sqrt(pow(PJet_Delta_eta,2) + pow(PJet_Delta_phi,2))') # Delta R leading jet and photon
-    df = df.Define('PSubJet_Delta_R','sqrt(pow(PSubJet_Delta_eta,2) + pow(PSubJet_Delta_phi,2))') # Delta R subleading jet and photon
-
-    df = df.Filter('PJet_Delta_R > 0.4 && PSubJet_Delta_R > 0.4',f'Angular distance between the photon and both jets is > 0.4')
+    #Exactly 2 central jets with pt>30 GeV and no other jet, 40<mjj<200 GeV, photon separated from both jets
+    nodes = ROOT.GammaZDijetSelection(df, bool(isData), DefineTimer('InvariantMass'))
+    histos['photon_pt_2jselection'] = histstorage.Histo1D(nodes.twoJets, 'photon_pt_2jselection', (1000, 0, 1000), 'Photon_LooseID_Pt20_pt', weight)
+    df = nodes.selected
 
     # Selection cut to further select kinematic variables in range of study
-    df_cut = df.Filter('Mjj > 40 && Mjj < 200', 'mjj in range of study')
+    df_cut = nodes.mjjRange
     for varname, (nbins, xmin, xmax) in variables.items():
         hist_name = f'{varname}'
-        histos[hist_name] = df_cut.Histo1D(ROOT.RDF.TH1DModel(hist_name,'',nbins,xmin,xmax),varname,weight)
-    histos['Jet_delta_phi_vs_delta_eta'] = df_cut.Histo2D(ROOT.RDF.TH2DModel('Jet_delta_phi_vs_delta_eta','',100,0,5,100,0,5),'Jet_delta_phi','Jet_delta_eta',weight)
+        histos[hist_name] = histstorage.Histo1D(df_cut, hist_name, (nbins, xmin, xmax), varname, weight)
+    histos['Jet_delta_phi_vs_delta_eta'] = histstorage.Histo2D(df_cut, 'Jet_delta_phi_vs_delta_eta', (100,0,5), (100,0,5), 'Jet_delta_phi', 'Jet_delta_eta', weight)
 
     df, histos = fill_btagPNetB(df_cut, histos,isData, weight)
 
-    # Plot these variables in histograms
+    # Slim ntuple of the events passing the baseline selection, for re-studies without rerunning on NanoAOD
+    skim = None
+    if skimfile != '':
+        skim = SkimSnapshot(df.Define('Weight', weight), isData, skimfile, skim_compression)
+
+    # Plot these variables in histograms, split by dijet flavour
     if not isData:
-        for k in range(1,6):
-            # Create a filtered datafrom for each flavour
-            flav_var = f'Jet_TightID_Pt30_Central_PartonFlavour{k}'
-            df_flav = df_cut.Filter(f'Sum({flav_var})==2',f'Both jets have flavour {k}')
-            # Loop over each variable
-            for varname, (nbins,xmin,xmax) in variables.items():
-                hist_name = f'{varname}_PartonFlavour{k}'
-                histos[hist_name] = df_flav.Histo1D(ROOT.RDF.TH1DModel(hist_name,'',nbins,xmin,xmax),varname,weight)
+        for varname, binning in variables.items():
+            book_flavour_histo(df_cut, histos, f'{varname}_PartonFlavour{{k}}', binning, varname, weight)
     
     #Compute the dijet invariant mass  
-    histos['Mjj'] = df.Histo1D(ROOT.RDF.TH1DModel('mjj', '', 1000, 0, 1000), 'Mjj', weight)
+    histos['Mjj'] = histstorage.Histo1D(df, 'mjj', (1000, 0, 1000), 'Mjj', weight)
     if not isData:
-        for k in range(1,7):
-            histos[f'mjj_partonflavour{k}'] = df.Filter(f'Sum(Jet_TightID_Pt30_Central_PartonFlavour{k})==2').Histo1D(ROOT.RDF.TH1DModel(f'mjj_partonflavour{k}','',1000,0,1000),'Mjj',weight)
+        book_flavour_histo(df, histos, 'mjj_partonflavour{k}', (1000, 0, 1000), 'Mjj', weight, nflavours=6)
 
     # Compute and add histograms for the different cuts 
     df, histos = apply_cumulative_cuts(df, cut_conditions, histos, isData,weight)  
@@ -298,20 +306,28 @@ def GammaZSelection(df, year=2023, era='C', isData=False):
         histos.update(extra_histos)
 
     if not isData:
-        df = plot_jet_kinematics_by_flavour(df, histos)
+        df = plot_jet_kinematics_by_flavour(df, histos, weight)
 
     btag_cut = "Jet_btagPNetB_1 > 0.3 && Jet_btagPNetB_2 > 0.3"
     btag_histo = cut_fill_histos(df, btag_cut, 'final', isData,weight,skipKinematics=1)
     histos.update(btag_histo)
 
+    return df, histos, skim
 
+def FlavourFractions(histos, isData=False):
+    '''
+    Count the number of events per flavour in the Z mass window and compare the observed fractions to the expected branching ratios.
+    Must be called after the event loop has run, on the split histograms (it reads the mjj_partonflavour histograms).
+    '''
     # Count the number of events per flavour
     if not isData:
-        n1 = histos['mjj_partonflavour1'].Integral(60, 120)
-        n2 = histos['mjj_partonflavour2'].Integral(60, 120)
-        n3 = histos['mjj_partonflavour3'].Integral(60, 120)
-        n4 = histos['mjj_partonflavour4'].Integral(60, 120)
-        n5 = histos['mjj_partonflavour5'].Integral(60, 120)
+        # Bins 60 to 120 of the 1 GeV binning, whatever the binning (see histstorage --histo_rebin)
+        window = lambda h: (h.FindBin(59.5), h.FindBin(119.5))
+        n1 = histos['mjj_partonflavour1'].Integral(*window(histos['mjj_partonflavour1']))
+        n2 = histos['mjj_partonflavour2'].Integral(*window(histos['mjj_partonflavour2']))
+        n3 = histos['mjj_partonflavour3'].Integral(*window(histos['mjj_partonflavour3']))
+        n4 = histos['mjj_partonflavour4'].Integral(*window(histos['mjj_partonflavour4']))
+        n5 = histos['mjj_partonflavour5'].Integral(*window(histos['mjj_partonflavour5']))
         n = np.array([n1,n2,n3,n4,n5])
         total = sum(n)
 
@@ -336,4 +352,4 @@ def GammaZSelection(df, year=2023, era='C', isData=False):
         chi2 = ndof
         difference = ndof
         p = ndof
-    return df, histos, BR_Obs, n, total, ndof, chi2, difference, p
+    return BR_Obs, n, total, ndof, chi2, difference, p
@@ -0,0 +1,90 @@
+import ROOT
+import numpy as np
+
+'''
+Histogram contents, errors and bin edges as numpy arrays, without a PyROOT call per bin.
+The contents (and sum of squared weights) are zero-copy views of the histogram buffers (GetArray()):
+they stay valid as long as the histogram is alive, and writing to them modifies the histogram.
+Arrays are indexed [x bin] (1D) or [x bin, y bin] (2D). With flow=False the under/overflow bins are dropped
+on every axis, with flow=True they are kept at index 0 and -1. The edges never include the flow bins.
+'''
+
+# Storage type of the histogram classes (TH1D, TH2F...) through their TArray base class
+dtypes = [('TArrayD', np.float64), ('TArrayF', np.float32), ('TArrayI', np.int32), ('TArrayS', np.int16), ('TArrayC', np.int8), ('TArrayL64', np.int64)]
+
+def _buffer(hist, array, dtype):
+    '''
+    View of the ncells values of array (a double*, float*... buffer of hist), shaped as the histogram cells, indexed [x, y].
+    '''
+    flat = np.frombuffer(array, dtype=dtype, count=hist.GetNcells())
+    if hist.GetDimension() == 1:
+        return flat
+    if hist.GetDimension() == 2:
+        return flat.reshape(hist.GetNbinsY()+2, hist.GetNbinsX()+2).T
+    raise ValueError(f'{hist.GetName()}: only 1D and 2D histograms are supported')
+
+def _strip(cells, flow):
+    return cells if flow else cells[(slice(1, -1),)*cells.ndim]
+
+def values(hist, flow=False):
+    '''
+    Bin contents (view of the histogram buffer).
+    '''
+    for base, dtype in dtypes:
+        if hist.InheritsFrom(base):
+            return _strip(_buffer(hist, hist.GetArray(), dtype), flow)
+    raise TypeError(f'{hist.GetName()}: unknown storage type {hist.ClassName()}')
+
+def variances(hist, flow=False):
+    '''
+    Sum of squared weights per bin (view of the histogram buffer), or the bin contents if Sumw2 is not filled.
+    '''
+    if hist.GetSumw2N() == 0:
+        return values(hist, flow)
+    return _strip(_buffer(hist, hist.GetSumw2().GetArray(), np.float64), flow)
+
+def errors(hist, flow=False):
+    '''
+    Bin errors, sqrt of the variances (a new array).
+    '''
+    return np.sqrt(np.abs(variances(hist, flow)))
+
+def edges(hist, axis='x'):
+    '''
+    Bin edges along axis ('x' or 'y'), for fixed or variable binning.
+    '''
+    ax = hist.GetXaxis() if axis == 'x' else hist.GetYaxis()
+    if ax.GetXbins().GetSize() > 0:
+        return np.frombuffer(ax.GetXbins().GetArray(), dtype=np.float64, count=ax.GetNbins()+1)
+    return np.linspace(ax.GetXmin(), ax.GetXmax(), ax.GetNbins()+1)
+
+def centers(hist, axis='x'):
+    '''
+    Bin centers along axis ('x' or 'y').
+    '''
+    e = edges(hist, axis)
+    return (e[1:]+e[:-1])/2
+
+def to_numpy(hist, flow=False):
+    '''
+    Bin contents and edges, as numpy.histogram (1D: values, xedges) and numpy.histogram2d (2D: values, xedges, yedges).
+    '''
+    axes = ['x'] if hist.GetDimension() == 1 else ['x', 'y']
+    return (values(hist, flow),) + tuple(edges(hist, axis) for axis in axes)
+
+def read(tfile, names=None):
+    '''
+    Read the 1D and 2D histograms names (default: all histograms of the file, latest cycles) of tfile.
+    Returns {name: histogram}. The histograms are detached from the file, so that the views stay valid after it is closed.
+    '''
+    if names is None:
+        names = list(dict.fromkeys(key.GetName() for key in tfile.GetListOfKeys() if ROOT.TClass.GetClass(key.GetClassName()).InheritsFrom('TH1')))
+    histos = {}
+    for name in names:
+        hist = tfile.Get(name)
+        if not hist:
+            print(f'Histogram {name} not found !')
+            continue
+        hist.SetDirectory(ROOT.nullptr)
+        histos[name] = hist
+    return histos
@@ -0,0 +1,113 @@
+import ROOT
+
+'''
+Storage of the histograms booked by GammaZSelection (analysis.py --histo_precision, --histo_rebin, --sparse_btag)
+and estimate of their memory:
+- precision: 'double' (TH1D/TH2D) or 'float' (TH1F/TH2F, filled with Fill, see Helper.h). The sum of squared weights
+  of weighted (MC) histograms is stored in double in both cases
+- rebin: the axes of more than REBIN_MIN_BINS bins (the 1 GeV / 0.001 binnings) get N times fewer bins, for exploratory runs
+- sparse_btag: the 2D b-tagging maps (1000x1000 bins) only store their filled bins (SparseHisto2D, see Helper.h) during
+  the event loop; they are converted to TH2D after the loop (Dense), so the output files are unchanged
+With implicit MT, every slot fills its own copy of each histogram (merged at the end of the event loop), and each
+systematic variation (Vary) is a further copy: the memory of the histograms is the size per copy times the number
+of slots and of variations.
+'''
+
+PRECISIONS = {'double': 8, 'float': 4}
+# Axes with more bins than this are rebinned with --histo_rebin
+REBIN_MIN_BINS = 100
+# Approximate memory of a filled bin of a SparseHisto2D (hash map node and bucket) and of a histogram object without its bins
+SPARSE_BIN_BYTES = 64
+HISTO_BYTES = 1000
+
+config = {'precision': 'double', 'rebin': 1, 'sparse_btag': False}
+
+# Histograms booked since the last reset: {name: {'cells', 'storage', 'bytes'}}, bytes per copy
+booked = {}
+
+def add_storage_arguments(parser):
+    '''
+    Add the histogram storage options to an argparse parser.
+    '''
+    parser.add_argument("--histo_precision", dest="histo_precision", help="Storage of the bin contents. Default=double", choices=list(PRECISIONS), default='double')
+    parser.add_argument("--histo_rebin", dest="histo_rebin", help="Divide the number of bins of the axes of more than {} bins by N (exploratory runs). Default=1".format(REBIN_MIN_BINS), type=int, default=1)
+    parser.add_argument("--sparse_btag", dest="sparse_btag", help="Store only the filled bins of the 2D b-tagging maps during the event loop (written as TH2D)", action='store_true', default=False)
+
+def configure(args):
+    config['precision'] = args.histo_precision
+    config['rebin'] = args.histo_rebin
+    config['sparse_btag'] = args.sparse_btag
+
+def reset():
+    booked.clear()
+
+def axis(binning):
+    '''
+    Binning (nbins, xmin, xmax) of an axis with the configured rebinning. The number of bins is divided only when it is a multiple of rebin.
+    '''
+    nbins, xmin, xmax = binning
+    rebin = config['rebin']
+    if rebin > 1 and nbins > REBIN_MIN_BINS and nbins % rebin == 0:
+        nbins //= rebin
+    return nbins, xmin, xmax
+
+def _record(name, cells, storage, weighted):
+    if storage == 'sparse':
+        size = HISTO_BYTES
+    else:
+        size = HISTO_BYTES + cells*(PRECISIONS[storage] + (8 if weighted else 0))
+    booked[name] = {'cells': cells, 'storage': storage, 'bytes': size}
+
+def Histo1D(df, name, binning, varname, weight):
+    '''
+    Book the histogram of varname with the configured precision and binning.
+    '''
+    nbins, xmin, xmax = axis(binning)
+    # Data are filled with a unit weight: no sum of squared weights
+    _record(name, nbins+2, config['precision'], weight != 'unit_weight')
+    if config['precision'] == 'double':
+        return df.Histo1D(ROOT.RDF.TH1DModel(name, '', nbins, xmin, xmax), varname, weight)
+    return ROOT.FloatHisto1D(ROOT.RDF.AsRNode(df), name, nbins, xmin, xmax, [varname, weight])
+
+def Histo2D(df, name, xbinning, ybinning, xname, yname, weight, sparse=False):
+    '''
+    Book the 2D histogram of (xname, yname) with the configured precision and binning.
+    With sparse (used if --sparse_btag), only the filled bins are stored: convert the result with Dense after the event loop.
+    '''
+    nx, xmin, xmax = axis(xbinning)
+    ny, ymin, ymax = axis(ybinning)
+    columns = [xname, yname, weight]
+    storage = 'sparse' if sparse and config['sparse_btag'] else config['precision']
+    _record(name, (nx+2)*(ny+2), storage, weight != 'unit_weight')
+    if storage == 'sparse':
+        return ROOT.BookSparseHisto2D(ROOT.RDF.AsRNode(df), name, nx, xmin, xmax, ny, ymin, ymax, columns)
+    if storage == 'double':
+        return df.Histo2D(ROOT.RDF.TH2DModel(name, '', nx, xmin, xmax, ny, ymin, ymax), xname, yname, weight)
+    return ROOT.FloatHisto2D(ROOT.RDF.AsRNode(df), name, nx, xmin, xmax, ny, ymin, ymax, columns)
+
+def Dense(h):
+    '''
+    Histogram h (event loop result), with a SparseHisto2D converted to the equivalent TH2D.
+    '''
+    if not hasattr(h, 'Dense'):
+        return h
+    dense = h.Dense()
+    ROOT.SetOwnership(dense, True)
+    return dense
+
+def memory_estimate(slots, variations=0):
+    '''
+    Estimated memory of the histograms booked since the last reset during the event loop: per histogram (bytes per copy),
+    and total for slots copies of each of the nominal and variations results.
+    Sparse histograms are counted without their filled bins (SPARSE_BIN_BYTES each).
+    '''
+    per_copy = sum(h['bytes'] for h in booked.values())
+    return {'histograms': dict(booked), 'bytes_per_copy': per_copy, 'slots': slots, 'copies': slots*(1+variations),
+            'total_bytes': per_copy*slots*(1+variations), 'sparse': sum(h['storage'] == 'sparse' for h in booked.values())}
+
+def print_memory(name, estimate, largest=5):
+    print('Histograms of {}: {} booked, {:.1f} MB per copy, {} copies ({} slots) = {:.1f} MB{}'.format(
+        name, len(estimate['histograms']), estimate['bytes_per_copy']/1e6, estimate['copies'], estimate['slots'], estimate['total_bytes']/1e6,
+        ', plus {} B per filled bin of the {} sparse maps'.format(SPARSE_BIN_BYTES, estimate['sparse']) if estimate['sparse'] else ''))
+    for hname, h in sorted(estimate['histograms'].items(), key=lambda item: -item[1]['bytes'])[:largest]:
+        print('    {:<50}{:>10} cells {:>8}{:>10.2f} MB'.format(hname, h['cells'], h['storage'], h['bytes']/1e6))
@@ -0,0 +1,64 @@
+import ROOT
+import glob
+
+'''
+Input NanoAOD files: expansion of the command line inputs and number of entries of the Events trees.
+'''
+
+def expand_inputs(inputs):
+    '''
+    Expand a list of input arguments into a list of files.
+    Each argument can be a file, a glob pattern or a .txt file listing one file (or glob) per line.
+    '''
+    files = []
+    for i in inputs:
+        if i.endswith('.txt'):
+            with open(i) as filelist:
+                files += expand_inputs([l.strip() for l in filelist if l.strip() and not l.startswith('#')])
+        elif glob.has_magic(i):
+            matched = sorted(glob.glob(i))
+            if not matched:
+                print('No file matching {}'.format(i))
+            files += matched
+        else:
+            files.append(i)
+    return files
+
+def file_info(files):
+    '''
+    Number of entries of the Events tree and sum of the generator weights (genEventSumw of the Runs tree, None for data)
+    of each file, {file: {'entries': n, 'genEventSumw': sumw}}. The Events tree is not read, only its header.
+    '''
+    info = {}
+    for f in files:
+        tfile = ROOT.TFile.Open(f)
+        if not tfile or tfile.IsZombie():
+            raise OSError('Could not open {}'.format(f))
+        sumw = None
+        runs = tfile.Get('Runs')
+        #genEventSumw_ before NanoAOD v9
+        branch = next((b for b in ['genEventSumw', 'genEventSumw_'] if runs and runs.GetBranch(b)), None)
+        if branch:
+            sumw = sum(getattr(run, branch) for run in runs)
+        info[f] = {'entries': tfile.Get('Events').GetEntries(), 'genEventSumw': sumw}
+        tfile.Close()
+    return info
+
+def processed_sumw(infos, first=0, last=-1):
+    '''
+    Sum of the generator weights (genEventSumw) of the entries [first, last) (last=-1: all) of the chain of files infos
+    (list of file_info values, in the order of the chain, a file listed twice appearing twice), when these entries are
+    whole files. None if the range starts or ends inside a file (the sum of genWeight over the processed entries is then
+    the exact value) or if a processed file has no genEventSumw (data).
+    '''
+    sumw, offset = 0., 0
+    for i in infos:
+        n = i['entries']
+        end = offset+n if last < 0 else min(last, offset+n)
+        processed = max(0, end - max(first, offset))
+        if 0 < processed < n or (processed > 0 and i['genEventSumw'] is None):
+            return None
+        if processed > 0:
+            sumw += i['genEventSumw']
+        offset += n
+    return sumw
@@ -0,0 +1,107 @@
+import ROOT
+import os
+import json
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+I/O settings of the event loop for remote (dCache) inputs, and I/O statistics of a job:
+- TTreeCache size of the input chain (--cache_size, in MB; default: ROOT automatic size, one cluster)
+- asynchronous prefetching of the next clusters while the current one is processed (--prefetch)
+- staging: copy of the whole input files to a local directory before the event loop (--stage DIR, 'auto' for the
+  condor scratch directory), the event loop then reads local files only
+The statistics (bytes and read calls of the TFiles, wall and cpu time of the event loop, time not spent on the cpu,
+i.e. mostly waiting for I/O, and staging time) are printed and can be written to a json file (--io_report).
+'''
+
+def add_io_arguments(parser):
+    '''
+    Add the I/O tuning options to an argparse parser.
+    '''
+    parser.add_argument("--cache_size", dest="cache_size", help="TTreeCache size in MB (sequential event loop). Default=0 i.e. ROOT automatic size", type=int, default=0)
+    parser.add_argument("--prefetch", dest="prefetch", help="Prefetch the next clusters of the input files asynchronously", action='store_true')
+    parser.add_argument("--stage", dest="stage", help="Copy the input files to this local directory before the event loop ('auto': condor scratch directory or TMPDIR)", type=str, default='')
+    parser.add_argument("--io_report", dest="io_report", help="Json file where the I/O statistics of the event loop are written", type=str, default='')
+
+def configure(args):
+    '''
+    Global I/O settings, to call before the input files are opened (and after implicit MT is enabled).
+    '''
+    if args.cache_size > 0 and ROOT.IsImplicitMTEnabled():
+        print('Warning: --cache_size is ignored with implicit multithreading (the cache size of the per-task trees is chosen by ROOT)')
+    if args.prefetch:
+        ROOT.gEnv.SetValue('TFile.AsyncPrefetching', 1)
+    if args.stage == 'auto':
+        args.stage = os.environ.get('_CONDOR_SCRATCH_DIR', os.environ.get('TMPDIR', '/tmp'))
+
+def make_chain(files, cache_size=0):
+    '''
+    Events chain of the files, with a cache of cache_size MB (0: ROOT default).
+    Under implicit MT, RDataFrame builds its own per-task trees and the cache size is chosen by ROOT.
+    '''
+    chain = ROOT.TChain('Events')
+    for f in files:
+        chain.Add(f)
+    if cache_size > 0:
+        chain.SetCacheSize(cache_size*1024*1024)
+    return chain
+
+def _copy(source, destination):
+    #TFile::Cp handles remote urls (root://, http://) as well as local paths
+    if os.path.exists(source):
+        shutil.copyfile(source, destination)
+    elif not ROOT.TFile.Cp(source, destination, False):
+        raise OSError('Could not copy {} to {}'.format(source, destination))
+    return destination
+
+def stage(files, directory, sample, workers=4):
+    '''
+    Copy the files of sample to directory (workers copies in parallel). Returns the local paths, in the same order, and the time spent.
+    The local names contain the sample name and the position of the file, so that several samples can be staged to the same directory.
+    '''
+    start = time.time()
+    os.makedirs(directory, exist_ok=True)
+    destinations = [os.path.join(directory, 'staged_{}_{}_{}'.format(sample, n, os.path.basename(f))) for n, f in enumerate(files)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        local = list(pool.map(_copy, files, destinations))
+    print('{} files staged to {} in {:.1f} s'.format(len(files), directory, time.time()-start))
+    return local, time.time()-start
+
+def unstage(files):
+    for f in files:
+        if os.path.exists(f):
+            os.remove(f)
+
+def start_monitor():
+    '''
+    Counters at the start of the event loop, to give to stop_monitor.
+    '''
+    return {'bytes': ROOT.TFile.GetFileBytesRead(), 'calls': ROOT.TFile.GetFileReadCalls(), 'wall': time.time(), 'cpu': time.process_time()}
+
+def stop_monitor(start, staging_time=0.):
+    '''
+    I/O statistics of the event loop since start (see start_monitor).
+    The time not spent on the cpu (threads x wall time - cpu time) is mostly time blocked on I/O.
+    '''
+    wall = time.time() - start['wall']
+    cpu = time.process_time() - start['cpu']
+    threads = ROOT.GetThreadPoolSize() if ROOT.IsImplicitMTEnabled() else 1
+    return {'bytes_read': ROOT.TFile.GetFileBytesRead() - start['bytes'],
+            'read_calls': ROOT.TFile.GetFileReadCalls() - start['calls'],
+            'wall_time': wall,
+            'cpu_time': cpu,
+            'threads': threads,
+            'io_wait_time': max(0., threads*wall - cpu),
+            'cpu_efficiency': cpu/(threads*wall) if wall > 0 else 0.,
+            'staging_time': staging_time}
+
+def print_stats(stats):
+    print('I/O: {:.1f} MB read in {} calls ({:.1f} kB per call), event loop {:.1f} s wall, {:.1f} s cpu ({} threads, cpu efficiency {:.0%}), '
+          '{:.1f} s waiting, {:.1f} s staging'.format(stats['bytes_read']/1e6, stats['read_calls'], stats['bytes_read']/1e3/max(1, stats['read_calls']),
+                                                      stats['wall_time'], stats['cpu_time'], stats['threads'], stats['cpu_efficiency'],
+                                                      stats['io_wait_time'], stats['staging_time']))
+
+def write_stats(stats, path):
+    with open(path, 'w') as f:
+        json.dump(stats, f, indent=1)
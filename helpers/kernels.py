@@ -0,0 +1,30 @@
+import ROOT
+import os
+import sys
+import correctionlib
+
+'''
+Compiled C++ kernels (selection, kinematic helpers, JEC functors).
+The headers are compiled once with ACLiC into shared libraries kept next to the sources
+and only rebuilt when they change, so that jobs do not JIT-compile them at every start.
+'''
+
+helpers_dir = os.path.dirname(os.path.abspath(__file__))
+kernels = ['Helper.h', 'JetCorrections.h']
+
+def load_kernels():
+    '''
+    Compile (if needed) and load the kernels. Returns True if all libraries are loaded.
+    '''
+    correctionlib.register_pyroot_binding()
+    ROOT.gSystem.AddIncludePath('-I' + os.path.join(os.path.dirname(correctionlib.__file__), 'include'))
+    for kernel in kernels:
+        # k: keep the library, O: optimised build
+        if not ROOT.gSystem.CompileMacro(os.path.join(helpers_dir, kernel), 'kO'):
+            print('Could not compile {}'.format(kernel))
+            return False
+    return True
+
+if __name__ == '__main__':
+    # Build the libraries once (e.g. before submitting jobs, to avoid concurrent builds)
+    sys.exit(0 if load_kernels() else 1)
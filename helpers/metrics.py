@@ -0,0 +1,90 @@
+import ROOT
+import re
+import json
+
+'''
+Performance metrics of an analysis.py run (--metrics FILE.json):
+- jitting time and cpu/elapsed time of the event loop, from the RDataFrame info log (captured, see Helper.h)
+- events processed and events/s, bytes read and I/O statistics (see iotuning.py)
+- number of events passing each named Filter of each sample (cut flow of df.Report())
+- evaluation time of the expensive Defines (DefineTimer in helper_gammaztobb.py)
+- estimated memory of the booked histograms of each sample (see histstorage.py)
+'''
+
+# Defines timed by default
+TIMED_DEFINES = ['JetCorPt', 'InvariantMass']
+
+def add_metrics_arguments(parser):
+    '''
+    Add the --metrics option to an argparse parser.
+    '''
+    parser.add_argument("--metrics", dest="metrics", help="Json file where the performance metrics of the run are written (timing, throughput, cut flow, time spent in "+', '.join(TIMED_DEFINES)+")", type=str, default='')
+
+def enable():
+    '''
+    Start capturing the RDataFrame log, before the event loop.
+    '''
+    ROOT.CaptureRDFLog()
+
+def log_timing():
+    '''
+    Jitting time and event loop cpu and elapsed time (summed over the event loops), from the captured log.
+    '''
+    timing = {'jit_time': 0., 'event_loop_cpu_time': 0., 'event_loop_wall_time': 0., 'event_loops': 0}
+    for message in ROOT.RDFLogMessages():
+        message = str(message)
+        jit = re.search(r'Just-in-time compilation phase completed in ([0-9.eE+-]+) seconds', message)
+        if jit:
+            timing['jit_time'] += float(jit.group(1))
+        loop = re.search(r'Finished event loop number \d+ \(([0-9.eE+-]+)s CPU, ([0-9.eE+-]+)s elapsed\)', message)
+        if loop:
+            timing['event_loop_cpu_time'] += float(loop.group(1))
+            timing['event_loop_wall_time'] += float(loop.group(2))
+            timing['event_loops'] += 1
+    return timing
+
+def cut_flow(report):
+    '''
+    Named filters of a df.Report() result: [{'name', 'all', 'pass', 'efficiency'}], in order.
+    '''
+    return [{'name': str(cut.GetName()), 'all': cut.GetAll(), 'pass': cut.GetPass(), 'efficiency': cut.GetEff()/100.} for cut in report.GetValue()]
+
+def define_times(names, loop_time):
+    '''
+    Evaluation time of the timed Defines names: calls, total time (summed over the threads), time per call and fraction of the event loop.
+    '''
+    times = {}
+    for name in names:
+        total = ROOT.DefineTimeSeconds(name)
+        calls = ROOT.DefineCalls(name)
+        times[name] = {'calls': calls, 'time': total, 'time_per_call_us': total/calls*1e6 if calls else 0.,
+                       'fraction_of_event_loop_cpu': total/loop_time if loop_time > 0 else 0.}
+    return times
+
+def collect(booked, io_stats, timed):
+    '''
+    Metrics of the run, from the booked samples (after the event loop, see analysis.py), the I/O statistics and the timed Defines.
+    '''
+    metrics = log_timing()
+    if metrics['event_loops'] == 0:
+        #Log not available: wall and cpu time of the whole RunGraphs call (jitting included)
+        metrics['event_loop_wall_time'], metrics['event_loop_cpu_time'] = io_stats['wall_time'], io_stats['cpu_time']
+    metrics['events'] = sum(b['nProcessed'].GetValue() for b in booked)
+    metrics['events_per_second'] = metrics['events']/metrics['event_loop_wall_time'] if metrics['event_loop_wall_time'] > 0 else 0.
+    metrics['threads'] = io_stats['threads']
+    metrics['bytes_read'] = io_stats['bytes_read']
+    metrics['io'] = io_stats
+    metrics['filters'] = {b['sample']['name']: cut_flow(b['report']) for b in booked}
+    metrics['defines'] = define_times(timed, metrics['event_loop_cpu_time'])
+    metrics['histogram_memory'] = {b['sample']['name']: b['histo_memory'] for b in booked}
+    return metrics
+
+def print_metrics(metrics):
+    print('Jitting {:.1f} s, event loop {:.1f} s wall / {:.1f} s cpu, {} events, {:.0f} events/s, {:.1f} MB read'.format(
+        metrics['jit_time'], metrics['event_loop_wall_time'], metrics['event_loop_cpu_time'], metrics['events'], metrics['events_per_second'], metrics['bytes_read']/1e6))
+    for name, t in metrics['defines'].items():
+        print('{}: {} calls, {:.2f} s ({:.2f} us per call, {:.1%} of the event loop cpu time)'.format(name, t['calls'], t['time'], t['time_per_call_us'], t['fraction_of_event_loop_cpu']))
+
+def write(metrics, path):
+    with open(path, 'w') as f:
+        json.dump(metrics, f, indent=1)
@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+'''
+Parallel rendering of the plots of the post-processing macros.
+A plot job is a function drawing and saving one figure, with its arguments: (function, arg1, arg2...).
+The histogram arrays are loaded once by the macro and copied into a single shared memory block:
+the jobs refer to them by name (see shared) instead of receiving a pickled copy each.
+The jobs are run by a pool of forked worker processes (functions defined in the macro itself can be used).
+'''
+
+# Arrays shared with the jobs, {name: array}
+_arrays = {}
+_block = None
+
+def add_workers_argument(parser):
+    '''
+    Add the -j/--workers option (number of plotting processes) to an argparse parser.
+    '''
+    parser.add_argument("-j", "--workers", dest="workers", help="Number of processes rendering the plots. Default=0 i.e. one per core, 1 means sequential", type=int, default=0)
+
+def shared(name):
+    '''
+    Array name of the arrays given to render (read-only in the workers).
+    '''
+    return _arrays[name]
+
+def _attach(block_name, layout):
+    global _block
+    _block = shared_memory.SharedMemory(name=block_name)
+    for name, (offset, shape, dtype) in layout.items():
+        array = np.ndarray(shape, dtype=dtype, buffer=_block.buf, offset=offset)
+        array.flags.writeable = False
+        _arrays[name] = array
+
+def _run(job):
+    function, args = job[0], job[1:]
+    return function(*args)
+
+def render(jobs, arrays={}, workers=0):
+    '''
+    Run the plot jobs [(function, arg1, ...)] with workers processes (0: one per core, 1: sequentially in this process).
+    arrays {name: numpy array} are shared with the jobs, which read them with shared(name).
+    Returns the results of the jobs, in order.
+    '''
+    if workers <= 0:
+        workers = os.cpu_count()
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        _arrays.update(arrays)
+        return [_run(job) for job in jobs]
+
+    # One block for all the arrays, each aligned on 8 bytes
+    layout, size = {}, 0
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        layout[name] = (size, array.shape, array.dtype.str)
+        size += (array.nbytes + 7)//8*8
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        for name, array in arrays.items():
+            offset, shape, dtype = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)[...] = array
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_attach, initargs=(block.name, layout)) as pool:
+            return list(pool.map(_run, jobs))
+    finally:
+        block.close()
+        block.unlink()
@@ -0,0 +1,126 @@
+import os
+import sys
+import json
+import difflib
+import yaml
+import argparse
+
+from inputs import expand_inputs
+import catalog
+
+'''
+Registry of the samples (macros/samples.yaml), indexed by dataset name:
+    GJ_PTG-100to200_TuneCP5_13p6TeV_amcatnlo-pythia8:
+        process: gjets          label of the process (suffix of the histograms)
+        isData: 0
+        year: 2023
+        era: C
+        xs: 1380.0              cross section in pb (MC only)
+        xs_source: ...          optional, where the cross section comes from
+        files:                  file globs (or .txt file lists)
+        - /pnfs/.../*/*.root
+        sumw: ...               sum of the generator weights of all the files (cached, see update_sumw)
+        entries: ...            number of events of all the files (cached with sumw)
+analysis.py (-s), partition_jobs.py (--sample) and hadd_scale_merge.py resolve the samples by name through it.
+
+Cache the sum of weights of samples (from the helpers folder):
+    python3 sampleregistry.py sumw NAME [NAME...]
+'''
+
+DEFAULT_REGISTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'macros', 'samples.yaml')
+
+def load(path=DEFAULT_REGISTRY, year=2023, era='C'):
+    '''
+    Read a registry (or a dataset spec with the same format). Returns {name: sample}, each sample with all the fields
+    (name, process, isData, year, era, xs and sumw None if unknown, files a list). year and era are the defaults.
+    '''
+    with open(path) as f:
+        spec = yaml.safe_load(f) or {}
+    registry = {}
+    for name, info in spec.items():
+        files = info.get('files', [])
+        registry[name] = {'name': name,
+                          'process': info['process'],
+                          'isData': int(info.get('isData', 0)),
+                          'year': int(info.get('year', year)),
+                          'era': str(info.get('era', era)),
+                          'xs': float(info['xs']) if info.get('xs') is not None else None,
+                          'xs_source': info.get('xs_source'),
+                          'files': files if isinstance(files, list) else [files],
+                          'sumw': info.get('sumw'),
+                          'entries': info.get('entries')}
+    return registry
+
+def save(registry, path=DEFAULT_REGISTRY):
+    spec = {}
+    for name, sample in registry.items():
+        spec[name] = {key: value for key, value in sample.items() if key != 'name' and value not in (None, [])}
+    with open(path, 'w') as f:
+        yaml.safe_dump(spec, f, sort_keys=False, default_flow_style=False, indent=4, width=1000)
+
+def get(registry, name):
+    '''
+    Sample name of the registry, with a clear error if it is not registered.
+    '''
+    if name not in registry:
+        raise KeyError('Sample {} is not in the registry, add it to samples.yaml'.format(name))
+    return registry[name]
+
+def processes(registry):
+    return sorted(set(sample['process'] for sample in registry.values()))
+
+def sample_files(sample):
+    return expand_inputs(sample['files'])
+
+def resolve(registry, folder):
+    '''
+    Sample of an output folder: the sample recorded in its manifest.json (written by partition_jobs.py), else the sample
+    named as the folder. Raises KeyError, listing the closest registered names, if the folder name is not a registered sample.
+    '''
+    manifest = os.path.join(folder, 'manifest.json')
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            name = json.load(f).get('sample')
+        if name:
+            return get(registry, name)
+    base = os.path.basename(os.path.normpath(folder))
+    if base in registry:
+        return registry[base]
+    close = difflib.get_close_matches(base, registry, n=3, cutoff=0.6)
+    raise KeyError('Folder {} is not named after a sample of the registry{}: name it after the sample or submit it with --sample NAME'.format(
+        folder, ' (closest: {})'.format(', '.join(close)) if close else ''))
+
+def update_sumw(registry, names):
+    '''
+    Cache the number of events and the sum of generator weights (Runs tree) of all the files of the samples names
+    (through the file catalog, only the files not cataloged yet are opened).
+    '''
+    for name in names:
+        sample = get(registry, name)
+        info = catalog.lookup(sample_files(sample), update=True)
+        sample['entries'] = sum(i['entries'] for i in info.values())
+        sumws = [i['genEventSumw'] for i in info.values()]
+        sample['sumw'] = None if sample['isData'] or None in sumws else sum(sumws)
+        print('{}: {} files, {} events, sumw = {}'.format(name, len(info), sample['entries'], sample['sumw']))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''Sample registry: list the samples or cache their sum of weights''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("command", help="list: print the registered samples\nsumw: cache the number of events and sum of weights of the samples", choices=['list', 'sumw'])
+    parser.add_argument("names", help="Samples (sumw)", nargs='*', type=str)
+    parser.add_argument("-r", "--registry", dest="registry", help="Registry file. Default=macros/samples.yaml", type=str, default=DEFAULT_REGISTRY)
+    args = parser.parse_args()
+
+    registry = load(args.registry)
+    if args.command == 'list':
+        for name, sample in registry.items():
+            print('{:90s} {:10s} {} {:4s} xs = {} sumw = {}'.format(name, sample['process'], sample['year'], sample['era'], sample['xs'], sample['sumw']))
+        return 0
+    update_sumw(registry, args.names)
+    save(registry, args.registry)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,17 +6,17 @@ matplotlib.use("Agg")  # Use non-interactive backend (no display needed)
 import matplotlib.pyplot as plt
 from scipy.stats import chi2 as chi2_stats
 import csv
+import sys
+
+sys.path.insert(0, '../../helpers')
+import histarrays
+import plotpool
+import argparse
 
 def plot_hist(hist_name,x_label):
-	hist = inputfile.Get(hist_name)
-	if not hist:
-		print(f'Histogram {hist_name} not found !')
-		return
-	
-	# Convert ROOT histogram to numpy
-	bins = hist.GetNbinsX()
-	x_values = np.array([hist.GetBinCenter(i) for i in range(1, bins+1)])
-	y_values = np.array([hist.GetBinContent(i) for i in range(1, bins+1)])
+	# Bin centers and contents, loaded once by the main process
+	x_values = plotpool.shared(hist_name+'_x')
+	y_values = plotpool.shared(hist_name+'_y')
 	
 	# Plot with matplotlib
 	plt.figure(figsize=(8,6))
@@ -32,6 +32,13 @@ def plot_hist(hist_name,x_label):
 	print(f'Saved {png_filename}')
 	plt.close()
 
+parser = argparse.ArgumentParser(description='''Distributions of the kinematic variables''')
+plotpool.add_workers_argument(parser)
+args = parser.parse_args()
+
+plot_jobs = []
+arrays = {}
+
 # Process both Source and background
 for S in [0,1]:
 	if S == 1: 
@@ -68,7 +75,11 @@ for S in [0,1]:
 		hist_phi_name = 'Jet_delta_phi_gjets;1'
 		label_suffix = 'gjets'
 			
-	for hist_name,x_label in hist_names.items():
-		plot_hist(hist_name, x_label)
+	for hist_name,hist in histarrays.read(inputfile, list(hist_names)).items():
+		arrays[hist_name+'_x'] = histarrays.centers(hist)
+		arrays[hist_name+'_y'] = histarrays.values(hist)
+		plot_jobs.append((plot_hist, hist_name, hist_names[hist_name]))
 
 	inputfile.Close()
+
+plotpool.render(plot_jobs, arrays, args.workers)
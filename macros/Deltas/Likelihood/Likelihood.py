@@ -1,6 +1,12 @@
 import ROOT
 import numpy as np
 import matplotlib.pyplot as plt
+import sys
+
+sys.path.insert(0, '../../../helpers')
+import histarrays
+import plotpool
+import argparse
 
 # --- Import ROOT files ---
 file_sig = ROOT.TFile.Open('../../Source.root')
@@ -20,7 +26,30 @@ base_variables = {
 # --- Parton Flavours (1 to 5) ---
 flavours = ['', 'PartonFlavour1', 'PartonFlavour2', 'PartonFlavour3', 'PartonFlavour4', 'PartonFlavour5']
 
+# --- Plot ---
+def plot_likelihood(name, varname, flavour, outname):
+    # Bin centers and discriminant values, shared as name_x and name_y (see plotpool)
+    plt.figure()
+    plt.plot(plotpool.shared(name+'_x'), plotpool.shared(name+'_y'), label='Likelihood ratio')
+    plt.xlabel(varname)
+    plt.ylabel('Likelihood Discriminant')
+    plt.title(f'Likelihood Discriminant for {varname} {flavour}')
+    plt.grid(True)
+    plt.legend()
+    plt.tight_layout()
+    
+    # Save figure
+    plt.savefig(outname, dpi=300, bbox_inches='tight')
+    print(f'Successfully created {outname}')
+    plt.close() # Close the figure to save memory
+
+parser = argparse.ArgumentParser(description='''Likelihood discriminant of the kinematic variables''')
+plotpool.add_workers_argument(parser)
+args = parser.parse_args()
+
 # --- Process histograms ---
+plot_jobs = []
+arrays = {}
 for varname, info in base_variables.items():
     for flavour in flavours:
         suffix = f'_{flavour}' if flavour else ''  # Empty string for main histograms
@@ -37,42 +66,24 @@ for varname, info in base_variables.items():
             print(f"Skipping {sig_hist_name} or {bkg_hist_name} (not found)")
             continue
         
-        # Normalize histograms
-        if sig_hist.Integral() > 0:
-            sig_hist.Scale(1 / sig_hist.Integral())
-        if bkg_hist.Integral() > 0:
-            bkg_hist.Scale(1 / bkg_hist.Integral())
-        
-        # Define likelihood function
-        def compute_likelihood(x):
-            bin_sig = sig_hist.FindBin(x)
-            bin_bkg = bkg_hist.FindBin(x)
-            
-            p_sig = sig_hist.GetBinContent(bin_sig)
-            p_bkg = bkg_hist.GetBinContent(bin_bkg)
-            
-            denom = p_sig + p_bkg
-            return p_sig / denom if denom > 0 else 0.5
-        
-        # Compute likelihood values
-        nbins = sig_hist.GetNbinsX()
+        # Normalized contents (same binning for signal and background)
+        p_sig = histarrays.values(sig_hist)
+        p_bkg = histarrays.values(bkg_hist)
+        if p_sig.sum() > 0:
+            p_sig = p_sig / p_sig.sum()
+        if p_bkg.sum() > 0:
+            p_bkg = p_bkg / p_bkg.sum()
+
+        # Likelihood discriminant in each bin (0.5 where both are empty)
         x_min, x_max = info['xrange']
-        x_vals = np.array([sig_hist.GetBinCenter(i) for i in range(1, nbins + 1)])
-        x_vals = x_vals[(x_vals >= x_min) & (x_vals <= x_max)]
-        likelihoods = np.array([compute_likelihood(x) for x in x_vals])
+        x_vals = histarrays.centers(sig_hist)
+        in_range = (x_vals >= x_min) & (x_vals <= x_max)
+        denom = p_sig + p_bkg
+        likelihoods = np.divide(p_sig, denom, out=np.full_like(denom, 0.5), where=denom > 0)
         
-        # Plot
-        plt.figure()
-        plt.plot(x_vals, likelihoods, label='Likelihood ratio')
-        plt.xlabel(varname)
-        plt.ylabel('Likelihood Discriminant')
-        plt.title(f'Likelihood Discriminant for {varname} {flavour}')
-        plt.grid(True)
-        plt.legend()
-        plt.tight_layout()
-        
-        # Save figure
         safename = f"{info['hist_name']}{suffix}"
-        plt.savefig(f'Likelihood_{safename}.png', dpi=300, bbox_inches='tight')
-        print(f'Successfully created Likelihood_{safename}.png')
-        plt.close() # Close the figure to save memory
+        arrays[safename+'_x'] = x_vals[in_range]
+        arrays[safename+'_y'] = likelihoods[in_range]
+        plot_jobs.append((plot_likelihood, safename, varname, flavour, f'Likelihood_{safename}.png'))
+
+plotpool.render(plot_jobs, arrays, args.workers)
@@ -4,6 +4,16 @@ import matplotlib
 matplotlib.use("Agg")  # avoid GUI with matplotlib
 import matplotlib.pyplot as plt
 import os
+import sys
+import argparse
+
+sys.path.insert(0, '../../../helpers')
+import efficiency
+import plotpool
+
+parser = argparse.ArgumentParser(description='''ROC curves of the kinematic variables''')
+plotpool.add_workers_argument(parser)
+args = parser.parse_args()
 
 # --- Import ROOT files ---
 file_sg = ROOT.TFile('../../Source.root')
@@ -38,22 +48,34 @@ cut_labels = {
 
 all_curves = {}
 
+# --- Plots to render (in parallel, at the end), the curves being shared with the jobs (see plotpool) ---
+
+plot_jobs = []
+arrays = {}
+
+def share_curve(name,FPR,TPR):
+        '''
+        Add the FPR and TPR values of a curve to the shared arrays, returns the name the plot jobs refer to it with.
+        '''
+        arrays[name+'_fpr'] = FPR
+        arrays[name+'_tpr'] = TPR
+        return name
+
 # --- Make a plot ---
-def plot_roc(FPR,TPR,labels,title,outpath,auc=None):
+def plot_roc(curves,labels,title,outpath,auc=None):
         '''
         Plot ROC curves with given FPR/TPR values.
 
         Parameters:
-        - FPR           List of lists (one list per curve)
-        - TPR           List of lists (one list per curve)
+        - curves        Names of the curves, whose FPR/TPR values are the shared arrays name_fpr/name_tpr (see share_curve)
         - labels        List of legend labels
         - Title         Title for the plot
         - Outpath       Path to save the figure
         '''
         plt.figure(figsize=(8,6))
-        for i in range(len(FPR)):
+        for i, curve in enumerate(curves):
                 auc_text = f' (AUC={auc[i]:.3f})' if auc else ''
-                plt.plot(FPR[i],TPR[i],label=labels[i] + auc_text)
+                plt.plot(plotpool.shared(curve+'_fpr'),plotpool.shared(curve+'_tpr'),label=labels[i] + auc_text)
 
         plt.plot([0,1],[0,1],'k--',label='Random guess')
         plt.xlabel(r'False Positive Rate (FPR) - Background efficiency $\epsilon_{\mathrm{bkg}}$')
@@ -71,49 +93,25 @@ def plot_roc(FPR,TPR,labels,title,outpath,auc=None):
 
 for cut_name,cut_suffix in cuts.items():
         print(f'\n*** Making global ROC curves after cut {cut_labels[cut_name]} ***')
-        TPR_list,FPR_list,label_list,auc_list = [],[],[],[]
+        curve_list,label_list,auc_list = [],[],[]
 
         for label, info in variables.items():
             hist_base = info['hist_name']
-            sg_hist = file_sg.Get(f"{hist_base}{cut_suffix}_zg")
-            bg_hist = file_bg.Get(f"{hist_base}{cut_suffix}_gjets")
-
-            if not sg_hist or not bg_hist or sg_hist.Integral() == 0 or bg_hist.Integral() == 0:
+            kept, edges, sg, bg = efficiency.read_histogram_pairs(file_sg, file_bg, [f"{hist_base}{cut_suffix}_zg"], [f"{hist_base}{cut_suffix}_gjets"])
+            if not kept:
                 print(f"Skipping {label} due to missing or empty histograms.")
                 continue
 
-            # Normalize
-            sg_hist.Scale(1 / sg_hist.Integral())
-            bg_hist.Scale(1 / bg_hist.Integral())
-
             x_min, x_max = info['xrange']
             x_vals = np.linspace(x_min, x_max, 500)
-
-            TPR, FPR = [], []
-            for threshold in x_vals:
-                bin_thr = sg_hist.GetXaxis().FindBin(threshold)
-                if info['cut_dir'] == 'less':
-                    sig_pass = sg_hist.Integral(1, bin_thr)
-                    bg_pass = bg_hist.Integral(1, bin_thr)
-                else:
-                    sig_pass = sg_hist.Integral(bin_thr, sg_hist.GetNbinsX())
-                    bg_pass = bg_hist.Integral(bin_thr, bg_hist.GetNbinsX())
-                
-                TPR.append(sig_pass)
-                FPR.append(bg_pass)
-            
-            FPR,TPR = zip(*sorted(zip(FPR,TPR)))
-            FPR = list(FPR)
-            TPR = list(TPR)
-            auc = np.trapz(TPR, FPR)
-            all_curves[(label,cut_name)] = (FPR,TPR,auc)
-            TPR_list.append(TPR)
-            FPR_list.append(FPR)
+            FPR, TPR, auc = efficiency.roc(edges, sg[0], bg[0], x_vals, info['cut_dir'])
+            all_curves[(label,cut_name)] = (share_curve(f'{hist_base}_{cut_name}',FPR,TPR),auc)
+            curve_list.append(all_curves[(label,cut_name)][0])
             label_list.append(f'{label} [{cut_labels[cut_name]}]')
             auc_list.append(auc)
             print(f'ROC curve for {label} ready')
         folder_name = 'No_cut' if cut_name == 'nocut' else cut_name
-        plot_roc(FPR_list,TPR_list,label_list,title=f'ROC curves for signal discrimination - {cut_labels[cut_name]}',outpath=f'plots/{folder_name}/ROC_all_variables_{cut_name}.png',auc=auc_list)
+        plot_jobs.append((plot_roc,curve_list,label_list,f'ROC curves for signal discrimination - {cut_labels[cut_name]}',f'plots/{folder_name}/ROC_all_variables_{cut_name}.png',auc_list))
 
 flavours = [f'PartonFlavour{k}' for k in range(1,6)]
 for cut_name,cut_suffix in cuts.items():
@@ -121,59 +119,32 @@ for cut_name,cut_suffix in cuts.items():
         print(f'\n*** Making ROC curves per flavour after cut {cut_name}***\n')
         for label, info in variables.items():
                 print(f'\n=== Working on {label} ===\n')
-                plt.figure(figsize=(8, 6))  # One figure per variable
-                TPR_list,FPR_list,label_list,auc_list = [],[],[],[]
+                curve_list,label_list,auc_list = [],[],[]
 
                 if (label,cut_name) in all_curves:
-                        FPR_all,TPR_all,auc_all = all_curves[label,cut_name]
-                        FPR_list.append(list(FPR_all))
-                        TPR_list.append(TPR_all)
+                        curve_all,auc_all = all_curves[label,cut_name]
+                        curve_list.append(curve_all)
                         auc_list.append(auc_all)
                         label_list.append("all")
                         print(f'ROC curve for {label} ready')
-                        
-                for flavour in flavours:
-                        #suffix = f'_{flavour}' if flavour else ''
-                        suffix = f'_{flavour}' if cut_name=="nocut" else f'_{flavour}{cut_suffix}'
-                        sg_hist_name = f'{info["hist_name"]}{suffix}_zg'
-                        bg_hist_name = f'{info["hist_name"]}{suffix}_gjets'
-
-                        sg_hist = file_sg.Get(sg_hist_name)
-                        bg_hist = file_bg.Get(bg_hist_name)
-                        if not sg_hist or not bg_hist:
-                                print(f'Skipping {sg_hist_name} or {bg_hist_name} (not found)')
-                                continue
-
-                        if sg_hist.Integral() == 0 or bg_hist.Integral() == 0:
-                                print(f'Skipping empty histogram for {label} - {flavour or "all"}')
-                                continue
-                        sg_hist.Scale(1/sg_hist.Integral())
-                        bg_hist.Scale(1/bg_hist.Integral())
 
+                # All flavours at once (same binning)
+                suffixes = [f'_{flavour}' if cut_name=="nocut" else f'_{flavour}{cut_suffix}' for flavour in flavours]
+                kept, edges, sg, bg = efficiency.read_histogram_pairs(file_sg, file_bg,
+                                                                      [f'{info["hist_name"]}{suffix}_zg' for suffix in suffixes],
+                                                                      [f'{info["hist_name"]}{suffix}_gjets' for suffix in suffixes])
+                if kept:
                         x_min,x_max = info['xrange']
                         x_vals = np.linspace(x_min,x_max,500)
-
-                        TPR,FPR = [],[]
-                        for threshold in x_vals:
-                                bin_thr = sg_hist.GetXaxis().FindBin(threshold)
-                                if info['cut_dir'] == 'less':
-                                        sig_pass = sg_hist.Integral(1,bin_thr)
-                                        bg_pass = bg_hist.Integral(1,bin_thr)
-                                else:
-                                        sig_pass = sg_hist.Integral(bin_thr,sg_hist.GetNbinsX())
-                                        bg_pass = bg_hist.Integral(bin_thr,bg_hist.GetNbinsX())
-
-                                TPR.append(sig_pass)
-                                FPR.append(bg_pass)
-                        FPR,TPR = zip(*sorted(zip(FPR,TPR)))
-                        auc = np.trapz(TPR,FPR)
-                        legend_label = flavour
-                        
-                        TPR_list.append(TPR)
-                        FPR_list.append(FPR)
-                        label_list.append(f'{legend_label} [{cut_labels[cut_name]}]')
-                        auc_list.append(auc)
-                        print(f'ROC curve for {label} {legend_label} ready')
+                        FPR, TPR, auc = efficiency.roc(edges, sg, bg, x_vals, info['cut_dir'])
+                        for row, i in enumerate(kept):
+                                curve_list.append(share_curve(f'{info["hist_name"]}_{flavours[i]}_{cut_name}',FPR[row],TPR[row]))
+                                label_list.append(f'{flavours[i]} [{cut_labels[cut_name]}]')
+                                auc_list.append(auc[row])
+                                print(f'ROC curve for {label} {flavours[i]} ready')
                 folder_name = 'No_cut' if cut_name == 'nocut' else cut_name
                 cut_title = cut_labels[cut_name]
-                plot_roc(FPR_list,TPR_list,label_list,title=f'ROC curves for {label} by jet flavour - {cut_title}', outpath=f'plots/{folder_name}/ROC_{info["hist_name"]}_{cut_name}.png',auc=auc_list)
+                plot_jobs.append((plot_roc,curve_list,label_list,f'ROC curves for {label} by jet flavour - {cut_title}',f'plots/{folder_name}/ROC_{info["hist_name"]}_{cut_name}.png',auc_list))
+
+plotpool.render(plot_jobs, arrays, args.workers)
+print(f'{len(plot_jobs)} ROC plots saved')
@@ -5,6 +5,16 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
 import os
+import sys
+import argparse
+
+sys.path.insert(0, '../../../helpers')
+import efficiency
+import plotpool
+
+parser = argparse.ArgumentParser(description='''Significance of a cut on each kinematic variable''')
+plotpool.add_workers_argument(parser)
+args = parser.parse_args()
 
 # --- Import ROOT files ---
 file_sg = ROOT.TFile('../../Source.root')
@@ -29,16 +39,17 @@ cut_suffixes = {
 # --- Plot S/sqrt(S+B) ---
 
 # --- Make a plot ---
-def plot_significance(cut_points, significances, variable_name=None, save_path=None, cut_name=None):
+def plot_significance(curve, variable_name=None, save_path=None, cut_name=None):
     """
     Plot signal significance S / sqrt(S + B) vs cut threshold.
 
     Parameters:
-    - cut_points: list or np.array of threshold values
-    - significances: list or np.array of significance values
+    - curve: name of the curve, whose threshold and significance values are the shared arrays curve_x and curve_y (see plotpool)
     - variable_name: (optional) string, name of the variable being cut on
     - save_path: (optional) path to save the figure instead of displaying it
     """
+    cut_points = plotpool.shared(curve+'_x')
+    significances = plotpool.shared(curve+'_y')
     plt.figure(figsize=(8, 5))
 
     # Find the max significance
@@ -64,36 +75,28 @@ def plot_significance(cut_points, significances, variable_name=None, save_path=N
 
 # --- Plot significance curves ---
 
+plot_jobs = []
+arrays = {}
+
 for label, info in variables.items():
         for cut_key,cut_suffix in cut_suffixes.items():
-            sg_hist = file_sg.Get(f'{info["hist_name"]}{cut_suffix}_zg')
-            bg_hist = file_bg.Get(f'{info["hist_name"]}{cut_suffix}_gjets')
-
-            if not sg_hist or not bg_hist or sg_hist.Integral() == 0 or bg_hist.Integral() == 0:
+            kept, edges, sg, bg = efficiency.read_histogram_pairs(file_sg, file_bg, [f'{info["hist_name"]}{cut_suffix}_zg'], [f'{info["hist_name"]}{cut_suffix}_gjets'])
+            if not kept:
                 print(f"Skipping {label} - {cut_suffix} due to missing or empty histograms.")
                 continue
 
-            # Normalize
-            sg_hist.Scale(1 / sg_hist.Integral())
-            bg_hist.Scale(1 / bg_hist.Integral())
-
+            # Normalised S and B (signal and background efficiencies)
             x_min, x_max = info['xrange']
             x_vals = np.linspace(x_min, x_max, 500)
-            significances,cut_points = [],[]
-            for threshold in x_vals:
-                bin_thr = sg_hist.GetXaxis().FindBin(threshold)
-                if info['cut_dir'] == "less":
-                    S = sg_hist.Integral(1, bin_thr)
-                    B = bg_hist.Integral(1, bin_thr)
-                else:
-                    S = sg_hist.Integral(bin_thr, sg_hist.GetNbinsX())
-                    B = bg_hist.Integral(bin_thr, bg_hist.GetNbinsX())
-                
-                if S + B > 0:
-                    significance = S/np.sqrt(S+B)
-                    significances.append(significance)
-                    cut_points.append(threshold)
+            significances = efficiency.significance(edges, sg[0], bg[0], x_vals, info['cut_dir'])
+            defined = ~np.isnan(significances)
             outdir = f'plots/{cut_key}/'
             os.makedirs(outdir,exist_ok=True)
-            plot_significance(cut_points,significances,label,f'{outdir}Significance_{info["hist_name"]}.png',cut_key)
-            print(f'Significance curve for {label} [{cut_key}] plotted.')
+            curve = f'{info["hist_name"]}_{cut_key}'
+            arrays[curve+'_x'] = x_vals[defined]
+            arrays[curve+'_y'] = significances[defined]
+            plot_jobs.append((plot_significance,curve,label,f'{outdir}Significance_{info["hist_name"]}.png',cut_key))
+            print(f'Significance curve for {label} [{cut_key}] computed.')
+
+plotpool.render(plot_jobs, arrays, args.workers)
+print(f'{len(plot_jobs)} significance plots saved')
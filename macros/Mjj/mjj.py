@@ -5,6 +5,12 @@ import matplotlib.pyplot as plt
 from array import array
 import numpy as np
 import os
+import sys
+
+sys.path.insert(0, '../../helpers')
+import histarrays
+import plotpool
+import argparse
 
 # --- Import ROOT files ---
 
@@ -50,67 +56,69 @@ def build_mjj_histos_dict(ROOT_file,sample_type):
 			histos[key] = ROOT_file.Get(flavour_name)
 	return histos
 
-def plot_mjj_histograms(histos,cut_labels,output_dir="plots"):
+def plot_mjj(name,hist_label,title,outpath):
+	"""
+	Plot one mjj histogram (bin centers and contents shared as name_x, name_y, see plotpool).
 	"""
-	Plots mjj histograms and mjj by parton flavour for each cut level.
+	fig,ax = plt.subplots()
+	ax.plot(plotpool.shared(name+'_x'),plotpool.shared(name+'_y'),label=hist_label,**({'color':'black'} if hist_label == 'Inclusive' else {}))
+	ax.set_title(title)
+	ax.set_xlabel(f'Mjj [GeV]')
+	ax.set_ylabel(f'Entries')
+	ax.legend()
+	fig.tight_layout()
+	fig.savefig(outpath)
+	plt.close(fig)
+
+def plot_mjj_histograms(histos,cut_labels,output_dir="plots",prefix=""):
+	"""
+	Prepare the plots of the mjj histograms and mjj by parton flavour for each cut level.
 
 	Parameters:
 	- histos	Dictionnary with each histogram name as key and ROOT histogram object as value.
 	- cut_labels	Dictionnary mapping cut-keys to human-readable labels.
 	- output_dir	Base directory to save plots
+	- prefix	Prefix of the names of the shared arrays (to distinguish the samples)
 
+	Returns the plot jobs and the arrays they need, to be rendered with plotpool.render.
 	"""
 
 	os.makedirs(output_dir,exist_ok=True)
-	
+	jobs, arrays = [], {}
+
+	def add_job(histo_name,hist_label,title,fig_name):
+		hist = histos.get(histo_name)
+		if not hist:
+			print(f'{histo_name} not found !')
+			return
+		name = prefix+histo_name
+		arrays[name+'_x'] = histarrays.centers(hist)
+		arrays[name+'_y'] = histarrays.values(hist)
+		jobs.append((plot_mjj,name,hist_label,title,os.path.join(cut_dir,fig_name)))
+
 	for cut_key,label in cut_labels.items():
 		cut_dir = os.path.join(output_dir,cut_key)
 		os.makedirs(cut_dir,exist_ok=True)
 		
 		# Inclusive mjj histogram
 		histo_name = 'mjj' if cut_key == "nocut" else f"mjj_{cut_key}"
-		if histo_name in histos:
-			hist = histos[histo_name]
-			fig,ax = plt.subplots()
-			x_vals = [hist.GetBinCenter(i) for i in range(1,hist.GetNbinsX()+1)]
-			y_vals = [hist.GetBinContent(i) for i in range(1,hist.GetNbinsX()+1)]
-			ax.plot(x_vals,y_vals,label=f'Inclusive',color='black')
-			ax.set_title(f'Mjj - {label}')
-			ax.set_xlabel(f'Mjj [GeV]')
-			ax.set_ylabel(f'Entries')
-			ax.legend()
-			fig.tight_layout()
-			fig_name = f'mjj_{cut_key}.png'
-			fig.savefig(os.path.join(cut_dir,fig_name))
-			plt.close(fig)
-		else:
-			print(f'{histo_name} not found !')
+		add_job(histo_name,'Inclusive',f'Mjj - {label}',f'mjj_{cut_key}.png')
 		# Flavour-tagged mjj histogram
 		for k in range(1,6):
 			hist_name = f'mjj_partonflavour{k}' if cut_key == 'nocut' else f'mjj_PartonFlavour{k}_{cut_key}'
-			if hist_name not in histos:
-				print(f'{hist_name} not found !')
-			else:
-				hist = histos[hist_name]
-				fig,ax = plt.subplots()
-				x_vals = [hist.GetBinCenter(i) for i in range(1,hist.GetNbinsX()+1)]
-				y_vals = [hist.GetBinContent(i) for i in range(1,hist.GetNbinsX()+1)]
-				hist_label = f'Flavour {k}'
-				ax.plot(x_vals,y_vals,label=hist_label)
-				hist_title = f'Mjj PartonFlavour {k} - {label}'
-				ax.set_title(hist_title)
-				ax.set_xlabel(f'Mjj [GeV]')
-				ax.set_ylabel(f'Entries')
-				ax.legend()
-				fig.tight_layout()
-				fig_name = f'mjj_PartonFlavour{k}' if cut_key == "nocut" else f"mjj_PartonFlavour{k}_{cut_key}" + ".png"
-				fig.savefig(os.path.join(cut_dir,fig_name))
-				plt.close(fig)
+			fig_name = (f'mjj_PartonFlavour{k}' if cut_key == "nocut" else f"mjj_PartonFlavour{k}_{cut_key}") + ".png"
+			add_job(hist_name,f'Flavour {k}',f'Mjj PartonFlavour {k} - {label}',fig_name)
+	return jobs, arrays
+
+parser = argparse.ArgumentParser(description='''Mjj distributions''')
+plotpool.add_workers_argument(parser)
+args = parser.parse_args()
 
 cut_labels = {key:vals["label"] for key,vals in cuts.items()}
 
 histos_bg = build_mjj_histos_dict(file_bg, "gjets")
 histos_sg = build_mjj_histos_dict(file_sg, "zg")
 
-plot_mjj_histograms(histos_bg, cut_labels, output_dir="plots/bg")
-plot_mjj_histograms(histos_sg, cut_labels, output_dir="plots/sg")
+jobs_bg, arrays_bg = plot_mjj_histograms(histos_bg, cut_labels, output_dir="plots/bg", prefix="bg_")
+jobs_sg, arrays_sg = plot_mjj_histograms(histos_sg, cut_labels, output_dir="plots/sg", prefix="sg_")
+plotpool.render(jobs_bg+jobs_sg, {**arrays_bg, **arrays_sg}, args.workers)
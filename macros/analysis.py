@@ -7,38 +7,62 @@ import argparse
 #Importing stuff from other python files
 sys.path.insert(0, '../helpers')
 
-import helper_gammaztobb as h_gammaztobb
+import kernels
+import branchaudit
+import catalog
+import histstorage
+import iotuning
+import metrics
+import sampleregistry
+from inputs import expand_inputs, processed_sumw
 import numpy as np
 
-ROOT.gInterpreter.Declare('#include "../helpers/Helper.h"')
+#Compiled selection kernels, kinematic helpers and JEC functors (see helpers/kernels.py)
+if not kernels.load_kernels():
+    sys.exit(1)
+import helper_gammaztobb as h_gammaztobb
+
+DEFAULT_INPUT = '/pnfs/iihe/cms/ph/sc4/store/mc/Run3Summer23NanoAODv12/ZGto2QG-1Jets_PTG-100to200_TuneCP5_13p6TeV_amcatnloFXFX-pythia8/NANOAODSIM/130X_mcRun3_2023_realistic_v15-v2/2810000/9650ee14-6c75-4e22-bff3-595197189178.root'
+
+def read_samples(args):
+    '''
+    Build the list of samples to process, either from the command line arguments (one sample),
+    from samples of the registry (samples.yaml, see helpers/sampleregistry.py) selected by name,
+    or from a yaml dataset spec mapping each dataset name to its files, process, isData, year and era, e.g.
+    ZGto2QG-1Jets_PTG-100to200:
+        process: zg
+        isData: 0
+        year: 2023
+        era: C
+        files: ['/pnfs/.../*/*.root']
+    '''
+    if args.samples:
+        registry = sampleregistry.load(args.registry)
+        samples = [dict(sampleregistry.get(registry, name)) for name in args.samples]
+    elif args.dataset != '':
+        samples = list(sampleregistry.load(args.dataset, args.year, args.era).values())
+    else:
+        inputs = args.inputFiles if args.inputFiles else [DEFAULT_INPUT]
+        return [{'name': args.process, 'process': args.process, 'isData': args.isData, 'year': args.year, 'era': args.era, 'files': expand_inputs(inputs)}]
+    for sample in samples:
+        sample['files'] = sampleregistry.sample_files(sample)
+    return samples
+
+def book_sample(sample, args):
+    '''
+    Book the full GammaZSelection graph of one sample without running the event loop.
+    Returns a dictionary with the histograms, the report and the bookkeeping results.
+    '''
+    #Optionally copy the whole input files to local disk first (see helpers/iotuning.py)
+    files, staged, staging_time = sample['files'], [], 0.
+    if args.stage != '':
+        files, staging_time = iotuning.stage(sample['files'], args.stage, sample['name'])
+        staged = files
 
-def main():
-    ###Arguments 
-    parser = argparse.ArgumentParser(
-        description='''Photon+X analysis''',
-        usage='use "%(prog)s --help" for more information',
-        formatter_class=argparse.RawTextHelpFormatter)
-    parser.add_argument("--max_events", dest="max_events", help="Maximum number of events to analyze. Default=-1 i.e. run on all events.", type=int, default=-1)
-    parser.add_argument("-i", "--input", dest="inputFile", help="Input file", type=str, default='')
-    parser.add_argument("-o", "--output", dest="outputFile", help="Output file", type=str, default='')
-    parser.add_argument("--year", dest="year", help="Year considered (2022, 2023, 2024)", type=int, default=2023)
-    parser.add_argument("--era", dest="era", help="Era", type=str, default='Cv4')
-    parser.add_argument("--isData", dest="isData", help="is Data or MC", type=int, default=0)
-    parser.add_argument("-p", "--process", dest="process", help="Name of the process (gjets, zg, data)", type=str, default='')
-    args = parser.parse_args()
-    
-    if args.process not in ['gjets','zg','data']:
-        print("Process type {} is not defined".format(args.process))
-        return
-
-    ###Define the RDataFrame from the input tree
-    inputFile = args.inputFile
-    if inputFile == '':
-        inputFile = '/pnfs/iihe/cms/ph/sc4/store/mc/Run3Summer23NanoAODv12/ZGto2QG-1Jets_PTG-100to200_TuneCP5_13p6TeV_amcatnloFXFX-pythia8/NANOAODSIM/130X_mcRun3_2023_realistic_v15-v2/2810000/9650ee14-6c75-4e22-bff3-595197189178.root'
-        
     #Load the TTree and make a RDataFrame, see https://root.cern/doc/v628/classROOT_1_1RDataFrame.html
-    df = ROOT.RDataFrame('Events', inputFile)
-    
+    chain = iotuning.make_chain(files, args.cache_size)
+    df = ROOT.RDataFrame(chain)
+
     #Event weight. If not defined (e.g. for data), set it to 1.
     if not 'LHEWeight_originalXWGTUP' in df.GetColumnNames():
         df = df.Define('LHEWeight_originalXWGTUP','return 1.0;')
@@ -48,62 +72,229 @@ def main():
     if not 'Electron_mvaIso_WPHZZ' in df.GetColumnNames():
         df = df.Define('Electron_mvaIso_WPHZZ','Electron_mvaIso_WP90')
     if not 'HLT_Photon50EB_TightID_TightIso' in df.GetColumnNames():
-        df = df.Define('HLT_Photon50EB_TightID_TightIso', 'return 1.;')
+        df = df.Define('HLT_Photon50EB_TightID_TightIso', 'return true;')
     if not 'HLT_Photon30EB_TightID_TightIso' in df.GetColumnNames():
-        df = df.Define('HLT_Photon30EB_TightID_TightIso', 'return 1.;')
+        df = df.Define('HLT_Photon30EB_TightID_TightIso', 'return true;')
     if not 'HLT_Photon45EB_TightID_TightIso' in df.GetColumnNames():
         df = df.Define('HLT_Photon45EB_TightID_TightIso','HLT_Photon30EB_TightID_TightIso')
-       
-    
+
+
+    #Number of events and sum of weights of each file from the catalog (files not cataloged are opened, no event loop)
+    info = catalog.lookup(sample['files'], args.catalog)
+    infos = [info[f] for f in sample['files']]
+    nEvents = sum(i['entries'] for i in infos)
+    print('There are {} events in sample {}'.format(nEvents, sample['name']))
+    print('Files are: ', ' '.join(sample['files']))
+
+    #Entries to run on: [first_event, first_event+max_events) of the chain of input files
+    last = nEvents if args.max_events < 0 else min(nEvents, args.first_event+args.max_events)
+    if args.first_event > 0 or last < nEvents:
+        #The event loop is sequential when a range is requested (see main): Range selects exactly these chain entries
+        df = df.Range(args.first_event, last)
+
     #Example to make a histogram with the distribution of the number of vertices
+    #(booked after the entry range, so that jobs processing different ranges of a file can be summed)
     nvtx_histo = df.Histo1D(ROOT.RDF.TH1DModel("h_nvtx" , "Number of reco vertices;N_{vtx};Events"  ,    100, 0., 100.), "PV_npvs","LHEWeight_originalXWGTUP")
-    nEvents = df.Count().GetValue()
-    print('There are {} events'.format(nEvents))
-    print('File is: ',inputFile )
-    
-    #Max events to run on 
-    max_events = min(nEvents, args.max_events) if args.max_events >=0 else nEvents
-    df = df.Range(0, max_events)
-    #Next line to monitor event loop progress
-    df = df.Filter('if(tdfentry_ %100000 == 0) {cout << "Event is  " << tdfentry_ << endl;} return true;')
+    #Sum of the generator weights of the processed entries (MC only), used for the normalisation: genEventSumw of the Runs
+    #trees when whole files are processed, else the sum of genWeight over the entry range (exact, filled in the same event loop)
+    sumw = None
+    if not sample['isData']:
+        sumw = processed_sumw(infos, args.first_event, last)
+        if sumw is None:
+            sumw = df.Sum('genWeight')
+    #Next lines monitor event loop progress (thread-safe, see Helper.h)
+    nProcessed = df.Count()
+    ROOT.ReportProgress(nProcessed, 100000, max(0, last-args.first_event))
 
     #Next few lines apply some cleaning to reject problematic events/data. Do not remove
-    df = df.Filter('Flag_HBHENoiseFilter&&Flag_HBHENoiseIsoFilter&&Flag_goodVertices&&Flag_EcalDeadCellTriggerPrimitiveFilter&&Flag_BadPFMuonFilter&&Flag_BadPFMuonDzFilter')
-    df = df.Filter('run<379344||run>379411') #Pixels off, at least for some of these runs
+    df = df.Filter('Flag_HBHENoiseFilter&&Flag_HBHENoiseIsoFilter&&Flag_goodVertices&&Flag_EcalDeadCellTriggerPrimitiveFilter&&Flag_BadPFMuonFilter&&Flag_BadPFMuonDzFilter', 'Noise and bad event filters')
+    df = df.Filter('run<379344||run>379411', 'Runs with pixels off vetoed') #Pixels off, at least for some of these runs
 
-    #Output file 
-    if args.outputFile == '':
-        args.outputFile = 'output_'+args.channel+'.root'
-    out = ROOT.TFile(args.outputFile, "recreate")
     ####The sequence of filters/column definition starts here
 
     #Everything is done in h_gammaztobb
-    df, histos, BR_Obs, n, total, ndof, chi2, difference, pvalue = h_gammaztobb.GammaZSelection(df, args.year, args.era, args.isData)
-    df_report = df.Report()
-    for i in histos:
-        theh = histos[i].GetValue()
-        theh.SetName(theh.GetName()+"_"+args.process)
+    skimfile = os.path.join(args.skim, 'skim_{}.root'.format(sample['name'])) if args.skim != '' else ''
+    histstorage.reset()
+    df, histos, skim = h_gammaztobb.GammaZSelection(df, sample['year'], sample['era'], sample['isData'], args.jes, args.jec_compound, args.jec_table, skimfile, args.skim_compression)
+    variations = h_gammaztobb.BookVariations(histos) if args.jes and not sample['isData'] else {}
+    #Memory of the histograms during the event loop: one copy per slot and per variation
+    histo_memory = histstorage.memory_estimate(max(1, ROOT.GetThreadPoolSize()) if ROOT.IsImplicitMTEnabled() else 1, 2*len(args.jes) if variations else 0)
+    histstorage.print_memory(sample['name'], histo_memory)
+    return {'histo_memory': histo_memory, 'sample': sample, 'chain': chain, 'staged': staged, 'staging_time': staging_time, 'histos': histos, 'variations': variations, 'nvtx': nvtx_histo, 'sumw': sumw, 'report': df.Report(), 'nProcessed': nProcessed, 'skim': skim}
+
+def sumw_histogram(sumw):
+    '''
+    Histogram h_genEventSumw holding the sum of generator weights sumw (a number or an event loop result), summed over the jobs.
+    '''
+    h = ROOT.TH1D("h_genEventSumw", "Sum of generator weights (genEventSumw);;Sum of weights", 1, 0., 1.)
+    h.SetDirectory(ROOT.nullptr)
+    h.SetBinContent(1, sumw.GetValue() if hasattr(sumw, 'GetValue') else sumw)
+    h.SetEntries(1)
+    return h
+
+def main():
+    ###Arguments
+    parser = argparse.ArgumentParser(
+        description='''Photon+X analysis''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--max_events", dest="max_events", help="Maximum number of events to analyze (per sample). Default=-1 i.e. run on all events.", type=int, default=-1)
+    parser.add_argument("--first_event", dest="first_event", help="First event to analyze (per sample), e.g. for jobs processing a range of entries of a file. Default=0", type=int, default=0)
+    parser.add_argument("-i", "--input", dest="inputFiles", help="Input file(s): files, glob patterns or .txt file lists", nargs='+', type=str, default=[])
+    parser.add_argument("-s", "--samples", dest="samples", help="Names of samples of the registry to process (files, process, isData, year and era from the registry). Overrides -i/-p/--year/--era/--isData", nargs='+', type=str, default=[])
+    parser.add_argument("--registry", dest="registry", help="Sample registry. Default=samples.yaml", type=str, default=sampleregistry.DEFAULT_REGISTRY)
+    parser.add_argument("--catalog", dest="catalog", help="Catalog of the input files giving their number of entries and sum of weights (see helpers/catalog.py). Default=catalog.json", type=str, default=catalog.DEFAULT_CATALOG)
+    parser.add_argument("-d", "--dataset", dest="dataset", help="yaml dataset spec mapping groups of files to (process, isData, year, era). Overrides -i/-p/--year/--era/--isData", type=str, default='')
+    parser.add_argument("-o", "--output", dest="outputFile", help="Output file", type=str, default='')
+    parser.add_argument("--year", dest="year", help="Year considered (2022, 2023, 2024)", type=int, default=2023)
+    parser.add_argument("--era", dest="era", help="Era", type=str, default='Cv4')
+    parser.add_argument("--isData", dest="isData", help="is Data or MC", type=int, default=0)
+    parser.add_argument("-p", "--process", dest="process", help="Name of the process (gjets, zg, data)", type=str, default='')
+    parser.add_argument("--jes", dest="jes", help="JES uncertainty sources (e.g. Total) to propagate to all MC histograms, written as <histo>_<process>_JES_<source>_up/down", nargs='+', type=str, default=[])
+    parser.add_argument("--jec_compound", dest="jec_compound", help="Apply the JECs with the L1L2L3Res compound correction (one evaluation per jet, standard stacked chain)", action='store_true')
+    parser.add_argument("--jec_table", dest="jec_table", help="Interpolate the JECs from a precomputed table cached in JEC/cache (fast, for quick cut studies; a validation report is printed)", action='store_true')
+    parser.add_argument("--skim", dest="skim", help="Directory where a slim ntuple (tree Skim, derived columns only) of the events passing the baseline selection is written for each sample, as skim_<sample>.root", type=str, default='')
+    parser.add_argument("--skim_compression", dest="skim_compression", help="Compression of the skim, ALGORITHM:level (ZSTD, LZ4, ZLIB, LZMA). Default=ZSTD:5", type=str, default='ZSTD:5')
+    iotuning.add_io_arguments(parser)
+    branchaudit.add_audit_arguments(parser)
+    metrics.add_metrics_arguments(parser)
+    histstorage.add_storage_arguments(parser)
+    parser.add_argument("--nthreads", dest="nthreads", help="Number of threads for the event loop. Default=1 i.e. sequential, 0 means all available cores.", type=int, default=1)
+    args = parser.parse_args()
+
+    samples = read_samples(args)
+    known_processes = sampleregistry.processes(sampleregistry.load(args.registry))
+    for sample in samples:
+        if sample['process'] not in known_processes:
+            print("Process type {} is not defined".format(sample['process']))
+            return 1
+        if not sample['files']:
+            print("No input file for sample {}".format(sample['name']))
+            return 1
+    #The histograms of samples of the same process are summed: they must share year, era and isData (corrections, weights)
+    conditions = {}
+    for sample in samples:
+        key = (sample['year'], sample['era'], sample['isData'])
+        if conditions.setdefault(sample['process'], (sample['name'], key))[1] != key:
+            print("Samples {} and {} of process {} differ in year, era or isData ({} and {}): process them separately".format(
+                conditions[sample['process']][0], sample['name'], sample['process'], conditions[sample['process']][1], key))
+            return 1
+
+    #The branches read are found on the trees of the sequential event loop
+    if args.branch_audit != '' and args.nthreads != 1:
+        print('Branch audit: running the event loop sequentially')
+        args.nthreads = 1
+
+    #Entry ranges are processed sequentially: Range is not supported with implicit MT, and under implicit MT rdfentry_
+    #numbers the entries in processing order (not the chain entries), so a Filter on it would not select the requested range
+    if (args.first_event > 0 or args.max_events >= 0) and args.nthreads != 1:
+        print('Entry range requested (--first_event/--max_events): running the event loop sequentially')
+        args.nthreads = 1
+
+    #Implicit multithreading must be switched on before the RDataFrame is built
+    if args.nthreads != 1:
+        ROOT.EnableImplicitMT(args.nthreads)
+        print('Implicit multithreading enabled with {} threads'.format(ROOT.GetThreadPoolSize()))
+    iotuning.configure(args)
+    histstorage.configure(args)
+    #The expensive Defines are timed when they are booked
+    if args.metrics != '':
+        metrics.enable()
+        h_gammaztobb.timed_defines.update(metrics.TIMED_DEFINES)
+
+    #Output file
+    if args.outputFile == '':
+        args.outputFile = 'output_'+samples[0]['process']+'.root'
+
+    if args.skim != '':
+        os.makedirs(args.skim, exist_ok=True)
+
+    #Book all samples, then run all the event loops together
+    booked = [book_sample(sample, args) for sample in samples]
+    handles = []
+    for b in booked:
+        handles += list(b['histos'].values()) + [b['nvtx'], b['nProcessed']]
+        if hasattr(b['sumw'], 'GetValue'):
+            handles.append(b['sumw'])
+        if b['skim'] is not None:
+            handles.append(b['skim'])
+    monitor = iotuning.start_monitor()
+    ROOT.RDF.RunGraphs(handles)
+    io_stats = iotuning.stop_monitor(monitor, sum(b['staging_time'] for b in booked))
+    iotuning.print_stats(io_stats)
+    if args.io_report != '':
+        iotuning.write_stats(io_stats, args.io_report)
+    if args.metrics != '':
+        run_metrics = metrics.collect(booked, io_stats, metrics.TIMED_DEFINES)
+        metrics.print_metrics(run_metrics)
+        metrics.write(run_metrics, args.metrics)
+    #Branches read by the event loop in the last file of each input chain (see helpers/branchaudit.py), compared to the expected ones
+    heavy_branches = []
+    if args.branch_audit != '':
+        expected = branchaudit.load_expected(args.expected_branches)
+        reports = {}
+        for b in booked:
+            reports[b['sample']['name']] = branchaudit.branch_report(b['chain'])
+            branchaudit.print_report(b['sample']['name'], reports[b['sample']['name']])
+            heavy_branches += branchaudit.check(reports[b['sample']['name']], expected, args.heavy_branch_bytes)
+        branchaudit.write_reports(reports, args.branch_audit)
+    for b in booked:
+        iotuning.unstage(b['staged'])
+    for b in booked:
+        b['varied'] = {variation: h_gammaztobb.SplitFlavourHistos(histos) for variation, histos in h_gammaztobb.VariedHistos(b['variations']).items()}
+        b['histos'] = h_gammaztobb.SplitFlavourHistos(b['histos'])
+
+    for b in booked:
+        print('*** Sample {} ({} events processed) ***'.format(b['sample']['name'], b['nProcessed'].GetValue()))
+        b['report'].Print()
+        if b['sample']['isData']:
+            continue
+        BR_Obs, n, total, ndof, chi2, difference, pvalue = h_gammaztobb.FlavourFractions(b['histos'], b['sample']['isData'])
+
+        #peaks = np.means(peaks)
+        BR_Theo = np.array([0.115, 0.156, 0.156, 0.115, 0.151])
+        BR = BR_Theo * 1/np.sum(BR_Theo)
+        sigma_BR = np.sqrt(BR_Obs*(1-BR_Obs)/total)
+        sigma_total_BR = np.sum(sigma_BR)
+        sigma_chi2 = np.sqrt(np.sum((2*(BR_Obs-BR))/(BR)*sigma_BR))
+        print(f"Number of observation for each flavour : {n}")
+        print(f"Summation over all observations gives {total}")
+        print(f"The observed branching ratios are {BR_Obs}, with uncertainty {sigma_BR}.")
+        print(f"This sums to {np.sum(BR_Obs)}, with a total uncertainty {sigma_total_BR}.")
+        print(f"As a reminder, the theoretical BR-values are {BR}")
+        print(f"The difference between the theoretical and the observed values is {difference}.")
+        print(f"A chi2-test on these two sets gives {chi2}, with an uncertainty {sigma_chi2}")
+        print(f"The p-value is {pvalue}")
+        #print(f"The peak is {peaks} while the properties are {properties}")
+
+    #Histograms of samples sharing the same process are summed (as hadd would do), the normalisation histograms
+    #(h_nvtx, h_genEventSumw) included: each process keeps its own sum of weights
+    out = ROOT.TFile(args.outputFile, "recreate")
+    merged = {}
+    for b in booked:
+        suffix = "_"+b['sample']['process']
+        results = [(i, suffix) for i in b['histos'].values()] + [(b['nvtx'].GetValue(), suffix)]
+        if b['sumw'] is not None:
+            results.append((sumw_histogram(b['sumw']), suffix))
+        for variation, histos in b['varied'].items():
+            results += [(i, suffix+'_'+variation.replace(':', '_')) for i in histos.values()]
+        for theh, s in results:
+            name = theh.GetName()+s
+            if name in merged:
+                merged[name].Add(theh)
+            else:
+                theh.SetName(name)
+                merged[name] = theh
+    out.cd()
+    for theh in merged.values():
         theh.Write()
-    df_report.Print()
-    nvtx_histo.GetValue().Write()
-    
-    #peaks = np.means(peaks)
-    BR_Theo = np.array([0.115, 0.156, 0.156, 0.115, 0.151])
-    BR = BR_Theo * 1/np.sum(BR_Theo)
-    sigma_BR = np.sqrt(BR_Obs*(1-BR_Obs)/total)
-    sigma_total_BR = np.sum(sigma_BR)
-    sigma_chi2 = np.sqrt(np.sum((2*(BR_Obs-BR))/(BR)*sigma_BR))
-    print(f"Number of observation for each flavour : {n}")
-    print(f"Summation over all observations gives {total}")
-    print(f"The observed branching ratios are {BR_Obs}, with uncertainty {sigma_BR}.")
-    print(f"This sums to {np.sum(BR_Obs)}, with a total uncertainty {sigma_total_BR}.")
-    print(f"As a reminder, the theoretical BR-values are {BR}")
-    print(f"The difference between the theoretical and the observed values is {difference}.")
-    print(f"A chi2-test on these two sets gives {chi2}, with an uncertainty {sigma_chi2}")
-    print(f"The p-value is {pvalue}")
-    #print(f"The peak is {peaks} while the properties are {properties}")
-
-    #return n, total, chi2, p 
+
+    out.Close()
+
+    if heavy_branches:
+        print('Branch audit failed: {} unexpected heavy branches read ({})'.format(len(heavy_branches), ', '.join(b['name'] for b in heavy_branches)))
+        return branchaudit.AUDIT_EXIT_CODE
+    return 0
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
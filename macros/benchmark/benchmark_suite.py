@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+#Run from the macros folder: python3 benchmark/benchmark_suite.py -o benchmark.json
+sys.path.insert(0, 'benchmark')
+from generate_nanoaod import generate
+
+'''
+Benchmark suite on synthetic NanoAOD inputs (see generate_nanoaod.py), to track the performance across versions:
+- analysis:   analysis.py on signal-like (zg) inputs, for each number of threads: events/s, event loop and jitting time,
+              startup time (process time outside the event loop and jitting: imports, kernels, booking) and peak RSS
+- jec:        the JetCorPt microbenchmark (jec_benchmark.py)
+- merge:      hadd_scale_merge.py on copies of the analysis output, sequential (-j 1) and with one process per core
+- plots:      the plotting macros, run on the analysis outputs (Source.root: zg, Background.root: gjets) in a copy
+              of their folders
+Each step is run in its own process: wall time and peak RSS are those of that process.
+The results are written to a json file, with the commit of the code; --compare prints the changes with respect to a previous file.
+'''
+
+SIGNAL_SAMPLE = 'ZGto2QG-1Jets_PTG-100to200_TuneCP5_13p6TeV_amcatnloFXFX-pythia8'
+PLOT_MACROS = ['Deltas/Deltas.py', 'Deltas/ROC/roc.py', 'Deltas/Significance/significance.py', 'Deltas/Likelihood/Likelihood.py',
+               'Mjj/mjj.py', 'btagging/btag.py']
+
+def run(command, cwd='.'):
+    '''
+    Run command, returning its exit code, wall time in s and peak RSS in MB.
+    '''
+    start = time.time()
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = process.stderr.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.time() - start
+    if process.returncode != 0:
+        print('Failed: {}\n{}'.format(' '.join(command), stderr.decode(errors='replace')[-2000:]))
+    return {'exit_code': process.returncode, 'wall_time': wall, 'peak_rss_MB': usage.ru_maxrss/1024.}
+
+def code_version():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD']) != 0
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def benchmark_analysis(files, process, output, threads, workdir):
+    metrics_file = os.path.join(workdir, 'metrics.json')
+    result = run([sys.executable, 'analysis.py', '-i'] + files + ['-p', process, '--year', '2023', '--era', 'C', '--isData', '0',
+                  '-o', output, '--nthreads', str(threads), '--metrics', metrics_file])
+    if result['exit_code'] == 0:
+        with open(metrics_file) as f:
+            metrics = json.load(f)
+        result.update({key: metrics[key] for key in ['events', 'events_per_second', 'jit_time', 'event_loop_wall_time', 'event_loop_cpu_time', 'bytes_read', 'defines']})
+        result['startup_time'] = result['wall_time'] - metrics['event_loop_wall_time'] - metrics['jit_time']
+    return result
+
+def benchmark_plots(source, background, workdir):
+    '''
+    Run the plotting macros in a copy of their folders (the plots of the repository are not overwritten).
+    '''
+    macros = os.path.join(workdir, 'macros')
+    for macro in PLOT_MACROS:
+        folder = os.path.join(macros, os.path.dirname(macro))
+        os.makedirs(folder, exist_ok=True)
+        for script in glob.glob(os.path.join(os.path.dirname(macro), '*.py')):
+            shutil.copy(script, folder)
+    if not os.path.exists(os.path.join(workdir, 'helpers')):
+        os.symlink(os.path.abspath('../helpers'), os.path.join(workdir, 'helpers'))
+    shutil.copy(source, os.path.join(macros, 'Source.root'))
+    shutil.copy(background, os.path.join(macros, 'Background.root'))
+    return {macro: run([sys.executable, os.path.basename(macro)], cwd=os.path.join(macros, os.path.dirname(macro))) for macro in PLOT_MACROS}
+
+def compare(results, reference):
+    '''
+    Print the relative changes of the timing, throughput and memory with respect to reference (same structure).
+    '''
+    print('Changes with respect to {} ({}):'.format(reference.get('version'), reference.get('date')))
+    def walk(new, old, path):
+        for key, value in new.items():
+            if key not in old:
+                continue
+            if isinstance(value, dict):
+                walk(value, old[key], path+[key])
+            elif key in ['wall_time', 'events_per_second', 'startup_time', 'jit_time', 'peak_rss_MB', 'us_per_event'] and old[key]:
+                print('{:<60}{:>14.4g}{:>14.4g}{:>+10.1%}'.format('/'.join(path+[key]), old[key], value, value/old[key]-1))
+    walk(results['results'], reference['results'], [])
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''Benchmark suite of the analysis on synthetic NanoAOD inputs''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-n", "--events", dest="events", help="Number of events per input file. Default=200000", type=int, default=200000)
+    parser.add_argument("-f", "--files", dest="files", help="Number of input files per sample. Default=2", type=int, default=2)
+    parser.add_argument("-t", "--threads", dest="threads", help="Numbers of threads of the analysis benchmarks. Default=1 4", nargs='+', type=int, default=[1, 4])
+    parser.add_argument("--jec_events", dest="jec_events", help="Number of events of the JetCorPt microbenchmark. Default=100000", type=int, default=100000)
+    parser.add_argument("--merge_copies", dest="merge_copies", help="Number of copies of the analysis output merged. Default=20", type=int, default=20)
+    parser.add_argument("--skip", dest="skip", help="Benchmarks to skip", nargs='+', choices=['analysis', 'jec', 'merge', 'plots'], default=[])
+    parser.add_argument("-w", "--workdir", dest="workdir", help="Directory for the inputs and outputs, kept (inputs reused if present). Default: temporary directory", type=str, default='')
+    parser.add_argument("-o", "--output", dest="output", help="Json file with the results. Default=benchmark.json", type=str, default='benchmark.json')
+    parser.add_argument("--compare", dest="compare", help="Previous results file to compare to", type=str, default='')
+    args = parser.parse_args()
+
+    workdir = args.workdir if args.workdir != '' else tempfile.mkdtemp(prefix='benchmark_')
+    os.makedirs(workdir, exist_ok=True)
+    results = {'version': code_version(), 'date': datetime.now().isoformat(timespec='seconds'), 'host': socket.gethostname(), 'cpus': os.cpu_count(),
+               'config': {'events_per_file': args.events, 'files': args.files, 'threads': args.threads}, 'results': {}}
+
+    #Inputs, generated once for a given workdir and size
+    inputs = {}
+    start = time.time()
+    for process, seed in [('zg', 1), ('gjets', 1000)]:
+        folder = os.path.join(workdir, 'inputs_{}_{}x{}'.format(process, args.files, args.events))
+        inputs[process] = sorted(glob.glob(os.path.join(folder, '*.root')))
+        if len(inputs[process]) != args.files:
+            inputs[process] = generate(folder, args.events, args.files, seed=seed)
+    print('Inputs ready in {:.0f} s'.format(time.time()-start))
+
+    outputs = {process: os.path.join(workdir, 'output_{}.root'.format(process)) for process in inputs}
+    if 'analysis' not in args.skip:
+        results['results']['analysis'] = {}
+        for threads in args.threads:
+            results['results']['analysis']['{} threads'.format(threads)] = benchmark_analysis(inputs['zg'], 'zg', outputs['zg'], threads, workdir)
+            print('analysis ({} threads): {}'.format(threads, results['results']['analysis']['{} threads'.format(threads)].get('events_per_second')))
+    if ('merge' not in args.skip or 'plots' not in args.skip) and not all(os.path.exists(o) for o in outputs.values()):
+        for process in inputs:
+            benchmark_analysis(inputs[process], process, outputs[process], args.threads[-1], workdir)
+
+    if 'jec' not in args.skip:
+        jec_file = os.path.join(workdir, 'jec.json')
+        results['results']['jec'] = run([sys.executable, 'benchmark/jec_benchmark.py', '-n', str(args.jec_events), '--json', jec_file])
+        if results['results']['jec']['exit_code'] == 0:
+            with open(jec_file) as f:
+                results['results']['jec']['implementations'] = json.load(f)
+
+    if 'merge' not in args.skip:
+        folder = os.path.join(workdir, SIGNAL_SAMPLE)
+        os.makedirs(folder, exist_ok=True)
+        for k in range(args.merge_copies):
+            shutil.copy(outputs['zg'], os.path.join(folder, 'output_{}.root'.format(k)))
+        results['results']['merge'] = {}
+        for mode, workers in [('sequential', 1), ('parallel', 0)]:
+            results['results']['merge'][mode] = run([sys.executable, 'hadd_scale_merge.py', '-d', folder, '-l', '1000', '-o', os.path.join(workdir, 'merged.root'), '-j', str(workers)])
+            results['results']['merge'][mode]['files'] = args.merge_copies
+            print('merge ({}): {:.1f} s'.format(mode, results['results']['merge'][mode]['wall_time']))
+
+    if 'plots' not in args.skip:
+        results['results']['plots'] = benchmark_plots(outputs['zg'], outputs['gjets'], workdir)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Results written to {} (work directory {})'.format(args.output, workdir))
+    if args.compare != '':
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import ROOT
+import os
+import sys
+import argparse
+
+#Run from the macros folder: python3 benchmark/generate_nanoaod.py -o synthetic -n 100000
+
+'''
+Synthetic NanoAOD-like inputs for tests and benchmarks, without access to /pnfs.
+The Events tree has exactly the branches read by analysis.py (branches_expected.txt), with the NanoAOD types and
+layout (n<Object> counters, <Object>_<variable>[n<Object>] arrays), and the Runs tree the genEventSumw of the file (MC).
+The kinematics are rough (falling spectra, a fraction of events with a high pT photon and two central jets) so that
+every step of the selection is exercised; they are not meant to describe the physics.
+'''
+
+GENERATOR_CODE = r'''
+#include "TFile.h"
+#include "TTree.h"
+#include "TRandom3.h"
+#include "TMath.h"
+#include "Compression.h"
+#include <algorithm>
+#include <string>
+
+namespace SyntheticNanoAOD {
+
+const int kMax = 64;
+
+struct Objects {
+  Int_t n = 0;
+  Float_t pt[kMax], eta[kMax], phi[kMax], mass[kMax], area[kMax], rawFactor[kMax], muEF[kMax], chEmEF[kMax], neEmEF[kMax];
+  Float_t btagPNetB[kMax], btagDeepFlavB[kMax];
+  Bool_t id1[kMax], id2[kMax], id3[kMax], id4[kMax];
+  UChar_t uid[kMax];
+  Short_t flavour[kMax];
+};
+
+// Falling pT spectrum above ptmin, sorted in decreasing pT
+void FillPt(TRandom3 &rnd, Objects &o, float ptmin, float slope){
+  for (int i=0; i<o.n; i++) o.pt[i] = ptmin + rnd.Exp(slope);
+  std::sort(o.pt, o.pt+o.n, std::greater<Float_t>());
+}
+
+// Writes nEvents events to filename. Returns the sum of the generator weights (0 for data).
+double Generate(const std::string &filename, Long64_t nEvents, int seed, bool isData, const std::string &compression){
+  TRandom3 rnd(seed);
+  TFile f(filename.c_str(), "RECREATE");
+  f.SetCompressionSettings(ROOT::CompressionSettings(
+      compression.rfind("LZMA", 0) == 0 ? ROOT::RCompressionSetting::EAlgorithm::kLZMA :
+      compression.rfind("LZ4", 0) == 0 ? ROOT::RCompressionSetting::EAlgorithm::kLZ4 :
+      compression.rfind("ZLIB", 0) == 0 ? ROOT::RCompressionSetting::EAlgorithm::kZLIB : ROOT::RCompressionSetting::EAlgorithm::kZSTD,
+      std::stoi(compression.substr(compression.find(':')+1))));
+  TTree events("Events", "Events");
+
+  UInt_t run = isData ? 380000 : 1;
+  Int_t npvs;
+  Float_t weight, rho;
+  Bool_t flags[6], hlt50, hlt45, hlt30;
+  Objects photon, electron, muon, jet;
+  const char *flagNames[6] = {"Flag_HBHENoiseFilter", "Flag_HBHENoiseIsoFilter", "Flag_goodVertices",
+                              "Flag_EcalDeadCellTriggerPrimitiveFilter", "Flag_BadPFMuonFilter", "Flag_BadPFMuonDzFilter"};
+
+  events.Branch("run", &run, "run/i");
+  events.Branch("PV_npvs", &npvs, "PV_npvs/I");
+  if (!isData) events.Branch("LHEWeight_originalXWGTUP", &weight, "LHEWeight_originalXWGTUP/F");
+  if (!isData) events.Branch("genWeight", &weight, "genWeight/F");
+  for (int i=0; i<6; i++) events.Branch(flagNames[i], &flags[i], (std::string(flagNames[i])+"/O").c_str());
+  events.Branch("HLT_Photon30EB_TightID_TightIso", &hlt30, "HLT_Photon30EB_TightID_TightIso/O");
+  events.Branch("HLT_Photon45EB_TightID_TightIso", &hlt45, "HLT_Photon45EB_TightID_TightIso/O");
+  events.Branch("HLT_Photon50EB_TightID_TightIso", &hlt50, "HLT_Photon50EB_TightID_TightIso/O");
+  events.Branch("Rho_fixedGridRhoFastjetAll", &rho, "Rho_fixedGridRhoFastjetAll/F");
+
+  events.Branch("nPhoton", &photon.n, "nPhoton/I");
+  events.Branch("Photon_pt", photon.pt, "Photon_pt[nPhoton]/F");
+  events.Branch("Photon_eta", photon.eta, "Photon_eta[nPhoton]/F");
+  events.Branch("Photon_phi", photon.phi, "Photon_phi[nPhoton]/F");
+  events.Branch("Photon_mvaID_WP80", photon.id1, "Photon_mvaID_WP80[nPhoton]/O");
+  events.Branch("Photon_mvaID_WP90", photon.id2, "Photon_mvaID_WP90[nPhoton]/O");
+  events.Branch("Photon_electronVeto", photon.id3, "Photon_electronVeto[nPhoton]/O");
+  events.Branch("Photon_pixelSeed", photon.id4, "Photon_pixelSeed[nPhoton]/O");
+
+  events.Branch("nElectron", &electron.n, "nElectron/I");
+  events.Branch("Electron_pt", electron.pt, "Electron_pt[nElectron]/F");
+  events.Branch("Electron_mvaIso_WP90", electron.id1, "Electron_mvaIso_WP90[nElectron]/O");
+  events.Branch("Electron_mvaIso_WPHZZ", electron.id2, "Electron_mvaIso_WPHZZ[nElectron]/O");
+
+  events.Branch("nMuon", &muon.n, "nMuon/I");
+  events.Branch("Muon_pt", muon.pt, "Muon_pt[nMuon]/F");
+  events.Branch("Muon_pfIsoId", muon.uid, "Muon_pfIsoId[nMuon]/b");
+  events.Branch("Muon_mediumPromptId", muon.id1, "Muon_mediumPromptId[nMuon]/O");
+
+  events.Branch("nJet", &jet.n, "nJet/I");
+  events.Branch("Jet_pt", jet.pt, "Jet_pt[nJet]/F");
+  events.Branch("Jet_eta", jet.eta, "Jet_eta[nJet]/F");
+  events.Branch("Jet_phi", jet.phi, "Jet_phi[nJet]/F");
+  events.Branch("Jet_mass", jet.mass, "Jet_mass[nJet]/F");
+  events.Branch("Jet_area", jet.area, "Jet_area[nJet]/F");
+  events.Branch("Jet_rawFactor", jet.rawFactor, "Jet_rawFactor[nJet]/F");
+  events.Branch("Jet_jetId", jet.uid, "Jet_jetId[nJet]/b");
+  events.Branch("Jet_muEF", jet.muEF, "Jet_muEF[nJet]/F");
+  events.Branch("Jet_chEmEF", jet.chEmEF, "Jet_chEmEF[nJet]/F");
+  events.Branch("Jet_neEmEF", jet.neEmEF, "Jet_neEmEF[nJet]/F");
+  events.Branch("Jet_btagPNetB", jet.btagPNetB, "Jet_btagPNetB[nJet]/F");
+  events.Branch("Jet_btagDeepFlavB", jet.btagDeepFlavB, "Jet_btagDeepFlavB[nJet]/F");
+  if (!isData) events.Branch("Jet_partonFlavour", jet.flavour, "Jet_partonFlavour[nJet]/S");
+
+  const Short_t flavours[7] = {0, 1, 2, 3, 4, 5, 21};
+  const double flavourWeights[7] = {0.1, 0.15, 0.15, 0.1, 0.1, 0.1, 0.3};
+  double sumw = 0;
+  for (Long64_t ev=0; ev<nEvents; ev++){
+    npvs = rnd.Poisson(30);
+    weight = isData ? 1. : rnd.Gaus(1., 0.1);
+    sumw += weight;
+    rho = rnd.Uniform(10, 40);
+    for (int i=0; i<6; i++) flags[i] = rnd.Uniform() < 0.995;
+    hlt50 = rnd.Uniform() < 0.6;
+    hlt45 = hlt50 || rnd.Uniform() < 0.1;
+    hlt30 = hlt45 || rnd.Uniform() < 0.2;
+
+    // Half of the events have a high pT photon
+    photon.n = std::min(kMax, 1 + (int)rnd.Poisson(0.3));
+    FillPt(rnd, photon, 20, 30);
+    if (rnd.Uniform() < 0.5) photon.pt[0] += 80 + rnd.Exp(50);
+    for (int i=0; i<photon.n; i++){
+      photon.eta[i] = rnd.Uniform() < 0.8 ? rnd.Uniform(-1.44, 1.44) : rnd.Uniform(-2.5, 2.5);
+      photon.phi[i] = rnd.Uniform(-TMath::Pi(), TMath::Pi());
+      photon.id1[i] = rnd.Uniform() < 0.8;
+      photon.id2[i] = photon.id1[i] || rnd.Uniform() < 0.5;
+      photon.id3[i] = rnd.Uniform() < 0.95;
+      photon.id4[i] = rnd.Uniform() < 0.05;
+    }
+
+    electron.n = std::min(kMax, (int)rnd.Poisson(0.3));
+    FillPt(rnd, electron, 5, 15);
+    for (int i=0; i<electron.n; i++){
+      electron.id1[i] = rnd.Uniform() < 0.4;
+      electron.id2[i] = electron.id1[i] && rnd.Uniform() < 0.8;
+    }
+
+    muon.n = std::min(kMax, (int)rnd.Poisson(0.3));
+    FillPt(rnd, muon, 3, 10);
+    for (int i=0; i<muon.n; i++){
+      muon.uid[i] = rnd.Integer(7);
+      muon.id1[i] = rnd.Uniform() < 0.4;
+    }
+
+    // A third of the events have two hard central jets
+    jet.n = std::min(kMax, 2 + (int)rnd.Poisson(3));
+    FillPt(rnd, jet, 15, 15);
+    bool dijet = rnd.Uniform() < 0.33;
+    for (int i=0; i<jet.n; i++){
+      if (dijet && i < 2) jet.pt[i] += 25 + rnd.Exp(40);
+      jet.eta[i] = (dijet && i < 2) ? rnd.Uniform(-2.4, 2.4) : rnd.Uniform(-4.7, 4.7);
+      jet.phi[i] = rnd.Uniform(-TMath::Pi(), TMath::Pi());
+      jet.mass[i] = 2 + rnd.Exp(8);
+      jet.area[i] = rnd.Gaus(0.5, 0.03);
+      jet.rawFactor[i] = rnd.Uniform(0., 0.3);
+      jet.uid[i] = rnd.Uniform() < 0.9 ? 6 : 2;
+      jet.muEF[i] = rnd.Uniform(0., 0.1);
+      jet.chEmEF[i] = rnd.Uniform(0., 0.2);
+      jet.neEmEF[i] = rnd.Uniform(0., 0.5);
+      double r = rnd.Uniform(), cumulative = 0;
+      int k = 0;
+      while (k < 6 && (cumulative += flavourWeights[k]) < r) k++;
+      jet.flavour[i] = (flavours[k] == 21 || rnd.Uniform() < 0.5) ? flavours[k] : -flavours[k];
+      jet.btagPNetB[i] = flavours[k] == 5 ? 1 - rnd.Exp(0.1) : rnd.Exp(0.05);
+      jet.btagPNetB[i] = std::min(1.f, std::max(0.f, jet.btagPNetB[i]));
+      jet.btagDeepFlavB[i] = jet.btagPNetB[i];
+    }
+    events.Fill();
+  }
+  events.Write();
+
+  TTree runs("Runs", "Runs");
+  Long64_t genEventCount = nEvents;
+  runs.Branch("run", &run, "run/i");
+  if (!isData){
+    runs.Branch("genEventCount", &genEventCount, "genEventCount/L");
+    runs.Branch("genEventSumw", &sumw, "genEventSumw/D");
+  }
+  runs.Fill();
+  runs.Write();
+  f.Close();
+  return isData ? 0. : sumw;
+}
+
+}
+'''
+
+def generate(outdir, nevents, nfiles=1, isData=False, seed=1, compression='LZMA:9', prefix='synthetic'):
+    '''
+    Write nfiles files of nevents events each in outdir. Returns the list of files.
+    '''
+    if not hasattr(ROOT, 'SyntheticNanoAOD'):
+        ROOT.gInterpreter.Declare(GENERATOR_CODE)
+    os.makedirs(outdir, exist_ok=True)
+    files = []
+    for k in range(nfiles):
+        filename = os.path.join(outdir, '{}_{}.root'.format(prefix, k))
+        ROOT.SyntheticNanoAOD.Generate(filename, nevents, seed+k, bool(isData), compression)
+        files.append(filename)
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''Synthetic NanoAOD-like files with the branches read by analysis.py''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-o", "--outdir", dest="outdir", help="Output directory", type=str, default='synthetic')
+    parser.add_argument("-n", "--events", dest="events", help="Number of events per file. Default=100000", type=int, default=100000)
+    parser.add_argument("-f", "--files", dest="files", help="Number of files. Default=1", type=int, default=1)
+    parser.add_argument("--isData", dest="isData", help="Data-like files (no generator weights nor parton flavour)", type=int, default=0)
+    parser.add_argument("--seed", dest="seed", help="Random seed of the first file (incremented for the next ones). Default=1", type=int, default=1)
+    parser.add_argument("--compression", dest="compression", help="Compression, ALGORITHM:level (LZMA, ZSTD, LZ4, ZLIB). Default=LZMA:9 as NanoAOD", type=str, default='LZMA:9')
+    args = parser.parse_args()
+
+    files = generate(args.outdir, args.events, args.files, args.isData, args.seed, args.compression)
+    print('{} files of {} events written to {}'.format(len(files), args.events, args.outdir))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+#Run from the macros folder: python3 benchmark/io_benchmark.py FILE.root
+sys.path.insert(0, '../helpers')
+from inputs import expand_inputs
+
+'''
+Benchmark of the I/O settings of analysis.py (see helpers/iotuning.py) on a slow remote storage stand-in:
+the local input files are served over http (read through ROOT's TWebFile) by a server adding a fixed latency
+to every request and limiting the bandwidth, as a dCache door would. analysis.py is run once per configuration
+and the I/O statistics of its event loop (--io_report) are compared.
+'''
+
+CONFIGURATIONS = {
+    'default': [],
+    'cache 100MB': ['--cache_size', '100'],
+    'cache 100MB + prefetch': ['--cache_size', '100', '--prefetch'],
+    'staged': ['--stage', 'STAGEDIR'],
+}
+
+class SlowHandler(BaseHTTPRequestHandler):
+    '''
+    Serves the files server.files ({url path: local path}) with single and multiple byte ranges,
+    each request delayed by server.latency seconds and sent at server.bandwidth bytes/s.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _ranges(self, size):
+        match = re.match(r'bytes=(.*)', self.headers.get('Range', ''))
+        if not match:
+            return None
+        ranges = []
+        for part in match.group(1).split(','):
+            first, last = part.strip().split('-')
+            ranges.append((int(first), min(int(last), size-1) if last else size-1))
+        return ranges
+
+    def _send(self, data):
+        time.sleep(len(data)/self.server.bandwidth)
+        self.wfile.write(data)
+
+    def _serve(self, body):
+        path = self.server.files.get(self.path.split('?')[0])
+        if path is None:
+            self.send_error(404)
+            return
+        time.sleep(self.server.latency)
+        size = os.path.getsize(path)
+        ranges = self._ranges(size)
+        if ranges is None:
+            self.send_response(200)
+            self.send_header('Content-Length', str(size))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+            if body:
+                with open(path, 'rb') as f:
+                    self._send(f.read())
+            return
+        with open(path, 'rb') as f:
+            chunks = []
+            for first, last in ranges:
+                f.seek(first)
+                chunks.append((first, last, f.read(last-first+1)))
+        if len(chunks) == 1:
+            first, last, data = chunks[0]
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(first, last, size))
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            if body:
+                self._send(data)
+            return
+        boundary = 'BENCHMARKBOUNDARY'
+        payload = b''
+        for first, last, data in chunks:
+            payload += '--{}\r\nContent-Type: application/octet-stream\r\nContent-Range: bytes {}-{}/{}\r\n\r\n'.format(boundary, first, last, size).encode()
+            payload += data + b'\r\n'
+        payload += '--{}--\r\n'.format(boundary).encode()
+        self.send_response(206)
+        self.send_header('Content-Type', 'multipart/byteranges; boundary={}'.format(boundary))
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if body:
+            self._send(payload)
+
+    def do_HEAD(self):
+        self._serve(False)
+
+    def do_GET(self):
+        self._serve(True)
+
+def start_server(files, latency, bandwidth):
+    '''
+    Serve files in a background thread. Returns the server and the urls of the files.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    server.files = {'/{}/{}'.format(n, os.path.basename(f)): os.path.abspath(f) for n, f in enumerate(files)}
+    server.latency, server.bandwidth = latency, bandwidth
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ['http://127.0.0.1:{}{}'.format(server.server_address[1], path) for path in server.files]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''I/O benchmark of analysis.py on a slow http stand-in for remote storage''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("inputs", help="Local NanoAOD files (files, glob patterns or .txt file lists)", nargs='+', type=str)
+    parser.add_argument("--latency", dest="latency", help="Latency per request in ms. Default=20", type=float, default=20.)
+    parser.add_argument("--bandwidth", dest="bandwidth", help="Bandwidth in MB/s. Default=50", type=float, default=50.)
+    parser.add_argument("--max_events", dest="max_events", help="Maximum number of events to analyze. Default=-1 i.e. all", type=int, default=-1)
+    parser.add_argument("--analysis_options", dest="analysis_options", help="Other options of analysis.py (quoted). Default='-p zg --year 2023 --era C --isData 0'", type=str, default='-p zg --year 2023 --era C --isData 0')
+    parser.add_argument("-o", "--output", dest="output", help="Json file with the statistics of all configurations", type=str, default='io_benchmark.json')
+    args = parser.parse_args()
+
+    files = expand_inputs(args.inputs)
+    server, urls = start_server(files, args.latency/1000., args.bandwidth*1e6)
+    print('Serving {} files with {} ms latency and {} MB/s'.format(len(files), args.latency, args.bandwidth))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, options in CONFIGURATIONS.items():
+            report = os.path.join(tmp, 'io.json')
+            command = [sys.executable, 'analysis.py', '-i'] + urls + ['-o', os.path.join(tmp, 'output.root'), '--max_events', str(args.max_events),
+                       '--io_report', report] + [tmp if o == 'STAGEDIR' else o for o in options] + args.analysis_options.split()
+            if subprocess.call(command, stdout=subprocess.DEVNULL) != 0:
+                print('{}: analysis.py failed'.format(name))
+                continue
+            with open(report) as f:
+                results[name] = json.load(f)
+    server.shutdown()
+
+    print('{:<25}{:>12}{:>12}{:>12}{:>12}{:>12}{:>10}'.format('configuration', 'MB read', 'read calls', 'wall (s)', 'waiting (s)', 'staging (s)', 'cpu eff'))
+    for name, r in results.items():
+        print('{:<25}{:>12.1f}{:>12}{:>12.1f}{:>12.1f}{:>12.1f}{:>10.0%}'.format(name, r['bytes_read']/1e6, r['read_calls'], r['wall_time'],
+                                                                              r['io_wait_time'], r['staging_time'], r['cpu_efficiency']))
+    with open(args.output, 'w') as f:
+        json.dump({'latency_ms': args.latency, 'bandwidth_MBps': args.bandwidth, 'results': results}, f, indent=1)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
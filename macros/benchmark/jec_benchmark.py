@@ -0,0 +1,129 @@
+import ROOT
+import sys
+import json
+import argparse
+
+#Run from the macros folder: python3 benchmark/jec_benchmark.py
+sys.path.insert(0, '../helpers')
+sys.path.insert(0, '.')
+import kernels
+from corrections_modified import JECsInit, setupjecs
+
+'''
+Microbenchmark of the JetCorPt implementations on randomly generated jets:
+- legacy:   JetCorPt as it was declared through gInterpreter (unreserved push_back, four evaluate calls per jet
+            with a fresh argument vector each time, all jets corrected)
+- batched:  JetCorrector (helpers/JetCorrections.h), argument vectors reused, jets failing the jet ID skipped
+- compound: same with the L1L2L3Res compound correction (one evaluate call per jet)
+'''
+
+BENCHMARK_CODE = r'''
+#include "TRandom3.h"
+#include <chrono>
+
+// Reference implementation (JetCorPt before the batched JetCorrector)
+RVec<float> JetCorPtLegacy(const correction::Correction::Ref &l1, const correction::Correction::Ref &l2,
+                           const correction::Correction::Ref &l3, const correction::Correction::Ref &residual,
+                           const RVec<float> &area, const RVec<float> &eta, const RVec<float> &pt, const float &rho, const bool &isData){
+  RVec<float> Jet_corPt;
+  for(unsigned int i=0; i<pt.size(); i++){
+    float sf = l1->evaluate({area[i], eta[i], pt[i], rho});
+    if(!isData) sf *= l2->evaluate({eta[i], pt[i]});
+    sf *= l3->evaluate({eta[i], pt[i]});
+    sf *= residual->evaluate({eta[i], pt[i]});
+    Jet_corPt.push_back(sf*pt[i]);
+  }
+  return Jet_corPt;
+}
+
+struct BenchmarkJets {
+  std::vector<RVec<float>> area, eta, phi, pt, rawf;
+  std::vector<RVec<int>> needed;
+  std::vector<float> rho;
+};
+
+// NanoAOD-like jets: ~8 jets per event, 80% of them passing the jet ID
+BenchmarkJets GenerateBenchmarkJets(int nEvents, int seed){
+  TRandom3 rnd(seed);
+  BenchmarkJets jets;
+  for(int ev=0; ev<nEvents; ev++){
+    int n = rnd.Poisson(8);
+    RVec<float> area(n), eta(n), phi(n), pt(n), rawf(n);
+    RVec<int> needed(n);
+    for(int i=0; i<n; i++){
+      area[i] = rnd.Gaus(0.5, 0.05);
+      eta[i] = rnd.Uniform(-4.7, 4.7);
+      phi[i] = rnd.Uniform(-3.14159, 3.14159);
+      pt[i] = 15 + rnd.Exp(40);
+      rawf[i] = rnd.Uniform(0., 0.3);
+      needed[i] = rnd.Uniform() < 0.8;
+    }
+    jets.area.push_back(area); jets.eta.push_back(eta); jets.phi.push_back(phi);
+    jets.pt.push_back(pt); jets.rawf.push_back(rawf); jets.needed.push_back(needed);
+    jets.rho.push_back(rnd.Uniform(10, 40));
+  }
+  return jets;
+}
+
+// Average time per event in microseconds, and sum of the corrected pT (to check the results and keep the work)
+template <typename F>
+std::pair<double, double> TimePerEvent(const BenchmarkJets &jets, F &&correct){
+  double sum = 0;
+  auto start = std::chrono::steady_clock::now();
+  for(size_t ev=0; ev<jets.pt.size(); ev++) sum += Sum(correct(ev));
+  std::chrono::duration<double, std::micro> elapsed = std::chrono::steady_clock::now() - start;
+  return {elapsed.count()/jets.pt.size(), sum};
+}
+
+std::pair<double, double> TimeLegacy(const BenchmarkJets &j, const JetCorrector &jec, const std::string &corrfile, bool isData){
+  auto l1 = jec.at(corrfile+"L1FastJet_AK4PFPuppi"), l2 = jec.at(corrfile+"L2Relative_AK4PFPuppi");
+  auto l3 = jec.at(corrfile+"L3Absolute_AK4PFPuppi"), res = jec.at(corrfile+"L2L3Residual_AK4PFPuppi");
+  return TimePerEvent(j, [&](size_t ev){ return JetCorPtLegacy(l1, l2, l3, res, j.area[ev], j.eta[ev], j.pt[ev], j.rho[ev], isData); });
+}
+
+std::pair<double, double> TimeBatched(const BenchmarkJets &j, const JetCorrector &jec, bool isData, bool skip){
+  return TimePerEvent(j, [&](size_t ev){
+    return skip ? jec(j.area[ev], j.eta[ev], j.phi[ev], j.pt[ev], j.rawf[ev], j.rho[ev], isData, j.needed[ev])
+                : jec(j.area[ev], j.eta[ev], j.phi[ev], j.pt[ev], j.rawf[ev], j.rho[ev], isData); });
+}
+'''
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''JetCorPt microbenchmark''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("-n", "--events", dest="events", help="Number of generated events", type=int, default=100000)
+    parser.add_argument("--year", dest="year", help="Year considered (2022, 2023, 2024)", type=int, default=2023)
+    parser.add_argument("--era", dest="era", help="Era", type=str, default='C')
+    parser.add_argument("--isData", dest="isData", help="is Data or MC", type=int, default=0)
+    parser.add_argument("--json", dest="json", help="Json file where the time per event of each implementation is written", type=str, default='')
+    args = parser.parse_args()
+
+    ROOT.gInterpreter.Declare(BENCHMARK_CODE)
+    JECfile, corrfile = JECsInit(args.year, args.era, args.isData)
+    jec = getattr(ROOT, setupjecs(JECfile, corrfile)).JetCorPt
+    jec_compound = getattr(ROOT, setupjecs(JECfile, corrfile, True)).JetCorPt
+    jets = ROOT.GenerateBenchmarkJets(args.events, 42)
+
+    results = {
+        'legacy': ROOT.TimeLegacy(jets, jec, corrfile, bool(args.isData)),
+        'batched (all jets)': ROOT.TimeBatched(jets, jec, bool(args.isData), False),
+        'batched (jet ID skip)': ROOT.TimeBatched(jets, jec, bool(args.isData), True),
+        'compound (jet ID skip)': ROOT.TimeBatched(jets, jec_compound, bool(args.isData), True),
+    }
+    legacy_time = results['legacy'].first
+    print('{:<25}{:>15}{:>10}{:>20}'.format('JetCorPt', 'us/event', 'speedup', 'sum of pT'))
+    for name, result in results.items():
+        print('{:<25}{:>15.3f}{:>10.2f}{:>20.6g}'.format(name, result.first, legacy_time/result.first, result.second))
+    #The legacy and batched (all jets) implementations must give the same corrected pT
+    if abs(results['legacy'].second - results['batched (all jets)'].second) > 1e-6*abs(results['legacy'].second):
+        print('Warning: the batched JetCorPt differs from the legacy implementation')
+    if args.json != '':
+        with open(args.json, 'w') as f:
+            json.dump({name: {'us_per_event': result.first, 'events_per_second': 1e6/result.first} for name, result in results.items()}, f, indent=1)
+
+if __name__ == '__main__':
+    if not kernels.load_kernels():
+        sys.exit(1)
+    main()
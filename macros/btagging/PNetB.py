@@ -1,20 +1,20 @@
 import ROOT
 import numpy as np
-from math import sqrt
 import matplotlib
 matplotlib.use("Agg")  # Use non-interactive backend (no display needed)
 import matplotlib.pyplot as plt
+import sys
 
-def extract_array_2D(hist):
-    nbins_x = hist.GetNbinsX()
-    nbins_y = hist.GetNbinsY()
-    x_edges = np.array([hist.GetXaxis().GetBinLowEdge(i+1) for i in range(nbins_x + 1)])
-    y_edges = np.array([hist.GetYaxis().GetBinLowEdge(i+1) for i in range(nbins_y + 1)])
-    z_vals = np.array([[hist.GetBinContent(i+1,j+1) for i in range(nbins_x)] for j in range(nbins_y)])
-
+sys.path.insert(0, '../../helpers')
+import efficiency
+import histarrays
 
-   
-    return x_edges,y_edges, z_vals
+def extract_array_2D(hist):
+    '''
+    Bin edges and contents of a 2D histogram, with the contents indexed [y bin, x bin] as expected by pcolormesh.
+    '''
+    z_vals, x_edges, y_edges = histarrays.to_numpy(hist)
+    return x_edges, y_edges, z_vals.T
 
 def plot_heatmap_2D(file,hist_name,outname):
     '''
@@ -40,28 +40,45 @@ def plot_heatmap_2D(file,hist_name,outname):
     plt.close()
     print(f'Histogram {hist_name} sucessfully saved as {outname}!')
 
-def plot_significance_heatmap(hist_sg,hist_bg, outname):
+def plot_significance_heatmap(hist_sg,hist_bg, outname, rootname="hist_significance.root"):
     '''
-    Plot a 2D significance heatmap from signal and background TH2F histograms.
+    Significance S/sqrt(S+B) of the cut (Jet_btagPNetB_1 > x, Jet_btagPNetB_2 > y) for the lower edge (x, y) of every bin
+    of the signal and background 2D histograms, at their full binning (the input histograms are not modified).
+    The tail integrals include the overflow bins, as TH2::Integral(i, nbins_x+1, j, nbins_y+1), and are read from a summed-area table
+    (see helpers/efficiency.py). The heatmap is saved as a TH2D in rootname and as a png in outname.
     '''
-    hist_sg.RebinX(10)
-    hist_sg.RebinY(10)
-    hist_bg.RebinX(10)
-    hist_bg.RebinY(10)
-    hist_significance = hist_sg.Clone()
-    nbins_x = hist_sg.GetNbinsX()
-    nbins_y = hist_sg.GetNbinsY()
+    x_edges, y_edges, sg_contents = efficiency.histogram2d_arrays(hist_sg, overflow=True)
+    _, _, bg_contents = efficiency.histogram2d_arrays(hist_bg, overflow=True)
+    s = efficiency.passing_2d(x_edges, y_edges, sg_contents, x_edges[:-1], y_edges[:-1])
+    b = efficiency.passing_2d(x_edges, y_edges, bg_contents, x_edges[:-1], y_edges[:-1])
+    significance = np.zeros_like(s)
+    mask = (s > 0) & (b > 0)
+    significance[mask] = s[mask]/np.sqrt(s[mask]+b[mask])
 
-    for i in range(nbins_x):
-        print(i)
-        for j in range(nbins_y):
-            s = hist_sg.Integral(i+1, nbins_x+1, j+1, nbins_y+1) 
-            b = hist_bg.Integral(i+1, nbins_x+1, j+1, nbins_y+1) 
-            significance = 0
-            if s > 0 and b >0 : 
-                significance = s/sqrt(s+b)
-            hist_significance.SetBinContent(i+1, j+1, significance)
-    hist_significance.SaveAs("hist_significance.root")
+    nbins_x, nbins_y = len(x_edges)-1, len(y_edges)-1
+    hist_significance = ROOT.TH2D("hist_significance", "S/#sqrt{S+B};Jet_btagPNetB_1 threshold;Jet_btagPNetB_2 threshold",
+                                  nbins_x, x_edges, nbins_y, y_edges)
+    # Global bin numbers are x + (nbins_x+2)*y, including the under/overflow bins
+    cells = np.zeros((nbins_y+2, nbins_x+2))
+    cells[1:-1, 1:-1] = significance.T
+    hist_significance.Set(hist_significance.GetNcells(), cells.ravel())
+    hist_significance.SetEntries(nbins_x*nbins_y)
+    out = ROOT.TFile(rootname, "recreate")
+    hist_significance.Write()
+    out.Close()
+
+    i_max, j_max = efficiency.best_working_point(significance, x_edges[:-1], y_edges[:-1])
+    plt.figure(figsize=(8,6))
+    im = plt.pcolormesh(x_edges, y_edges, significance.T, shading='auto', cmap='viridis')
+    plt.scatter([x_edges[i_max]], [y_edges[j_max]], color='red', marker='x', label=f'Max {significance[i_max, j_max]:.3f} at ({x_edges[i_max]:.3f}, {y_edges[j_max]:.3f})')
+    plt.xlabel("Jet_btagPNetB_1 threshold")
+    plt.ylabel("Jet_btagPNetB_2 threshold")
+    plt.colorbar(im, label=r"Significance $S/\sqrt{S+B}$")
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(outname, dpi=300)
+    plt.close()
+    print(f'Significance heatmap saved as {rootname} and {outname}')
 
 
 # Call for signal and background
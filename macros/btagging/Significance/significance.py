@@ -5,6 +5,11 @@ matplotlib.use("Agg")  # avoid GUI with matplotlib
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 import os
+import sys
+import argparse
+
+sys.path.insert(0, '../../../helpers')
+import efficiency
 
 def plot_roc(FPR,TPR,labels,title,outpath,auc=None):
         '''
@@ -66,58 +71,49 @@ def plot_significance_surface(FPR,TPR,thresholds_1,thresholds_2,Significance,out
         plt.savefig(outpath,dpi=300)
         plt.close()
 
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import cm
-from matplotlib.colors import Normalize
-from mpl_toolkits.mplot3d import Axes3D  # noqa: F401
+def plot_significance_curve(thresholds, significances, xlabel, outpath):
+        '''
+        Plot the significance of a cut on a single jet b-tagging score.
+        '''
+        plt.figure()
+        plt.plot(thresholds, significances)
+        plt.xlabel(xlabel)
+        plt.ylabel("Significance S/√(S+B)")
+        plt.grid(True)
+        plt.savefig(outpath)
+        plt.close()
+
+parser = argparse.ArgumentParser(description='''Scan of the b-tagging thresholds of the two jets''')
+parser.add_argument("--flavour", dest="flavour", help="Only consider signal events with this dijet flavour (e.g. 5 for Z->bb). Default=0 i.e. all", type=int, default=0)
+parser.add_argument("-n", "--thresholds", dest="n_thresholds", help="Number of thresholds per jet", type=int, default=1000)
+args = parser.parse_args()
 
 # Global parameters
 
 file_sg = ROOT.TFile('../../Source.root')
 file_bg = ROOT.TFile('../../Background.root')
 
+sg_name = f'Jet_btagPNetB_PartonFlavour{args.flavour}_zg' if args.flavour else 'Jet_btagPNetB_zg'
+sg_2d = file_sg.Get(sg_name)
+bg_2d = file_bg.Get('Jet_btagPNetB_gjets')
 sg_1 = file_sg.Get('Jet_btagPNetB_1_zg')
 sg_2 = file_sg.Get('Jet_btagPNetB_2_zg')
 bg_1 = file_bg.Get('Jet_btagPNetB_1_gjets')
 bg_2 = file_bg.Get('Jet_btagPNetB_2_gjets')
 
-assert sg_1 and sg_2 and bg_1 and bg_2, "Missing histograms!"
-
-# Normalize histograms
-
-#for h in [sg_1,sg_2]:
-#    h.Scale(1/h.Integral())
-#for h in [bg_1,bg_2]:
-#    h.Scale(1/h.Integral())
+assert sg_2d and bg_2d and sg_1 and sg_2 and bg_1 and bg_2, "Missing histograms!"
 
 # Threshold scan ranges
 
-n_thresholds = 1000
+n_thresholds = args.n_thresholds
 thresholds_1 = np.linspace(0,1,n_thresholds)
 thresholds_2 = np.linspace(0,1,n_thresholds)
 
-S = np.zeros((n_thresholds,n_thresholds))
-B = np.zeros((n_thresholds,n_thresholds))
-
-# Fill ROC grid
-for i,t1 in enumerate(thresholds_1):
-      for j,t2 in enumerate(thresholds_2):
-            bin_t1_sg = sg_1.GetXaxis().FindBin(t1)
-            bin_t2_sg = sg_2.GetXaxis().FindBin(t2)
-            bin_t1_bg = bg_1.GetXaxis().FindBin(t1)
-            bin_t2_bg = bg_2.GetXaxis().FindBin(t2)
-
-            sg_nbins_1 = sg_1.GetNbinsX()
-            sg_nbins_2 = sg_2.GetNbinsX()
-            sg_pass = min(sg_1.Integral(bin_t1_sg,sg_nbins_1),sg_2.Integral(bin_t2_sg,sg_nbins_2))
-
-            bg_nbins_1 = bg_1.GetNbinsX()
-            bg_nbins_2 = bg_2.GetNbinsX()
-            bg_pass = min(bg_1.Integral(bin_t1_bg,bg_nbins_1),bg_2.Integral(bin_t2_bg,bg_nbins_2))
-
-            S[i,j] = sg_pass
-            B[i,j] = bg_pass
+# Joint number of signal and background events with Jet_btagPNetB_1 > t1 and Jet_btagPNetB_2 > t2, over the full grid
+xedges, yedges, sg_contents = efficiency.histogram2d_arrays(sg_2d)
+_, _, bg_contents = efficiency.histogram2d_arrays(bg_2d)
+S = efficiency.passing_2d(xedges, yedges, sg_contents, thresholds_1, thresholds_2)
+B = efficiency.passing_2d(xedges, yedges, bg_contents, thresholds_1, thresholds_2)
 
 Significance = np.zeros_like(S)
 mask = (S+B) > 0
@@ -125,55 +121,16 @@ Significance[mask] = S[mask]/np.sqrt(S[mask]+B[mask])
 
 plot_significance_surface(S,B,thresholds_1,thresholds_2,Significance,outpath="3D_significance_scan.png")
 
-flat = Significance.flatten()
-sorted_indices = flat.argsort()[::-1] # Sorted from max to min
-
-for idx in sorted_indices:
-     i,j = np.unravel_index(idx, Significance.shape)
-     if thresholds_1[i] < 0.05 or thresholds_2[j] < 0.05:
-          continue
-     i_max, j_max = i,j
-     break
-
+i_max, j_max = efficiency.best_working_point(Significance, thresholds_1, thresholds_2, min_threshold=0.05)
 best_t1,best_t2 = thresholds_1[i_max], thresholds_2[j_max]
 
 print(f'{best_t1} with {i_max} and {best_t2} with {j_max}')
 print(f"S({i_max},{j_max}) = {S[i_max,j_max]:.1f}, B({i_max},{j_max}) = {B[i_max,j_max]:.1f}, Significance = {Significance[i_max,j_max]:.3f}")
 
+# Significance of a cut on a single jet
 thresholds = np.linspace(0, 1, 200)
-significances = []
-for t in thresholds:
-    bin_sg = sg_1.GetXaxis().FindBin(t)
-    bin_bg = bg_1.GetXaxis().FindBin(t)
-    s = sg_1.Integral(bin_sg, sg_1.GetNbinsX())
-    b = bg_1.Integral(bin_bg, bg_1.GetNbinsX())
-    if s + b > 0:
-        sig = s / np.sqrt(s + b)
-    else:
-        sig = 0
-    significances.append(sig)
-
-plt.plot(thresholds, significances)
-plt.xlabel("Threshold Jet_btagPNetB_1")
-plt.ylabel("Significance S/√(S+B)")
-plt.grid(True)
-plt.savefig("significance_vs_cut_1.png")
-
-thresholds = np.linspace(0, 1, 200)
-significances = []
-for t in thresholds:
-    bin_sg = sg_2.GetXaxis().FindBin(t)
-    bin_bg = bg_2.GetXaxis().FindBin(t)
-    s = sg_2.Integral(bin_sg, sg_2.GetNbinsX())
-    b = bg_2.Integral(bin_bg, bg_2.GetNbinsX())
-    if s + b > 0:
-        sig = s / np.sqrt(s + b)
-    else:
-        sig = 0
-    significances.append(sig)
-
-plt.plot(thresholds, significances)
-plt.xlabel("Threshold Jet_btagPNetB_1")
-plt.ylabel("Significance S/√(S+B)")
-plt.grid(True)
-plt.savefig("significance_vs_cut_2.png")
\ No newline at end of file
+for k, (sg, bg) in enumerate([(sg_1, bg_1), (sg_2, bg_2)], 1):
+    edges, sg_contents = efficiency.histogram_arrays(sg)
+    _, bg_contents = efficiency.histogram_arrays(bg)
+    significances = np.nan_to_num(efficiency.significance(edges, sg_contents, bg_contents, thresholds, 'greater', normalise=False))
+    plot_significance_curve(thresholds, significances, f"Threshold Jet_btagPNetB_{k}", f"significance_vs_cut_{k}.png")
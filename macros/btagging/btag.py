@@ -5,6 +5,11 @@ import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import uproot
+import sys
+import argparse
+
+sys.path.insert(0, '../../helpers')
+import plotpool
 
 # Disable interactive mode for clean plotting
 plt.ioff()
@@ -87,24 +92,38 @@ def draw_and_save(hist_values, bin_edges, title, filepath, cut_lines=None):
     plt.savefig(filepath)
     plt.close()
 
-def process_histograms(file,inclusive_histograms,output_dir,efficiencies,isSignal=True, flavour_histograms=None):
+def draw_shared(name, title, filepath, cut_lines):
+	"""
+	Plot job: draw_and_save for the histogram arrays shared as name_values and name_edges (see plotpool).
+	"""
+	draw_and_save(plotpool.shared(name+'_values'), plotpool.shared(name+'_edges'), title, filepath, cut_lines)
+
+def process_histograms(file,inclusive_histograms,output_dir,efficiencies,isSignal=True, flavour_histograms=None, prefix=''):
 	"""
 	Process inclusive and optionally flavour-separated histograms.
+	Returns the plot jobs and the histogram arrays they need (names starting with prefix), to be rendered with plotpool.render.
 	"""
+	jobs, arrays = [], {}
+
+	def add_job(hist_name, hist_dir, kind):
+		if hist_name not in file:
+			print(f'Warning: {kind} histogram "{hist_name}" not found in file.')
+			return
+		hist = file[hist_name]
+		if len(hist.axes) != 1:
+			return
+		hist_values, bin_edges = hist.to_numpy()
+		cut_lines = {eff: find_cut_value(hist_values,bin_edges, eff) for eff in efficiencies}
+		arrays[prefix+hist_name+'_values'] = hist_values
+		arrays[prefix+hist_name+'_edges'] = bin_edges
+		jobs.append((draw_shared, prefix+hist_name, hist_name, os.path.join(hist_dir,f"{hist_name}.png"), cut_lines))
+
 	# Inclusive
 	inclusive_dir = os.path.join(output_dir,"Inclusive")
 	os.makedirs(inclusive_dir,exist_ok=True)
 	
 	for hist_name in inclusive_histograms:
-		if hist_name in file:
-			hist = file[hist_name]
-			hist_values, bin_edges = hist.to_numpy()
-			cut_lines = {eff: find_cut_value(hist_values,bin_edges, eff) for eff in efficiencies}
-			output_filepath = os.path.join(inclusive_dir,f"{hist_name}.png")
-			draw_and_save(hist_values,bin_edges,hist_name, output_filepath, cut_lines)
-		else:
-			print(f'Warning: Inclusive histogram {hist_name} not found in file.')
-		
+		add_job(hist_name, inclusive_dir, 'Inclusive')
 	
 	if isSignal and flavour_histograms:
 		for flavour, hist_list in flavour_histograms.items():
@@ -112,15 +131,14 @@ def process_histograms(file,inclusive_histograms,output_dir,efficiencies,isSigna
 			os.makedirs(flavour_dir,exist_ok=True)
 			
 			for hist_name in hist_list:
-				if hist_name in file:	
-					hist = file[hist_name]
-					hist_values, bin_edges = hist.to_numpy()
-					cut_lines = {eff: find_cut_value(hist_values,bin_edges, eff) for eff in efficiencies}
-					output_filepath = os.path.join(flavour_dir,f"{hist_name}.png")
-					draw_and_save(hist_values,bin_edges,hist_name,output_filepath,cut_lines)
-				else:
-					print(f'Warning: Flavour histogram "{hist_name}" not found in file.')
+				add_job(hist_name, flavour_dir, 'Flavour')
+	return jobs, arrays
+
+parser = argparse.ArgumentParser(description='''b-tagging score distributions and working points''')
+plotpool.add_workers_argument(parser)
+args = parser.parse_args()
 
+plot_jobs, plot_arrays = [], {}
 for root_file_path in [source_file_path,background_file_path]:
 	isSignal = (root_file_path == source_file_path)
 
@@ -136,11 +154,16 @@ for root_file_path in [source_file_path,background_file_path]:
 		os.makedirs(output_dir, exist_ok=True)
 
 	os.makedirs(output_dir,exist_ok=True)
-	process_histograms(
+	jobs, arrays = process_histograms(
 		file,
 		inclusive_histograms,
 		output_dir,
 		efficiencies,
 		isSignal,
-		flavour_histograms if isSignal else None
+		flavour_histograms if isSignal else None,
+		prefix="sg_" if isSignal else "bg_"
 		)
+	plot_jobs += jobs
+	plot_arrays.update(arrays)
+
+plotpool.render(plot_jobs, plot_arrays, args.workers)
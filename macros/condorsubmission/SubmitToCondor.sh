@@ -1,18 +1,22 @@
 #!/bin/bash
+#Arguments: folder 'input files (space separated, glob patterns allowed)' process year era isData [partition_jobs.py options, e.g. --events_per_job 1000000 --cpus 4]
+#        or folder --sample NAME [partition_jobs.py options] (files, process, year, era and isData from the sample registry)
 if [ -d $1 ]
 then 
     echo "Folder exists, exiting"
 else 
-    mkdir $1
-    mkdir $1/log
-    cp scriptcondor_template.sub $1/scriptcondor.sub
+    #Build the compiled kernels once, so that the jobs do not compile them concurrently
+    python3 ../../helpers/kernels.py || exit 1
+    #Jobs of similar size: small files grouped, large files split in ranges of entries
+    if [ "$2" == "--sample" ]
+    then
+        python3 partition_jobs.py $1 --sample $3 "${@:4}" || exit 1
+    else
+        #The input files are split on spaces (several files or quoted glob patterns), the patterns are expanded by partition_jobs.py
+        read -ra inputs <<< "$2"
+        python3 partition_jobs.py $1 "${inputs[@]}" -p $3 --year $4 --era $5 --isData $6 "${@:7}" || exit 1
+    fi
     cp scriptcondor.sh $1/.
     cd $1
-    sed -ie "s#OUTPUTDIR#$1#g" scriptcondor.sub
-    sed -ie "s#FILENAMES#$2#g" scriptcondor.sub
-    sed -ie "s#PROCESS#$3#g" scriptcondor.sub
-    sed -ie "s#YEAR#$4#g" scriptcondor.sub
-    sed -ie "s#ERA#$5#g" scriptcondor.sub
-    sed -ie "s#ISDATA#$6#g" scriptcondor.sub
     condor_submit scriptcondor.sub 
 fi
@@ -0,0 +1,175 @@
+import ROOT
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+sys.path.insert(0, '../../helpers')
+from catalog import checksum
+from branchaudit import AUDIT_EXIT_CODE
+
+'''
+Manifest of a condor submission (manifest.json in the submission folder, written by partition_jobs.py):
+inputs, entry range, arguments and output of each job, and after the jobs have run their status,
+exit code, number of events processed and output checksum (adler32).
+
+From the condorsubmission folder:
+    python3 manifest.py status outputdir      update and print the status of the jobs
+    python3 manifest.py resubmit outputdir    resubmit only the jobs whose output is missing, failed, corrupt or incomplete
+Jobs whose output is complete but whose branch audit failed (audit_failed) are not resubmitted: rerunning them would fail again.
+Jobs without result are only resubmitted once condor has finished with them (terminated or aborted in their log): the jobs still
+queued, running or held are not.
+'''
+
+RESUBMIT = ['missing', 'failed', 'corrupt', 'incomplete']
+#Events of the condor user log (log/scriptcondor_<n>.log) changing the state of a job, the log is appended at each resubmission
+CONDOR_EVENTS = {'000': 'queued', '001': 'running', '004': 'queued', '005': 'finished', '009': 'finished', '012': 'held', '013': 'queued'}
+
+def job_line(job):
+    '''
+    Line of a job in jobs.txt (read by the submit description): job number, input list, first entry, number of entries, cpus and memory.
+    '''
+    return '{} {} {} {} {} {}\n'.format(job['id'], job['inputs'], job['first'], job['nevents'], job['cpus'], job['memory'])
+
+def save(folder, manifest):
+    with open(os.path.join(folder, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+def load(folder):
+    with open(os.path.join(folder, 'manifest.json')) as f:
+        return json.load(f)
+
+def condor_state(job):
+    '''
+    State of the last submission of a job in its condor log: queued, running, held, finished (terminated or aborted),
+    None if there is no log (never submitted).
+    '''
+    log = os.path.join(os.path.dirname(job['output']), 'log', 'scriptcondor_{}.log'.format(job['id']))
+    if not os.path.exists(log):
+        return None
+    state = None
+    with open(log) as f:
+        for line in f:
+            #Event lines: "005 (1234.005.000) 2024-05-01 12:00:00 Job terminated."
+            if line[:3] in CONDOR_EVENTS and line[3:5] == ' (':
+                state = CONDOR_EVENTS[line[:3]]
+    return state
+
+def events_processed(output, process):
+    '''
+    Number of events processed by a job (entries of h_nvtx_<process>, filled once per event of its range), None if the output is not readable.
+    '''
+    f = ROOT.TFile.Open(output)
+    if not f or f.IsZombie() or f.TestBit(ROOT.TFile.kRecovered):
+        return None
+    h = f.Get('h_nvtx_'+process)
+    n = int(h.GetEntries()) if h else None
+    f.Close()
+    return n
+
+def check(job, process, verify=False):
+    '''
+    Update the status of a job of process from its output file and exit code (output_<n>.exit, written by scriptcondor.sh):
+    done, queued, running or held (no result yet, state in the condor log, see condor_state), missing (no result although
+    condor has finished with the job, or no log: lost), failed (non-zero exit code), corrupt (unreadable output, or output
+    changed since it was checked), incomplete (fewer events processed than in the entry range) or audit_failed
+    (complete output, but the branch audit failed: exit code AUDIT_EXIT_CODE, see branchaudit.py).
+    The checksum of a done output is computed once, and recomputed with verify.
+    '''
+    exitfile = job['output'][:-len('.root')]+'.exit'
+    if not os.path.exists(exitfile):
+        state = condor_state(job)
+        job['status'] = state if state in ['queued', 'running', 'held'] else 'missing'
+        return job
+    with open(exitfile) as f:
+        content = f.read().strip()
+    job['exit_code'] = int(content) if content.lstrip('-').isdigit() else None
+    if job['exit_code'] not in [0, AUDIT_EXIT_CODE]:
+        job['status'] = 'failed'
+        return job
+    complete = 'done' if job['exit_code'] == 0 else 'audit_failed'
+    if not os.path.exists(job['output']):
+        job['status'] = 'missing'
+        return job
+    if job.get('status') == complete and not verify and os.path.getsize(job['output']) == job.get('size'):
+        return job
+    if job.get('status') == complete and job.get('checksum') and checksum(job['output']) != job['checksum']:
+        job['status'] = 'corrupt'
+        return job
+    n = events_processed(job['output'], process)
+    job['events_processed'] = n
+    if n is None:
+        job['status'] = 'corrupt'
+    elif n < job['events']:
+        job['status'] = 'incomplete'
+    else:
+        job['status'] = complete
+        job['size'] = os.path.getsize(job['output'])
+        job['checksum'] = checksum(job['output'])
+    return job
+
+def update(folder, verify=False):
+    '''
+    Check all the jobs of a submission folder and save the manifest. Returns the manifest.
+    '''
+    manifest = load(folder)
+    for job in manifest['jobs']:
+        check(job, manifest['process'], verify)
+    save(folder, manifest)
+    return manifest
+
+def summary(manifest):
+    counts = {}
+    for job in manifest['jobs']:
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+    done = [job for job in manifest['jobs'] if job['status'] in ['done', 'audit_failed']]
+    print('{} jobs: '.format(len(manifest['jobs'])) + ', '.join('{} {}'.format(n, status) for status, n in sorted(counts.items())))
+    print('{} / {} events processed'.format(sum(job['events_processed'] for job in done), sum(job['events'] for job in manifest['jobs'])))
+
+def resubmit(folder, manifest, dry_run=False):
+    '''
+    Write jobs_resubmit.txt and scriptcondor_resubmit.sub for the jobs to resubmit (status in RESUBMIT), and submit them.
+    '''
+    jobs = [job for job in manifest['jobs'] if job['status'] in RESUBMIT]
+    if not jobs:
+        print('Nothing to resubmit')
+        return 0
+    with open(os.path.join(folder, 'jobs_resubmit.txt'), 'w') as f:
+        for job in jobs:
+            f.write(job_line(job))
+    with open(os.path.join(folder, 'scriptcondor.sub')) as f:
+        sub = f.read().replace('from jobs.txt', 'from jobs_resubmit.txt')
+    with open(os.path.join(folder, 'scriptcondor_resubmit.sub'), 'w') as f:
+        f.write(sub)
+    print('Resubmitting jobs ' + ' '.join(str(job['id']) for job in jobs))
+    if dry_run:
+        return 0
+    for job in jobs:
+        for stale in [job['output'], job['output'][:-len('.root')]+'.exit']:
+            if os.path.exists(stale):
+                os.remove(stale)
+        job['status'], job['exit_code'], job['events_processed'], job['checksum'] = 'submitted', None, None, None
+        job['resubmissions'] = job.get('resubmissions', 0) + 1
+    save(folder, manifest)
+    return subprocess.call(['condor_submit', 'scriptcondor_resubmit.sub'], cwd=folder)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''Status and resubmission of the jobs of a condor submission folder''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("command", help="status: update and print the status of the jobs\nresubmit: resubmit the missing, failed, corrupt and incomplete jobs (not the queued, running or held ones)", choices=['status', 'resubmit'])
+    parser.add_argument("folder", help="Submission folder", type=str)
+    parser.add_argument("--verify", dest="verify", help="Recompute the checksums of the outputs already checked", action='store_true')
+    parser.add_argument("--dry_run", dest="dry_run", help="Only write the resubmission files, do not submit", action='store_true')
+    args = parser.parse_args()
+
+    manifest = update(args.folder, args.verify)
+    summary(manifest)
+    if args.command == 'resubmit':
+        return resubmit(args.folder, manifest, args.dry_run)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import math
+import argparse
+
+sys.path.insert(0, '../../helpers')
+from inputs import expand_inputs
+import catalog
+import sampleregistry
+import manifest
+
+'''
+Split a set of NanoAOD files into condor jobs of similar size (number of events):
+small files are grouped in the same job, large files are split into ranges of entries.
+Writes in the submission folder:
+- inputs/job_<n>.txt    the input files of job n
+- jobs.txt              one line per job: job number, input list, first entry, number of entries (-1: all), cpus and memory,
+                        read by the submit description (see manifest.job_line)
+- manifest.json         the sample, the jobs, their entries, arguments and output files, and their status (see manifest.py)
+- scriptcondor.sub      the submit description, with request_cpus/request_memory of each job from jobs.txt
+Jobs processing a range of entries of a file run sequentially (analysis.py ignores --nthreads for entry ranges), so they request one cpu.
+The output of job n is output_<n>.root. All the outputs of a folder are summed by hadd_scale_merge.py.
+'''
+
+def partition(entries, events_per_job, range_events=0):
+    '''
+    Group the files {file: entries} into jobs of about events_per_job events. Files of events_per_job entries or more are
+    split into ranges of at most range_events entries (default: events_per_job).
+    Returns a list of jobs {'files', 'first', 'nevents' (-1: all the entries of the files), 'events'}.
+    '''
+    jobs, group, group_events = [], [], 0
+
+    def flush():
+        nonlocal group, group_events
+        if group:
+            jobs.append({'files': group, 'first': 0, 'nevents': -1, 'events': group_events})
+        group, group_events = [], 0
+
+    for f, n in entries.items():
+        if n == 0:
+            continue
+        if n >= events_per_job:
+            #Large file: equal ranges of at most range_events entries
+            nranges = math.ceil(n/(range_events if range_events > 0 else events_per_job))
+            size = math.ceil(n/nranges)
+            for first in range(0, n, size):
+                jobs.append({'files': [f], 'first': first, 'nevents': min(size, n-first), 'events': min(size, n-first)})
+            continue
+        if group_events + n > events_per_job:
+            flush()
+        group.append(f)
+        group_events += n
+    flush()
+    return jobs
+
+def default_memory(cpus):
+    return 1500 + 500*(cpus-1)
+
+def fill_template(template, values):
+    '''
+    Replace the placeholders (keys of values) of the submit description template in a single pass,
+    so that a substituted value containing a placeholder (e.g. in the folder or the analysis options) is kept as is.
+    '''
+    pattern = re.compile('|'.join(re.escape(key) for key in sorted(values, key=len, reverse=True)))
+    return pattern.sub(lambda match: values[match.group(0)], template)
+
+def write_submission(folder, jobs, sample, process, year, era, isData, cpus, memory=0, options='', disk=100):
+    '''
+    Write the job inputs, the manifest and the submit description in folder.
+    sample is the name of the sample in the registry, used to normalise the outputs.
+    cpus is the number of cpus of the jobs processing whole files (one for entry ranges), memory the memory per job in MB
+    (0: default_memory of the cpus of each job). options are additional options of analysis.py given to all the jobs,
+    disk the disk request in MB.
+    '''
+    os.makedirs(os.path.join(folder, 'inputs'), exist_ok=True)
+    with open(os.path.join(folder, 'jobs.txt'), 'w') as jobs_txt:
+        for n, job in enumerate(jobs):
+            inputs = os.path.join('inputs', 'job_{}.txt'.format(n))
+            with open(os.path.join(folder, inputs), 'w') as filelist:
+                filelist.write('\n'.join(job['files'])+'\n')
+            job['id'] = n
+            job['inputs'] = os.path.abspath(os.path.join(folder, inputs))
+            job['output'] = os.path.abspath(os.path.join(folder, 'output_{}.root'.format(n)))
+            job['cpus'] = cpus if job['nevents'] == -1 else 1
+            job['memory'] = memory if memory > 0 else default_memory(job['cpus'])
+            job['arguments'] = '{} {} {} {} {} {} {} {} {} {}'.format(job['inputs'], job['output'], process, year, era, isData, job['first'], job['nevents'], job['cpus'], options).strip()
+            job['status'] = 'submitted'
+            jobs_txt.write(manifest.job_line(job))
+    manifest.save(folder, {'sample': sample, 'process': process, 'year': year, 'era': era, 'isData': isData, 'jobs': jobs})
+
+    with open('scriptcondor_template.sub') as template:
+        sub = fill_template(template.read(), {'OUTPUTDIR': folder, 'PROCESS': process, 'YEAR': str(year), 'ERA': era, 'ISDATA': str(isData),
+                                              'DISK': str(disk), 'ANALYSISOPTIONS': options})
+    with open(os.path.join(folder, 'scriptcondor.sub'), 'w') as f:
+        f.write(sub)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='''Partition NanoAOD files into condor jobs of similar size''',
+        usage='use "%(prog)s --help" for more information',
+        formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("folder", help="Submission folder (created; without --sample its name must be the name of the sample in the registry)", type=str)
+    parser.add_argument("inputs", help="Input files: files, glob patterns (quoted) or .txt file lists. Default: files of the --sample", nargs='*', type=str)
+    parser.add_argument("-s", "--sample", dest="sample", help="Name of the sample in the registry, giving the files, process, year, era and isData", type=str, default='')
+    parser.add_argument("--registry", dest="registry", help="Sample registry. Default=macros/samples.yaml", type=str, default=sampleregistry.DEFAULT_REGISTRY)
+    parser.add_argument("--catalog", dest="catalog", help="Catalog of the input files (number of entries of each file; the new files are added). Default=macros/catalog.json", type=str, default=catalog.DEFAULT_CATALOG)
+    parser.add_argument("-p", "--process", dest="process", help="Name of the process (gjets, zg, data)", type=str, default='')
+    parser.add_argument("--year", dest="year", help="Year considered (2022, 2023, 2024)", type=int, default=2023)
+    parser.add_argument("--era", dest="era", help="Era", type=str, default='C')
+    parser.add_argument("--isData", dest="isData", help="is Data or MC", type=int, default=0)
+    parser.add_argument("--events_per_job", dest="events_per_job", help="Target number of events per job. Default=500000", type=int, default=500000)
+    parser.add_argument("--job_time", dest="job_time", help="Target wall time per job in minutes, overrides --events_per_job (using --rate)", type=float, default=0)
+    parser.add_argument("--rate", dest="rate", help="Events processed per second and per cpu, to convert --job_time into events. Default=1000", type=float, default=1000)
+    parser.add_argument("--cpus", dest="cpus", help="Cpus per job (request_cpus, and number of threads of analysis.py), for the jobs processing whole files: jobs processing a range of entries run sequentially on one cpu. Default=1", type=int, default=1)
+    parser.add_argument("--analysis_options", dest="analysis_options", help="Additional options of analysis.py for all the jobs (quoted), e.g. '--stage auto --prefetch'", type=str, default='')
+    parser.add_argument("--memory", dest="memory", help="Memory per job in MB. Default=1500 + 500 per additional cpu", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.folder):
+        print('Folder exists, exiting')
+        return 1
+    events_per_job = int(args.job_time*60*args.rate*args.cpus) if args.job_time > 0 else args.events_per_job
+
+    registry = sampleregistry.load(args.registry)
+    if args.sample != '':
+        sample = sampleregistry.get(registry, args.sample)
+        args.process, args.year, args.era, args.isData = sample['process'], sample['year'], sample['era'], sample['isData']
+        files = expand_inputs(args.inputs) if args.inputs else sampleregistry.sample_files(sample)
+    else:
+        try:
+            sample = sampleregistry.resolve(registry, args.folder)
+        except KeyError as error:
+            print(error.args[0])
+            return 1
+        files = expand_inputs(args.inputs)
+    if args.process == '':
+        print('No process given (-p or --sample)')
+        return 1
+    if not files:
+        print('No input file')
+        return 1
+    #Entry ranges run on one cpu: ranges of events_per_job/cpus entries take as long as the multithreaded jobs
+    jobs = partition({f: i['entries'] for f, i in catalog.lookup(files, args.catalog, update=True).items()}, events_per_job, max(1, events_per_job//args.cpus))
+    #Jobs staging their inputs (--stage) need the disk space of their whole input files
+    disk = 100
+    if '--stage' in args.analysis_options:
+        sizes = catalog.load(args.catalog)
+        disk = max(disk, math.ceil(1.2*max(sum(sizes[f]['size'] or 0 for f in job['files']) for job in jobs)/1e6))
+    os.makedirs(os.path.join(args.folder, 'log'))
+    write_submission(args.folder, jobs, sample['name'], args.process, args.year, args.era, args.isData, args.cpus, args.memory, args.analysis_options, disk)
+    ranges = sum(job['nevents'] != -1 for job in jobs)
+    print('{} files, {} events in {} jobs of up to {} events ({} cpus, {} MB; {} jobs on entry ranges: 1 cpu, {} MB)'.format(
+        len(files), sum(job['events'] for job in jobs), len(jobs), events_per_job, args.cpus, args.memory if args.memory > 0 else default_memory(args.cpus),
+        ranges, args.memory if args.memory > 0 else default_memory(1)))
+    print('Estimated time per job: {:.0f} min, {:.1f} cpu hours in total (at {} events/s/cpu)'.format(
+        max(job['events']/(args.rate*job['cpus']) for job in jobs)/60, sum(job['events'] for job in jobs)/args.rate/3600, args.rate))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,9 @@
 #!/bin/bash
 source /cvmfs/sft.cern.ch/lcg/views/setupViews.sh LCG_103 x86_64-centos7-gcc12-opt
 cd /user/jmoeil/GammaXqq/macros
-python3 analysis.py --max_events -1 -i $1 -o $2 -p $3 --year $4 --era $5 --isData $6
-
-
+#Arguments: inputs output process year era isData [first entry] [number of entries] [threads] [other analysis.py options, e.g. --stage auto]
+python3 analysis.py --first_event ${7:-0} --max_events ${8:--1} --nthreads ${9:-1} -i $1 -o $2 -p $3 --year $4 --era $5 --isData $6 "${@:10}"
+#Exit code next to the output (output_<n>.exit), read by manifest.py
+status=$?
+echo $status > ${2%.root}.exit
+exit $status
@@ -1,89 +1,58 @@
 import ROOT
+import os
 import correctionlib
 correctionlib.register_pyroot_binding()
 
-# C++ function to get the raw pT from the corrected pT
-
-
-def setupjecs(JECfile, corrfile):
-    ROOT.gInterpreter.Declare('auto cset_jecs = correction::CorrectionSet::from_file("{}");'.format(JECfile))
-    ROOT.gInterpreter.Declare('auto cset_l1jecs = cset_jecs->at("{}");'.format(corrfile+'L1FastJet_AK4PFPuppi'))
-    ROOT.gInterpreter.Declare('auto cset_l2jecs = cset_jecs->at("{}");'.format(corrfile+'L2Relative_AK4PFPuppi'))
-    ROOT.gInterpreter.Declare('auto cset_l3jecs = cset_jecs->at("{}");'.format(corrfile+'L3Absolute_AK4PFPuppi'))
-    ROOT.gInterpreter.Declare('auto cset_residualjecs = cset_jecs->at("{}");'.format(corrfile+'L2L3Residual_AK4PFPuppi'))
-
-    ROOT.gInterpreter.Declare('''
-    ROOT::VecOps::RVec<float> JetRawPt(const ROOT::VecOps::RVec<float> &pt,
-                                   const ROOT::VecOps::RVec<float> &rawf){
-
-    ROOT::VecOps::RVec<float> Jet_rawPt;
-
-    for(unsigned int i=0; i<pt.size(); i++){
-       double rawPt = pt[i] * (1 - rawf[i]);
-       Jet_rawPt.push_back(rawPt);
-    }
-
-    return Jet_rawPt;
-
-    }
-    ''')
-
-
-    
-    # C++ function to apply the Jet Energy Corrections 
-    ROOT.gInterpreter.Declare('''
-    ROOT::VecOps::RVec<float> JetCorPt(const ROOT::VecOps::RVec<float> &area, 
-                                               const ROOT::VecOps::RVec<float> &eta,
-                                               const ROOT::VecOps::RVec<float> &phi,
-                                               const ROOT::VecOps::RVec<float> &pt,
-                                               const ROOT::VecOps::RVec<float> &rawf,
-                                               const float &rho,
-    const bool &isData){
-
-    ROOT::VecOps::RVec<float> Jet_corPt;
-    bool debug = false;
-    //auto cset = correction::CorrectionSet::from_file(JECfile);
-//auto myelement = cset->at(corrfile + "L3Absolute_AK4PFPuppi");
-//if(debug)std::cout << "element " << myelement->evaluate({0.7, 258.})  << std::endl;
-  //  if(debug)std::cout << "Reading Jet Energy Corrections from files: " << JECfile<<", "<< corrfile << endl;
-
-    for(unsigned int i=0; i<pt.size(); i++){
-       if(debug)std::cout  << "Raw pt is: " << pt[i] << "\t\t";
-       if(debug)std::cout  << "Eta is: " << eta[i] << "\t\t";
-       if(debug)std::cout  << "Area is: " << area[i] << "\t\t";
-       if(debug)std::cout  << "Rho is: " << rho << "\t\t";
-/*
-if(debug)std::cout  <<std::endl;
-       float sf = cset->at(corrfile + "L1FastJet_AK4PFPuppi")->evaluate({area[i], eta[i], pt[i], rho});
-if(debug)std::cout  << "sf is: " << sf <<std::endl; 
-       sf *= cset->at(corrfile + "L2Relative_AK4PFPuppi")->evaluate({eta[i], pt[i]});
-       //       sf *= cset->at(corrfile + "L2Relative_AK4PFPuppi")->evaluate({eta[i], phi[i], pt[i]}); // For phi dependent jecs (2023Bpix, 2024)
-if(debug)std::cout  << "sf is: " << sf <<std::endl; 
-       sf *= cset->at(corrfile + "L3Absolute_AK4PFPuppi")->evaluate({eta[i], pt[i]});
-if(debug)std::cout  << "sf is: " << sf <<std::endl; 
-       sf *= cset->at(corrfile + "L2L3Residual_AK4PFPuppi")->evaluate({eta[i], pt[i]});
-if(debug)std::cout  << "sf is: " << sf <<std::endl; 
-if(debug)std::cout  << "will now push"<<std::endl; */
-    if(debug)std::cout  << "Area: " << area[i] << "\t\t" << "Eta: " << eta[i] << "\t\t" << "Pt: " << pt[i] << "\t\t" << "Rho: " << rho << std::endl;
-    float sf = cset_l1jecs->evaluate({area[i], eta[i], pt[i], rho});
-    if(debug)std::cout  << "L1 SF: " << cset_l1jecs->evaluate({area[i], eta[i], pt[i], rho})<< std::endl;
-    if(!isData){  
-          sf *= cset_l2jecs->evaluate({eta[i], pt[i]});
-          if(debug)std::cout  << "L2 SF: " << cset_l2jecs->evaluate({eta[i], pt[i]})<< std::endl;
-    }
-    sf *= cset_l3jecs->evaluate({eta[i], pt[i]});
-    if(debug)std::cout  << "L3 SF: " << cset_l3jecs->evaluate({eta[i], pt[i]})<< std::endl;
-    sf *= cset_residualjecs->evaluate({eta[i], pt[i]});
-    if(debug)std::cout  << "Residuals SF: " << cset_residualjecs->evaluate({eta[i], pt[i]})<< std::endl; 
-    if(debug)std::cout  << "Final SF: " << sf << std::endl;       
-    Jet_corPt.push_back(sf*pt[i]);
-
-    }
-
-    return Jet_corPt;
-
-}
-    ''')
+# The JEC functions are compiled from helpers/JetCorrections.h (see helpers/kernels.py).
+# One JetCorrector is declared per JEC configuration, in its own C++ namespace,
+# so that samples with different years/eras/isData can be booked in the same job.
+declared_jecs = {}
+
+def setupjecs(JECfile, corrfile, compound=False, tabulated=False, isData=False):
+    '''
+    Declare the JEC corrector for a given configuration.
+    With compound=True, the L1L2L3Res compound correction is evaluated (one call per jet).
+    With tabulated=True, jets are corrected by interpolation in a table of the combined correction factor,
+    computed once and cached in JEC/cache (see JetCorrectionTable). Its validation report is printed.
+    Returns the name of the C++ namespace holding it (to call <namespace>::JetCorPt).
+    '''
+    key = (JECfile, corrfile, compound, tabulated, bool(isData) if tabulated else False)
+    if key in declared_jecs:
+        return declared_jecs[key]
+    namespace = 'jecs_' + ''.join(c if c.isalnum() else '_' for c in JECfile.split('/')[1] + '_' + corrfile) + ('compound' if compound else '')
+    if tabulated:
+        namespace += '_table' + ('_isData' if isData else '')
+    declared_jecs[key] = namespace
+
+    ROOT.gInterpreter.Declare('namespace {} {{ const JetCorrector Corrector("{}", "{}", {}); }}'.format(namespace, JECfile, corrfile, 'true' if compound else 'false'))
+    if not tabulated:
+        ROOT.gInterpreter.Declare('namespace {} {{ const JetCorrector &JetCorPt = Corrector; }}'.format(namespace))
+        return namespace
+
+    cachefile = 'JEC/cache/{}.bin'.format(namespace)
+    os.makedirs(os.path.dirname(cachefile), exist_ok=True)
+    ROOT.gInterpreter.Declare('namespace {} {{ const JetCorrectionTable JetCorPt(Corrector, {}, "{}"); }}'.format(namespace, 'true' if isData else 'false', cachefile))
+    table = getattr(ROOT, namespace).JetCorPt
+    reportfile = cachefile.replace('.bin', '_validation.txt')
+    if table.Built() or not os.path.exists(reportfile):
+        with open(reportfile, 'w') as f:
+            f.write(str(table.Validate(getattr(ROOT, namespace).Corrector, bool(isData))))
+    with open(reportfile) as f:
+        print(f.read())
+
+    return namespace
+
+def setupjes(JECfile, corrfile, source, compound=False):
+    '''
+    Declare the JES uncertainty for one source (e.g. Total, AbsoluteStat, FlavorQCD) of a given configuration.
+    Returns the C++ name of the functor giving the up/down varied jet pT, to be used with Vary.
+    '''
+    namespace = setupjecs(JECfile, corrfile, compound)
+    if (namespace, source) in declared_jecs:
+        return declared_jecs[(namespace, source)]
+    ROOT.gInterpreter.Declare('namespace {} {{ const JetUncertainty JES_{}(Corrector, "{}"); }}'.format(namespace, source, corrfile+source+'_AK4PFPuppi'))
+    declared_jecs[(namespace, source)] = '{}::JES_{}'.format(namespace, source)
+    return declared_jecs[(namespace, source)]
 
 
 
@@ -1,10 +1,110 @@
 import ROOT
 import os
 import sys
+import glob
 import argparse
+import multiprocessing
 import numpy as np
 
-from xs_mc import xs_gjets
+sys.path.insert(0, '../helpers')
+import histarrays
+import sampleregistry
+
+'''
+Merge the outputs of several folders, each scaled to its cross section and the integrated luminosity, into one file.
+The job outputs of each folder are summed as numpy arrays (bin contents, sum of squared weights and statistics of every histogram):
+each process sums a contiguous chunk of files in place and returns one partial sum, and the partial sums are added sequentially.
+They are then scaled by xs*lumi/sumw, summed over the folders and written once: no intermediate file.
+'''
+
+def read_file(path):
+    '''
+    Arrays of all the histograms of an output file: {name: [contents, sumw2, stats, entries, path]}, under/overflow included.
+    The path is kept to get a histogram with the same binning when writing.
+    '''
+    f = ROOT.TFile.Open(path)
+    if not f or f.IsZombie():
+        raise OSError('Could not open {}'.format(path))
+    histos = {}
+    for key in f.GetListOfKeys():
+        if key.GetName() in histos or not ROOT.TClass.GetClass(key.GetClassName()).InheritsFrom('TH1'):
+            continue
+        h = f.Get(key.GetName())
+        stats = np.zeros(13)
+        h.GetStats(stats)
+        histos[key.GetName()] = [np.array(histarrays.values(h, flow=True), dtype=np.float64),
+                                 np.array(histarrays.variances(h, flow=True), dtype=np.float64), stats, h.GetEntries(), path]
+    #The histograms are owned by the file and deleted with it
+    f.Close()
+    return histos
+
+def add(merged, histos):
+    '''
+    Add the histogram arrays histos to merged (in place). Returns merged.
+    '''
+    for name, arrays in histos.items():
+        if name not in merged:
+            merged[name] = arrays
+            continue
+        for i in range(4):
+            merged[name][i] += arrays[i]
+    return merged
+
+def merge_files(paths):
+    '''
+    Sum of the histogram arrays of the files paths, read and added one at a time.
+    '''
+    merged = {}
+    for path in paths:
+        add(merged, read_file(path))
+    return merged
+
+def contiguous_chunks(paths, nchunks):
+    '''
+    Split paths into nchunks contiguous chunks of (almost) equal size.
+    '''
+    size, extra = divmod(len(paths), nchunks)
+    bounds = [k*size + min(k, extra) for k in range(nchunks+1)]
+    return [paths[bounds[k]:bounds[k+1]] for k in range(nchunks)]
+
+def norm_name(histos, name, process):
+    '''
+    Name of the normalisation histogram name (h_genEventSumw, h_nvtx) of process: name_process, or name for older outputs. None if absent.
+    '''
+    return next((n for n in [name+'_'+process, name] if n in histos), None)
+
+def scale(histos, factor):
+    '''
+    Scale the histogram arrays as TH1::Scale does (entries unchanged).
+    '''
+    for arrays in histos.values():
+        arrays[0] *= factor
+        arrays[1] *= factor*factor
+        arrays[2] *= factor
+        arrays[2][1] *= factor
+
+def write(histos, output):
+    '''
+    Write the merged histograms, filling for each one a copy of an input histogram (same binning).
+    '''
+    out = ROOT.TFile(output, "recreate")
+    inputs = {}
+    for name, (contents, sumw2, stats, entries, path) in histos.items():
+        if path not in inputs:
+            inputs[path] = ROOT.TFile.Open(path)
+        h = inputs[path].Get(name)
+        h.SetDirectory(out)
+        if h.GetSumw2N() == 0:
+            h.Sumw2()
+        histarrays.values(h, flow=True)[...] = contents
+        histarrays.variances(h, flow=True)[...] = sumw2
+        h.PutStats(stats)
+        h.SetEntries(entries)
+        out.cd()
+        h.Write()
+    for f in inputs.values():
+        f.Close()
+    out.Close()
 
 def main():
     parser = argparse.ArgumentParser(
@@ -12,37 +112,75 @@ def main():
         ''',
         usage='use "%(prog)s --help" for more information',
         formatter_class=argparse.RawTextHelpFormatter)
-    
+
 
     parser.add_argument("-d", "--directories", dest="directories", help="Input directories", nargs='+', type=str, default='')
-    parser.add_argument("--norm", dest="norm", help="Name of the histo used to find the number of events", type=str, default='h_nvtx')
-    parser.add_argument("-l", "--lumi", dest="lumi", help="Integrated lumi (in /pb)", type=str, default='1.0')
+    parser.add_argument("--norm", dest="norm", help="Name of the histo giving the sum of generator weights, suffixed with the process (for outputs without it: sumw cached in the registry, else h_nvtx)", type=str, default='h_genEventSumw')
+    parser.add_argument("--registry", dest="registry", help="Sample registry giving the cross sections. Default=samples.yaml", type=str, default=sampleregistry.DEFAULT_REGISTRY)
+    parser.add_argument("-l", "--lumi", dest="lumi", help="Integrated lumi (in /pb)", type=float, default=1.0)
     parser.add_argument("-o", "--output", dest="output", help="Ouput file", type=str, default='')
+    parser.add_argument("-j", "--workers", dest="workers", help="Number of merging processes. Default=0 i.e. one per core", type=int, default=0)
 
     args = parser.parse_args()
-    
-    str_listdir = ''
-    for i in args.directories:
-        #Merge all root files in directory
-        os.system('cd '+i+'; hadd all.root *.root; cd -')
-        xs = 0
-        for key in xs_gjets.keys():
-            if i.find(key)>=0:
-                xs =  xs_gjets[key]
-        #Scale them
-        print('python3 /user/jmoeil/GammaXqq/macros/scaletointegratedlumi.py -i all.root --norm '+ args.norm + ' -l ' + args.lumi + ' --xs ' + format(xs))
-        os.system('cd '+i+'; python3 /user/jmoeil/GammaXqq/macros/scaletointegratedlumi.py -i all.root --norm '+ args.norm + ' -l ' + args.lumi + ' --xs ' + format(xs))
-        str_listdir = str_listdir+i+"/all_rescaled.root "
-    
-    #Merge all files together
-    print("hadd "+ args.output +" "+ str_listdir)
-    os.system("hadd "+ args.output + " "+str_listdir )
-    
+    workers = args.workers if args.workers > 0 else os.cpu_count()
 
-if __name__ == '__main__':
-    main()
+    #Sample of each directory (from its manifest or its name), resolved before any file is read
+    registry = sampleregistry.load(args.registry)
+    try:
+        samples = {i: sampleregistry.resolve(registry, i) for i in args.directories}
+    except KeyError as error:
+        print(error.args[0])
+        return 1
 
+    #Job outputs of each directory (outputs of the former hadd based merging excluded)
+    files = {}
+    for i in args.directories:
+        files[i] = sorted(f for f in glob.glob(os.path.join(i, '*.root')) if os.path.basename(f) not in ['all.root', 'all_rescaled.root'])
+        if not files[i]:
+            print('No output file in {}'.format(i))
+            return 1
+
+    #Contiguous chunks of files of each directory, each summed by one process into one partial sum
+    chunks = []
+    for i, paths in files.items():
+        chunks += [(i, chunk) for chunk in contiguous_chunks(paths, min(workers, len(paths)))]
+    if workers > 1:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            partials = pool.map(merge_files, [paths for _, paths in chunks])
+    else:
+        partials = [merge_files(paths) for _, paths in chunks]
 
+    merged = {}
+    for i in files:
+        #Sequential sum of the partial sums of the directory
+        histos = {}
+        for (directory, _), partial in zip(chunks, partials):
+            if directory == i:
+                add(histos, partial)
+        #Scale to the cross section and luminosity, normalised by the sum of weights of the processed events
+        #(from the outputs, else the value cached in the registry for the whole sample, else h_nvtx)
+        sample = samples[i]
+        if sample['isData'] or sample['xs'] is None:
+            print('{}: {}, not scaled'.format(i, 'data' if sample['isData'] else 'no cross section found'))
+        else:
+            xs = sample['xs']
+            norm, nvtx = norm_name(histos, args.norm, sample['process']), norm_name(histos, 'h_nvtx', sample['process'])
+            if norm is not None:
+                sumw = histos[norm][0][1:-1].sum()
+            elif sample['sumw'] is not None:
+                norm, sumw = 'registry sumw', sample['sumw']
+            elif nvtx is not None:
+                norm, sumw = nvtx, histos[nvtx][0][1:-1].sum()
+            else:
+                print('{}: no {} nor h_nvtx histogram of process {}'.format(i, args.norm, sample['process']))
+                return 1
+            print('{} ({}): xs = {} pb, {} = {}, scale = {}'.format(i, sample['name'], xs, norm, sumw, args.lumi/sumw*xs))
+            scale(histos, args.lumi/sumw*xs)
+        add(merged, histos)
 
+    write(merged, args.output)
+    print('{} histograms written to {}'.format(len(merged), args.output))
+    return 0
 
-    
+if __name__ == '__main__':
+    sys.exit(main())
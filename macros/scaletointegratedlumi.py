@@ -13,7 +13,8 @@ def main():
     
 
     parser.add_argument("-i", "--input", dest="inputFiles", help="Input file", nargs='+', type=str, default='')
-    parser.add_argument("--norm", dest="norm", help="Name of the histo used to find the number of events", type=str, default='h_nvtx')
+    parser.add_argument("--norm", dest="norm", help="Name of the histo giving the sum of generator weights (h_nvtx for outputs without h_genEventSumw)", type=str, default='h_genEventSumw')
+    parser.add_argument("-p", "--process", dest="process", help="Process of the histos giving the sum of weights (h_genEventSumw_<process>, h_nvtx_<process>). Default='' i.e. older outputs without suffix", type=str, default='')
     parser.add_argument("-l", "--lumi", dest="lumi", help="Integrated lumi (in /pb)", type=float, default=1.0)
     parser.add_argument("--xs", dest="xs", help="Cross section (in pb)", type=float, default=1.0)
 
@@ -28,7 +29,8 @@ def main():
 
     
     for i, inputfile in enumerate(inputFiles):
-        h_norm = inputfile.Get(args.norm)
+        suffix = '_'+args.process if args.process != '' else ''
+        h_norm = inputfile.Get(args.norm+suffix) or inputfile.Get('h_nvtx'+suffix)
         nentries = h_norm.GetEntries()
         integral = h_norm.Integral()
 
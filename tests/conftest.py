@@ -0,0 +1,11 @@
+import os
+import sys
+
+'''
+The helpers and the condor submission scripts are imported as the macros do, from their folders.
+Run from the repository root: python3 -m pytest tests
+'''
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repository, 'helpers'))
+sys.path.insert(0, os.path.join(repository, 'macros', 'condorsubmission'))
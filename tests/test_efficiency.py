@@ -0,0 +1,151 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('ROOT')
+import efficiency
+
+'''
+The vectorised efficiency curves (helpers/efficiency.py) against explicit loops over the bins, on tiny histograms.
+'''
+
+EDGES = np.array([0., 1., 2., 3., 4.])
+SG = np.array([1., 2., 3., 4.])
+BG = np.array([4., 0., 2., 1.])
+# The same contents with the overflow bin last (efficiency.histogram_arrays)
+SG_OVERFLOW = np.append(SG, 5.)
+BG_OVERFLOW = np.append(BG, 2.)
+# Below the first edge (underflow), on the edges, inside bins, on the last edge and above it (overflow)
+THRESHOLDS = np.array([-1., 0., 0.5, 1., 2.5, 3., 3.99, 4., 5.])
+
+def find_bin(edges, x):
+    '''
+    TH1::FindBin: 0 for the underflow, nbins+1 for the overflow, the bin whose low edge is x when x is on an edge.
+    '''
+    b = 0
+    while b < len(edges) and x >= edges[b]:
+        b += 1
+    return b
+
+def passing_loop(edges, contents, threshold, cut_dir):
+    '''
+    TH1::Integral(1, FindBin(threshold)) or Integral(FindBin(threshold), nbins+1), the overflow bin counting only if contents has it.
+    '''
+    last, b = len(contents), find_bin(edges, threshold)
+    if cut_dir == 'less':
+        return sum(contents[i-1] for i in range(1, min(b, last)+1))
+    return sum(contents[i-1] for i in range(max(b, 1), last+1))
+
+@pytest.mark.parametrize('contents', [SG, SG_OVERFLOW])
+@pytest.mark.parametrize('cut_dir', ['less', 'greater'])
+def test_passing(contents, cut_dir):
+    expected = [passing_loop(EDGES, contents, t, cut_dir) for t in THRESHOLDS]
+    assert np.allclose(efficiency.passing(EDGES, contents, THRESHOLDS, cut_dir), expected)
+
+def test_passing_edge_bins():
+    # The bin containing the threshold passes, in both directions
+    assert efficiency.passing(EDGES, SG, [1.], 'less')[0] == 3.
+    assert efficiency.passing(EDGES, SG, [1.], 'greater')[0] == 9.
+    # Underflow and overflow thresholds
+    assert efficiency.passing(EDGES, SG, [-1., 5.], 'less').tolist() == [0., 10.]
+    assert efficiency.passing(EDGES, SG, [-1., 5.], 'greater').tolist() == [10., 0.]
+
+def test_passing_overflow():
+    # The overflow passes every 'greater' cut, and the 'less' cuts above the last edge only
+    assert efficiency.passing(EDGES, SG_OVERFLOW, [-1., 3.99, 4., 5.], 'greater').tolist() == [15., 9., 5., 5.]
+    assert efficiency.passing(EDGES, SG_OVERFLOW, [-1., 3.99, 4., 5.], 'less').tolist() == [0., 10., 15., 15.]
+    assert efficiency.efficiency(EDGES, SG_OVERFLOW, [4.], 'greater')[0] == pytest.approx(1/3)
+
+def test_passing_wrong_binning():
+    with pytest.raises(ValueError):
+        efficiency.passing(EDGES, np.append(SG_OVERFLOW, 1.), THRESHOLDS)
+
+def test_passing_rows():
+    rows = np.stack([SG, BG])
+    result = efficiency.passing(EDGES, rows, THRESHOLDS, 'greater')
+    assert result.shape == (2, len(THRESHOLDS))
+    assert np.allclose(result[1], [passing_loop(EDGES, BG, t, 'greater') for t in THRESHOLDS])
+
+def test_passing_unknown_direction():
+    with pytest.raises(ValueError):
+        efficiency.passing(EDGES, SG, THRESHOLDS, 'between')
+
+@pytest.mark.parametrize('sg, bg', [(SG, BG), (SG_OVERFLOW, BG_OVERFLOW)])
+@pytest.mark.parametrize('cut_dir', ['less', 'greater'])
+def test_roc(sg, bg, cut_dir):
+    points = sorted((passing_loop(EDGES, bg, t, cut_dir)/bg.sum(), passing_loop(EDGES, sg, t, cut_dir)/sg.sum()) for t in THRESHOLDS)
+    auc = sum((points[i+1][0]-points[i][0])*(points[i+1][1]+points[i][1])/2 for i in range(len(points)-1))
+    fpr, tpr, area = efficiency.roc(EDGES, sg, bg, THRESHOLDS, cut_dir)
+    assert np.allclose(fpr, [p[0] for p in points])
+    assert np.allclose(tpr, [p[1] for p in points])
+    assert area == pytest.approx(auc)
+
+def test_roc_rows():
+    fpr, tpr, auc = efficiency.roc(EDGES, np.stack([SG, BG]), np.stack([BG, SG]), THRESHOLDS)
+    for row, (sg, bg) in enumerate([(SG, BG), (BG, SG)]):
+        single = efficiency.roc(EDGES, sg, bg, THRESHOLDS)
+        assert np.allclose(fpr[row], single[0])
+        assert np.allclose(tpr[row], single[1])
+        assert auc[row] == pytest.approx(single[2])
+
+XEDGES = np.array([0., 0.5, 1.])
+YEDGES = np.array([0., 0.25, 0.5, 1.])
+SG2 = np.array([[1., 2., 3.], [4., 5., 6.]])
+# The same contents with the overflow bins last along x and y (efficiency.histogram2d_arrays)
+SG2_OVERFLOW = np.array([[1., 2., 3., 7.], [4., 5., 6., 8.], [9., 10., 11., 12.]])
+THRESHOLDS_X = np.array([-1., 0., 0.3, 0.5, 1., 2.])
+THRESHOLDS_Y = np.array([-1., 0.25, 0.4, 0.5, 1.])
+
+def passing_2d_loop(contents, tx, ty):
+    '''
+    TH2::Integral(FindBin(tx), nx+1, FindBin(ty), ny+1), the overflow bins counting only if contents has them.
+    '''
+    lastx, lasty = contents.shape
+    bx, by = find_bin(XEDGES, tx), find_bin(YEDGES, ty)
+    return sum(contents[i-1][j-1] for i in range(max(bx, 1), lastx+1) for j in range(max(by, 1), lasty+1))
+
+@pytest.mark.parametrize('contents', [SG2, SG2_OVERFLOW])
+def test_passing_2d(contents):
+    expected = [[passing_2d_loop(contents, tx, ty) for ty in THRESHOLDS_Y] for tx in THRESHOLDS_X]
+    assert np.allclose(efficiency.passing_2d(XEDGES, YEDGES, contents, THRESHOLDS_X, THRESHOLDS_Y), expected)
+
+def test_passing_2d_overflow():
+    # Thresholds above the last edges: only the overflow bins pass
+    result = efficiency.passing_2d(XEDGES, YEDGES, SG2_OVERFLOW, [0., 2.], [0., 2.])
+    assert result.tolist() == [[SG2_OVERFLOW.sum(), 7.+8.+12.], [9.+10.+11.+12., 12.]]
+
+def test_passing_2d_wrong_binning():
+    with pytest.raises(ValueError):
+        efficiency.passing_2d(XEDGES, YEDGES, SG2_OVERFLOW[:, :-1], THRESHOLDS_X, THRESHOLDS_Y)
+
+def test_passing_2d_rows():
+    result = efficiency.passing_2d(XEDGES, YEDGES, np.stack([SG2, 2*SG2]), THRESHOLDS_X, THRESHOLDS_Y)
+    assert result.shape == (2, len(THRESHOLDS_X), len(THRESHOLDS_Y))
+    assert np.allclose(result[1], 2*result[0])
+
+def test_best_working_point():
+    significance = np.array([[5., 1., 2.], [3., np.nan, 4.], [0., 2., 1.]])
+    thresholds = np.array([0., 0.3, 0.6])
+    best, allowed = None, None
+    for i, tx in enumerate(thresholds):
+        for j, ty in enumerate(thresholds):
+            if tx >= 0.3 and ty >= 0.3 and not np.isnan(significance[i, j]) and (best is None or significance[i, j] > best):
+                best, allowed = significance[i, j], (i, j)
+    assert tuple(efficiency.best_working_point(significance, thresholds, thresholds, min_threshold=0.3)) == allowed == (1, 2)
+    # Without minimum threshold, the highest value (nan excluded)
+    assert tuple(efficiency.best_working_point(significance, thresholds, thresholds)) == (0, 0)
+
+def test_full_resolution_scan():
+    # Thresholds at the lower edge of every bin (PNetB.py significance heatmap): each cell is the tail sum from that bin,
+    # overflow bins included as in TH2::Integral(i, nx+1, j, ny+1)
+    bg = np.array([[3., 0., 1., 1.], [0., 2., 2., 0.], [1., 0., 0., 4.]])
+    s = efficiency.passing_2d(XEDGES, YEDGES, SG2_OVERFLOW, XEDGES[:-1], YEDGES[:-1])
+    b = efficiency.passing_2d(XEDGES, YEDGES, bg, XEDGES[:-1], YEDGES[:-1])
+    nx, ny = len(XEDGES)-1, len(YEDGES)-1
+    assert s.shape == b.shape == (nx, ny)
+    for i in range(nx):
+        for j in range(ny):
+            assert s[i, j] == SG2_OVERFLOW[i:, j:].sum()
+            assert b[i, j] == bg[i:, j:].sum()
+    significance = s/np.sqrt(s+b)
+    best = max(((i, j) for i in range(nx) for j in range(ny)), key=lambda ij: significance[ij])
+    assert tuple(efficiency.best_working_point(significance, XEDGES[:-1], YEDGES[:-1])) == best
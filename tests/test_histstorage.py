@@ -0,0 +1,147 @@
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+ROOT = pytest.importorskip('ROOT')
+import histarrays
+import histstorage
+
+'''
+Axis binning with --histo_rebin (histstorage.axis): only the fine axes whose number of bins is a multiple of the factor are rebinned.
+Float and sparse storage filled as the double histograms, and memory estimate of the booked histograms.
+'''
+
+@pytest.fixture
+def rebin(monkeypatch):
+    def set_rebin(factor):
+        monkeypatch.setitem(histstorage.config, 'rebin', factor)
+    return set_rebin
+
+def test_axis_no_rebin(rebin):
+    rebin(1)
+    assert histstorage.axis((1000, 0, 1000)) == (1000, 0, 1000)
+
+@pytest.mark.parametrize('binning, factor, expected', [
+    ((1000, 0, 1000), 10, (100, 0, 1000)),
+    ((1000, 0, 1), 4, (250, 0, 1)),
+    ((1000, 0, 1000), 1000, (1, 0, 1000)),
+])
+def test_axis_rebinned(rebin, binning, factor, expected):
+    rebin(factor)
+    assert histstorage.axis(binning) == expected
+
+@pytest.mark.parametrize('binning', [(100, 0, 5), (50, -2.5, 2.5), (5, 0.5, 5.5)])
+def test_axis_coarse_unchanged(rebin, binning):
+    # Axes of at most REBIN_MIN_BINS bins keep their binning
+    rebin(10)
+    assert histstorage.axis(binning) == binning
+
+def test_axis_not_multiple_unchanged(rebin):
+    rebin(3)
+    assert histstorage.axis((1000, 0, 1000)) == (1000, 0, 1000)
+
+def test_axis_range_unchanged(rebin):
+    rebin(8)
+    nbins, xmin, xmax = histstorage.axis((1000, -1.5, 2.5))
+    assert (nbins, xmin, xmax) == (125, -1.5, 2.5)
+
+# Compact storage (float precision, sparse 2D maps) against the double histograms filled with the same values, and memory estimate
+
+HELPER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'helpers', 'Helper.h')
+
+@pytest.fixture
+def storage(monkeypatch):
+    # FloatHisto1D/2D, BookSparseHisto2D and SparseHisto2D (Helper.h), interpreted rather than compiled into helpers/
+    assert ROOT.gInterpreter.Declare('#include "{}"'.format(HELPER))
+    histstorage.reset()
+    def set_storage(precision='double', sparse_btag=False, rebin=1):
+        monkeypatch.setitem(histstorage.config, 'precision', precision)
+        monkeypatch.setitem(histstorage.config, 'sparse_btag', sparse_btag)
+        monkeypatch.setitem(histstorage.config, 'rebin', rebin)
+    return set_storage
+
+@pytest.fixture
+def df():
+    # Values below, inside and above the axes (0, 1), weights exactly representable in float
+    return (ROOT.RDataFrame(2000).Define('x', '(rdfentry_ % 97) * 0.013 - 0.1').Define('y', '(rdfentry_ % 89) * 0.0125 - 0.05')
+            .Define('w', '0.5 + (rdfentry_ % 7) * 0.25').Define('unit_weight', '1.'))
+
+def assert_same_bins(h, reference):
+    assert h.GetNcells() == reference.GetNcells()
+    assert np.allclose(histarrays.values(h, flow=True), histarrays.values(reference, flow=True), rtol=1e-6)
+    assert np.allclose(histarrays.variances(h, flow=True), histarrays.variances(reference, flow=True), rtol=1e-12)
+    assert h.GetEntries() == reference.GetEntries()
+
+@pytest.mark.parametrize('weight', ['w', 'unit_weight'])
+def test_float_histo1d(storage, df, weight):
+    storage('double')
+    reference = histstorage.Histo1D(df, 'h_double', (50, 0., 1.), 'x', weight)
+    storage('float')
+    h = histstorage.Histo1D(df, 'h_float', (50, 0., 1.), 'x', weight)
+    assert h.GetValue().InheritsFrom('TH1F')
+    assert_same_bins(h.GetValue(), reference.GetValue())
+
+def test_float_histo2d(storage, df):
+    storage('double')
+    reference = histstorage.Histo2D(df, 'h_double', (20, 0., 1.), (10, 0., 1.), 'x', 'y', 'w')
+    storage('float')
+    h = histstorage.Histo2D(df, 'h_float', (20, 0., 1.), (10, 0., 1.), 'x', 'y', 'w')
+    assert h.GetValue().InheritsFrom('TH2F')
+    assert_same_bins(h.GetValue(), reference.GetValue())
+
+def test_sparse_histo2d(storage, df):
+    storage('double', sparse_btag=True)
+    reference = histstorage.Histo2D(df, 'h_dense', (20, 0., 1.), (10, 0., 1.), 'x', 'y', 'w')
+    h = histstorage.Histo2D(df, 'h_sparse', (20, 0., 1.), (10, 0., 1.), 'x', 'y', 'w', sparse=True)
+    # Only the filled bins are stored
+    filled = np.count_nonzero(histarrays.values(reference.GetValue(), flow=True))
+    assert h.GetValue().FilledBins() == filled < reference.GetValue().GetNcells()
+    dense = histstorage.Dense(h.GetValue())
+    assert dense.GetName() == 'h_sparse'
+    assert_same_bins(dense, reference.GetValue())
+
+def test_sparse_merge_reset(storage):
+    # Merge of the per-slot copies, as RDataFrame does with implicit MT
+    copies = [ROOT.SparseHisto2D('h_sparse', 10, 0., 1., 5, 0., 1.) for _ in range(3)]
+    reference = ROOT.TH2D('h_reference', '', 10, 0., 1., 5, 0., 1.)
+    reference.SetDirectory(ROOT.nullptr)
+    reference.Sumw2()
+    for n in range(300):
+        x, y, w = (n % 23)*0.05 - 0.1, (n % 11)*0.1 - 0.05, 0.25*(1 + n % 5)
+        copies[n % 3].Fill(x, y, w)
+        reference.Fill(x, y, w)
+    others = ROOT.TList()
+    for copy in copies[1:]:
+        others.Add(copy)
+    assert copies[0].Merge(others) == 300
+    dense = copies[0].Dense()
+    ROOT.SetOwnership(dense, True)
+    assert_same_bins(dense, reference)
+    copies[0].Reset()
+    assert copies[0].FilledBins() == 0
+    empty = copies[0].Dense()
+    ROOT.SetOwnership(empty, True)
+    assert empty.GetEntries() == 0 and empty.GetSumOfWeights() == 0
+
+def test_memory_estimate(storage, df):
+    storage('float')
+    histos = [histstorage.Histo1D(df, 'h_float', (50, 0., 1.), 'x', 'w'),
+              histstorage.Histo1D(df, 'h_data', (1000, 0., 1.), 'x', 'unit_weight'),
+              histstorage.Histo2D(df, 'h_2d', (20, 0., 1.), (10, 0., 1.), 'x', 'y', 'w')]
+    storage('double', sparse_btag=True, rebin=10)
+    histos += [histstorage.Histo1D(df, 'h_double', (1000, 0., 1.), 'x', 'w'),
+               histstorage.Histo2D(df, 'h_sparse', (1000, 0., 1.), (1000, 0., 1.), 'x', 'y', 'w', sparse=True)]
+    # Bins (under/overflow included) times the bytes per bin: contents, plus the double sum of squared weights if weighted
+    expected = {'h_float': 52*(4+8), 'h_data': 1002*4, 'h_2d': 22*12*(4+8), 'h_double': 102*(8+8), 'h_sparse': 0}
+    estimate = histstorage.memory_estimate(4, variations=2)
+    for name, size in expected.items():
+        assert estimate['histograms'][name]['bytes'] == histstorage.HISTO_BYTES + size, name
+    assert estimate['histograms']['h_sparse']['cells'] == 102*102
+    assert estimate['sparse'] == 1
+    assert estimate['bytes_per_copy'] == sum(histstorage.HISTO_BYTES + size for size in expected.values())
+    assert estimate['copies'] == 12
+    assert estimate['total_bytes'] == 12*estimate['bytes_per_copy']
+    # Cells and sum of squared weights of the filled histograms
+    for name, h in zip(['h_float', 'h_data', 'h_2d', 'h_double'], histos):
+        assert h.GetValue().GetNcells() == estimate['histograms'][name]['cells'], name
+        assert (h.GetValue().GetSumw2N() > 0) == (name != 'h_data'), name
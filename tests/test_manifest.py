@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip('ROOT')
+import manifest
+
+'''
+Status of the condor jobs without result (manifest.check): jobs still queued, running or held are not resubmitted.
+'''
+
+SUBMITTED = '000 (1234.000.000) 2024-05-01 12:00:00 Job submitted from host: <192.168.0.1:9618>\n...\n'
+EXECUTING = '001 (1234.000.000) 2024-05-01 12:05:00 Job executing on host: <192.168.0.2:9618>\n...\n'
+HELD = '012 (1234.000.000) 2024-05-01 12:10:00 Job was held.\n\tExcessive memory usage\n...\n'
+TERMINATED = '005 (1234.000.000) 2024-05-01 13:00:00 Job terminated.\n\t(1) Normal termination (return value 0)\n...\n'
+ABORTED = '009 (1234.000.000) 2024-05-01 13:00:00 Job was aborted.\n\tvia condor_rm\n...\n'
+
+@pytest.fixture
+def job(tmp_path):
+    (tmp_path / 'log').mkdir()
+    return {'id': 3, 'output': str(tmp_path / 'output_3.root'), 'events': 100, 'status': 'submitted'}
+
+def write_log(job, content):
+    with open(job['output'].replace('output_3.root', 'log/scriptcondor_3.log'), 'w') as f:
+        f.write(content)
+
+@pytest.mark.parametrize('log, status', [
+    (SUBMITTED, 'queued'),
+    (SUBMITTED+EXECUTING, 'running'),
+    (SUBMITTED+EXECUTING+HELD, 'held'),
+    (SUBMITTED+EXECUTING+TERMINATED, 'missing'),
+    (SUBMITTED+ABORTED, 'missing'),
+    # Resubmitted after a first termination: the log is appended
+    (SUBMITTED+EXECUTING+TERMINATED+SUBMITTED, 'queued'),
+])
+def test_check_without_result(job, log, status):
+    write_log(job, log)
+    assert manifest.check(job, 'zg')['status'] == status
+    assert (status in manifest.RESUBMIT) == (status == 'missing')
+
+def test_check_no_log(job):
+    # Never submitted, or the log was removed
+    assert manifest.check(job, 'zg')['status'] == 'missing'
+
+def test_check_failed(job):
+    write_log(job, SUBMITTED+EXECUTING)
+    with open(job['output'][:-len('.root')]+'.exit', 'w') as f:
+        f.write('1\n')
+    assert manifest.check(job, 'zg')['status'] == 'failed'
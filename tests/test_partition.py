@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip('ROOT')
+from partition_jobs import partition, fill_template
+
+'''
+Condor job partitioning (macros/condorsubmission/partition_jobs.py): every entry of every file is processed exactly once.
+'''
+
+ENTRIES = [
+    {'a.root': 10},
+    {'a.root': 1000},
+    {'a.root': 999, 'b.root': 1001, 'c.root': 1},
+    {'a.root': 300, 'b.root': 0, 'c.root': 450, 'd.root': 2500, 'e.root': 250, 'f.root': 1000},
+    {'f{}.root'.format(n): 37*n % 401 for n in range(50)},
+]
+
+def coverage(jobs, entries):
+    '''
+    Number of times each entry of each file is processed by the jobs.
+    '''
+    counts = {f: [0]*n for f, n in entries.items()}
+    for job in jobs:
+        if job['nevents'] == -1:
+            for f in job['files']:
+                counts[f] = [c+1 for c in counts[f]]
+            continue
+        assert len(job['files']) == 1
+        for entry in range(job['first'], job['first']+job['nevents']):
+            counts[job['files'][0]][entry] += 1
+    return counts
+
+@pytest.mark.parametrize('entries', ENTRIES)
+@pytest.mark.parametrize('events_per_job', [1, 7, 100, 1000, 10**6])
+def test_partition_covers_every_entry_once(entries, events_per_job):
+    jobs = partition(entries, events_per_job)
+    for f, counts in coverage(jobs, entries).items():
+        assert counts == [1]*entries[f], f
+    for job in jobs:
+        assert job['events'] == (sum(entries[f] for f in job['files']) if job['nevents'] == -1 else job['nevents'])
+        assert 0 < job['events'] <= events_per_job
+
+@pytest.mark.parametrize('entries', ENTRIES)
+def test_partition_range_events(entries):
+    # Ranges sized for single-cpu jobs (events_per_job/cpus)
+    jobs = partition(entries, 100, 25)
+    for f, counts in coverage(jobs, entries).items():
+        assert counts == [1]*entries[f], f
+    for job in jobs:
+        assert job['events'] <= (100 if job['nevents'] == -1 else 25)
+
+def test_partition_empty_files():
+    assert partition({'a.root': 0, 'b.root': 0}, 100) == []
+
+def test_fill_template_single_pass():
+    # A value containing a placeholder is not substituted again
+    assert fill_template('dir=OUTPUTDIR cpus=NCPUS', {'OUTPUTDIR': '/data/NCPUS', 'NCPUS': '4'}) == 'dir=/data/NCPUS cpus=4'
@@ -0,0 +1,71 @@
+import os
+import json
+import pytest
+
+pytest.importorskip('ROOT')
+import sampleregistry
+
+'''
+Sample of an output folder (sampleregistry.resolve): its manifest, else the sample named exactly as the folder.
+'''
+
+REGISTRY = '''
+ZGto2QG-1Jets_PTG-100to200:
+  process: zg
+  xs: 100.
+ZGto2QG-1Jets_PTG-200:
+  process: zg
+  xs: 10.
+GJ-4Jets_HT-400to600:
+  process: gjets
+  xs: 1000.
+EGamma0_Run2023C:
+  process: data
+  isData: 1
+'''
+
+@pytest.fixture
+def registry(tmp_path):
+    path = tmp_path / 'samples.yaml'
+    path.write_text(REGISTRY)
+    return sampleregistry.load(str(path))
+
+def test_resolve_exact_name(registry, tmp_path):
+    folder = tmp_path / 'ZGto2QG-1Jets_PTG-200'
+    folder.mkdir()
+    assert sampleregistry.resolve(registry, str(folder))['xs'] == 10.
+    # Trailing separator
+    assert sampleregistry.resolve(registry, str(folder)+os.sep)['name'] == 'ZGto2QG-1Jets_PTG-200'
+
+def test_resolve_manifest(registry, tmp_path):
+    folder = tmp_path / 'submission_1'
+    folder.mkdir()
+    (folder / 'manifest.json').write_text(json.dumps({'sample': 'GJ-4Jets_HT-400to600', 'jobs': []}))
+    assert sampleregistry.resolve(registry, str(folder))['process'] == 'gjets'
+
+def test_resolve_manifest_unknown_sample(registry, tmp_path):
+    folder = tmp_path / 'ZGto2QG-1Jets_PTG-200'
+    folder.mkdir()
+    (folder / 'manifest.json').write_text(json.dumps({'sample': 'Removed_sample'}))
+    with pytest.raises(KeyError):
+        sampleregistry.resolve(registry, str(folder))
+
+@pytest.mark.parametrize('name', ['ZGto2QG-1Jets_PTG-100to200_v2', 'ZGto2QG-1Jets_PTG', 'zgto2qg-1jets_ptg-200'])
+def test_resolve_no_partial_match(registry, tmp_path, name):
+    # Names containing, contained in or differing in case from a sample name are not resolved
+    with pytest.raises(KeyError) as error:
+        sampleregistry.resolve(registry, str(tmp_path / name))
+    assert 'closest' in error.value.args[0]
+    assert '--sample' in error.value.args[0]
+
+def test_resolve_close_matches(registry, tmp_path):
+    with pytest.raises(KeyError) as error:
+        sampleregistry.resolve(registry, str(tmp_path / 'ZGto2QG-1Jets_PTG-100to200_ext'))
+    message = error.value.args[0]
+    assert 'ZGto2QG-1Jets_PTG-100to200' in message
+    assert 'EGamma0_Run2023C' not in message
+
+def test_resolve_no_close_match(registry, tmp_path):
+    with pytest.raises(KeyError) as error:
+        sampleregistry.resolve(registry, str(tmp_path / 'output'))
+    assert 'closest' not in error.value.args[0]